@@ -0,0 +1,147 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Deque, Optional
+
+from sqlalchemy.util import await_only
+
+from app.metrics import (
+    ADMISSION_ACTIVE,
+    ADMISSION_QUEUE_DEPTH,
+    ADMISSION_REJECTED,
+    ADMISSION_WAIT,
+    TimedQueuePool,
+)
+
+# Requests waiting for a connection beyond the limit, and for how long (seconds)
+# at most, before they are answered 503
+ADMISSION_QUEUE_SIZE = int(os.environ.get("ADMISSION_QUEUE_SIZE", "32"))
+ADMISSION_TIMEOUT = float(os.environ.get("ADMISSION_TIMEOUT", "2"))
+# Sent in Retry-After with the 503 (seconds)
+ADMISSION_RETRY_AFTER = int(os.environ.get("ADMISSION_RETRY_AFTER", "1"))
+
+QUEUE_FULL = "queue_full"
+TIMEOUT = "timeout"
+
+
+class Overloaded(Exception):
+    """The database is saturated: the request is shed rather than queued."""
+
+    def __init__(self, backend: str, reason: str, retry_after: int):
+        super().__init__(f"Database {backend} overloaded ({reason})")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    At most `limit` database connections in use at once. Beyond it, up to
+    `queue_size` callers wait in turn, each for `timeout` seconds at most;
+    the others are rejected at once with `Overloaded`. A burst then costs a
+    few fast 503s instead of a queue, and timeouts, growing without bound.
+    """
+
+    def __init__(
+        self,
+        backend: str,
+        limit: int,
+        queue_size: int = ADMISSION_QUEUE_SIZE,
+        timeout: float = ADMISSION_TIMEOUT,
+        retry_after: int = ADMISSION_RETRY_AFTER,
+    ):
+        self.backend = backend
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> None:
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            self._update_gauges()
+            return
+
+        if len(self._waiters) >= self.queue_size:
+            raise self._rejected(QUEUE_FULL)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._update_gauges()
+        start = time.perf_counter()
+        try:
+            # `release` hands its slot over by resolving the waiter
+            await asyncio.wait_for(waiter, self.timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            # Handed over just as the deadline passed (wait_for drops the
+            # result on Python 3.12+) or the caller went away: give it back
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            if isinstance(e, asyncio.TimeoutError):
+                raise self._rejected(TIMEOUT) from None
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            self._update_gauges()
+            ADMISSION_WAIT.labels(self.backend).observe(time.perf_counter() - start)
+
+    def release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                self._update_gauges()
+                return
+        self.active -= 1
+        self._update_gauges()
+
+    def _rejected(self, reason: str) -> Overloaded:
+        ADMISSION_REJECTED.labels(self.backend, reason).inc()
+        return Overloaded(self.backend, reason, self.retry_after)
+
+    def _update_gauges(self) -> None:
+        ADMISSION_ACTIVE.labels(self.backend).set(self.active)
+        ADMISSION_QUEUE_DEPTH.labels(self.backend).set(len(self._waiters))
+
+
+class AdmittedQueuePool(TimedQueuePool):
+    """
+    Pool admitting each checkout through an `AdmissionController`, released
+    on checkin: only queries hold a slot, not requests answered from caches.
+    """
+
+    def __init__(self, creator, admission: Optional[AdmissionController] = None, **kw):
+        super().__init__(creator, **kw)
+        self.admission = admission
+
+    def recreate(self) -> "AdmittedQueuePool":
+        # Disposing the engine recreates the pool, with the same slots
+        pool = super().recreate()
+        pool.admission = self.admission
+        return pool
+
+    def _do_get(self):
+        if self.admission is None:
+            return super()._do_get()
+
+        # Checkouts of an async engine run in a greenlet, which can await
+        await_only(self.admission.acquire())
+        try:
+            return super()._do_get()
+        except BaseException:
+            self.admission.release()
+            raise
+
+    def _do_return_conn(self, record) -> None:
+        try:
+            super()._do_return_conn(record)
+        finally:
+            if self.admission is not None:
+                self.admission.release()
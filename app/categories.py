@@ -0,0 +1,136 @@
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+from sqlmodel import Session, select
+
+from app.dataset import get_dataset_version
+from app.models import Food
+from app.utils import valid_category
+
+LIGATURES = {"œ": "oe", "æ": "ae"}
+
+# Category keywords of /top-foods/
+TOP_FOODS_CATEGORIES = [
+    "Fruits",
+    "Légumes",
+    "Lait",
+    "Poisson",
+    "Œufs",
+    "Produits céréaliers",
+    "Noix",
+    "arômes",
+    "viande",
+    "petit-déjeuner",
+]
+# Other keywords (e.g. of batch requests) whose categories are memoized
+LOOKUP_CACHE_SIZE = 256
+
+
+def normalize_text(text: str) -> str:
+    """Case and accent insensitive form of a category or keyword."""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    for ligature, replacement in LIGATURES.items():
+        text = text.replace(ligature, replacement)
+    return text
+
+
+class CategoryIndex:
+    """
+    Keyword -> categories mapping, built once per dataset version.
+
+    Categories are normalized and checked against `valid_category` when the
+    index is built, as are the categories of `keywords`. Other keywords are
+    resolved on lookup, the last `max_lookups` of them memoized: clients
+    choose them, so they must not grow the index without bound.
+    """
+
+    def __init__(
+        self,
+        categories: Iterable[str],
+        version: Optional[str] = None,
+        keywords: Iterable[str] = (),
+        max_lookups: int = LOOKUP_CACHE_SIZE,
+    ):
+        self.version = version
+        self.max_lookups = max_lookups
+        self._categories = [
+            (category, normalize_text(category))
+            for category in sorted(set(categories))
+            if valid_category(category, "")
+        ]
+        self._lookups: Dict[str, List[str]] = {}
+        self._recent: OrderedDict[str, List[str]] = OrderedDict()
+
+        for keyword in keywords:
+            key = normalize_text(keyword)
+            self._lookups[key] = self._resolve(key)
+
+    def _resolve(self, key: str) -> List[str]:
+        # Same exception as `valid_category`: seafood is not a fruit
+        excluded = "fruits de mer" if key == "fruits" else None
+        return [
+            category
+            for category, normalized in self._categories
+            if key in normalized and not (excluded and excluded in normalized)
+        ]
+
+    def lookup(self, keyword: str) -> List[str]:
+        key = normalize_text(keyword)
+
+        categories = self._lookups.get(key)
+        if categories is not None:
+            return categories
+
+        categories = self._recent.get(key)
+        if categories is None:
+            categories = self._resolve(key)
+            self._recent[key] = categories
+            while len(self._recent) > self.max_lookups:
+                self._recent.popitem(last=False)
+        else:
+            self._recent.move_to_end(key)
+
+        return categories
+
+    def map(self, keywords: List[str]) -> Dict[str, List[str]]:
+        return {keyword: self.lookup(keyword) for keyword in keywords}
+
+
+def build_category_index(
+    session: Session, version: Optional[str] = None, keywords: Iterable[str] = ()
+) -> CategoryIndex:
+    all_categories_statement = select(Food.categorie).distinct()
+    all_categories = session.exec(all_categories_statement).all()
+
+    return CategoryIndex(all_categories, version, keywords)
+
+
+_index: Optional[CategoryIndex] = None
+_lock = threading.Lock()
+
+
+def get_category_index(session: Session, keywords: Iterable[str] = ()) -> CategoryIndex:
+    """Cached `CategoryIndex`, rebuilt when the dataset version changes."""
+    global _index
+
+    version = get_dataset_version(session)
+
+    index = _index
+    if index is None or index.version != version:
+        # Built without holding the lock: on an async session, the query lets
+        # other requests run on the same thread, and they would block on it
+        index = build_category_index(session, version, keywords)
+        with _lock:
+            _index = index
+
+    return index
+
+
+def clear_category_index() -> None:
+    global _index
+
+    with _lock:
+        _index = None
@@ -0,0 +1,51 @@
+import os
+import threading
+import time
+from typing import Optional
+
+from sqlalchemy.exc import SQLAlchemyError
+from sqlmodel import Session, select
+
+from app.models import DatasetVersion
+
+# How long a dataset version read from the DB is trusted before checking again
+DATASET_VERSION_TTL = float(os.environ.get("DATASET_VERSION_TTL", "60"))
+
+_version: Optional[str] = None
+_checked_at: Optional[float] = None
+_lock = threading.Lock()
+
+
+def read_dataset_version(session: Session) -> Optional[str]:
+    """
+    Version written by `scripts/populate.py` on each load.
+    None if the table does not exist yet (data loaded by an older script).
+    """
+    statement = select(DatasetVersion.version).order_by(DatasetVersion.loaded_at.desc())
+    try:
+        return session.exec(statement).first()
+    except SQLAlchemyError:
+        return None
+
+
+def get_dataset_version(session: Session) -> Optional[str]:
+    """`read_dataset_version`, cached for DATASET_VERSION_TTL seconds."""
+    global _version, _checked_at
+
+    now = time.monotonic()
+    with _lock:
+        if _checked_at is not None and now - _checked_at < DATASET_VERSION_TTL:
+            return _version
+
+    version = read_dataset_version(session)
+
+    with _lock:
+        _version, _checked_at = version, now
+    return version
+
+
+def clear_dataset_version() -> None:
+    global _version, _checked_at
+
+    with _lock:
+        _version, _checked_at = None, None
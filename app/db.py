@@ -1,5 +1,15 @@
+import asyncio
 import os
-from sqlalchemy import create_engine
+from contextlib import AsyncExitStack
+from typing import Optional
+
+from fastapi import Depends
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.log import logger
+from app.admission import AdmissionController, AdmittedQueuePool
+from app.metrics import instrument_engine
 
 USERNAME = os.environ.get("ADMIN_USERNAME")
 PASSWORD = os.environ.get("ADMIN_PASSWORD")
@@ -17,15 +27,129 @@ DRIVER_OPTIONS = (
     "TrustServerCertificate=no;"
 )
 
-CONN_STR = f"mssql+pyodbc://?odbc_connect={DRIVER_OPTIONS}"
+CONN_STR = f"mssql+aioodbc://?odbc_connect={DRIVER_OPTIONS}"
+
+# "mssql" reads from Azure SQL, "sqlite" from a database file written by
+# `scripts/populate.py --sqlite`, e.g. the one baked into the image
+DB_BACKENDS = ("mssql", "sqlite")
+DB_BACKEND = os.environ.get("DB_BACKEND", "mssql")
+SQLITE_PATH = os.environ.get("SQLITE_PATH", "data/food.db")
+
+# Connections in use at once per backend, beyond which requests queue then get
+# a 503: the smallest serverless SKU saturates with a few, a local file does not.
+# For the whole server: each of its WORKERS processes admits its share.
+DB_CONCURRENCY_LIMITS = {"mssql": 4, "sqlite": 16}
+DB_MAX_CONCURRENCY = os.environ.get("DB_MAX_CONCURRENCY")
+# Server processes, as run by the Docker image
+WORKERS = int(os.environ.get("WORKERS", "1"))
+
+# Statement echo for local debugging only, metrics cover production
+SQL_ECHO = os.environ.get("SQL_ECHO", "0") == "1"
+
+# Opened by the startup warm-up, so that the first requests do not connect
+WARMUP_CONNECTIONS = int(os.environ.get("WARMUP_CONNECTIONS", "2"))
+
+_engine: Optional[AsyncEngine] = None
+_session_factory: Optional[async_sessionmaker] = None
+
+
+def get_engine() -> AsyncEngine:
+    """
+    Engine of DB_BACKEND, created on first use: importing the app neither
+    loads the ODBC driver nor connects, which keeps cold starts short.
+    """
+    global _engine
+
+    if _engine is None:
+        _engine = create_backend_engine(DB_BACKEND)
+        instrument_engine(_engine.sync_engine)
+    return _engine
+
+
+def admission_limit(backend: str) -> int:
+    """Connections this process may use at once, its share of the limit."""
+    limit = int(DB_MAX_CONCURRENCY or DB_CONCURRENCY_LIMITS[backend])
+    return max(1, limit // WORKERS)
+
+
+def admission_controller(backend: str) -> AdmissionController:
+    return AdmissionController(backend, admission_limit(backend))
+
+
+def pool_options(backend: str) -> dict:
+    """
+    Pool of a backend, sized to its admission limit: an admitted checkout
+    always gets a connection, instead of waiting `pool_timeout` for one and
+    bypassing the 503s.
+    """
+    admission = admission_controller(backend)
+    return {
+        "poolclass": AdmittedQueuePool,
+        "admission": admission,
+        "pool_size": admission.limit,
+        "max_overflow": 0,
+    }
+
+
+def create_backend_engine(backend: str) -> AsyncEngine:
+    """
+    Engine of one of the DB_BACKENDS. Both hold the same tables, so the
+    queries of `app.utils` run unchanged on either.
+    """
+    if backend == "mssql":
+        logger.info(
+            "Database configured",
+            extra={"fields": {"server": SERVER, "database": DATABASE}},
+        )
+        return create_async_engine(
+            CONN_STR,
+            echo=SQL_ECHO,
+            **pool_options(backend),
+        )
+
+    if backend == "sqlite":
+        logger.info("Database configured", extra={"fields": {"file": SQLITE_PATH}})
+        # Read-only: the file is only written by scripts/populate.py
+        engine = create_async_engine(
+            f"sqlite+aiosqlite:///file:{SQLITE_PATH}?mode=ro&uri=true",
+            echo=SQL_ECHO,
+            **pool_options(backend),
+        )
+        # The models' tables live in SQL Server's dbo schema, SQLite has none
+        return engine.execution_options(schema_translate_map={"dbo": None})
+
+    raise ValueError(f"DB_BACKEND must be one of {DB_BACKENDS}, not {backend!r}")
+
+
+def get_session_factory() -> async_sessionmaker:
+    """
+    Dependency giving the session factory, for endpoints that need several
+    sessions at once (e.g. concurrent queries). Override it to change database.
+    """
+    global _session_factory
+
+    if _session_factory is None:
+        _session_factory = async_sessionmaker(
+            get_engine(), class_=AsyncSession, expire_on_commit=False
+        )
+    return _session_factory
 
-print(CONN_STR)
 
-engine = create_engine(CONN_STR, echo=True)
+async def open_pool(engine: AsyncEngine, size: int = WARMUP_CONNECTIONS) -> None:
+    """Open `size` pooled connections at once, then give them back to the pool."""
+    # Beyond the admission limit, the last ones would wait for the first ones
+    admission = getattr(engine.pool, "admission", None)
+    if admission is not None:
+        size = min(size, admission.limit)
 
+    async with AsyncExitStack() as stack:
+        await asyncio.gather(
+            *(stack.enter_async_context(engine.connect()) for _ in range(size))
+        )
 
-def get_db_session():
-    from sqlmodel import Session
 
-    with Session(engine) as session:
+async def get_db_session(
+    session_factory: async_sessionmaker = Depends(get_session_factory),
+):
+    async with session_factory() as session:
         yield session
@@ -0,0 +1,160 @@
+import gzip
+import os
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import brotli
+import msgpack
+import orjson
+from starlette.requests import Request
+from starlette.responses import Response
+
+from app.snapshot import INTEGER_COLUMNS, TEXT_COLUMNS
+
+JSON = "application/json"
+ARROW = "application/vnd.apache.arrow.stream"
+MSGPACK = "application/msgpack"
+# In order of preference when the client accepts several equally
+MEDIA_TYPES = [JSON, ARROW, MSGPACK]
+ENCODINGS = ["br", "gzip"]
+
+# Responses vary with these request headers, caches must key on them too
+VARY = "Accept, Accept-Encoding"
+
+# JSON bodies smaller than this are sent uncompressed
+COMPRESS_MIN_SIZE = int(os.environ.get("COMPRESS_MIN_SIZE", "1024"))
+# Fast settings rather than the smallest bodies: responses are compressed per
+# request
+BROTLI_QUALITY = 5
+GZIP_LEVEL = 1
+
+Columns = Dict[str, list]
+
+
+def parse_accept(header: Optional[str]) -> Dict[str, float]:
+    """Values of an Accept or Accept-Encoding header, with their q-value."""
+    weights = {}
+    for part in (header or "").split(","):
+        value, *params = part.split(";")
+        value = value.strip().lower()
+        if not value:
+            continue
+
+        weight = 1.0
+        for param in params:
+            key, _, number = param.strip().partition("=")
+            if key == "q":
+                try:
+                    weight = float(number)
+                except ValueError:
+                    weight = 0.0
+        weights[value] = weight
+    return weights
+
+
+def preferred(header: Optional[str], offers: List[str]) -> Optional[str]:
+    """
+    Offer the client accepts with the highest q-value, the first of `offers`
+    on ties. Wildcards (*/*, application/*, *) match any offer they cover.
+    """
+    weights = parse_accept(header)
+
+    def weight(offer: str) -> float:
+        kind = offer.split("/")[0]
+        for value in (offer, f"{kind}/*", "*/*", "*"):
+            if value in weights:
+                return weights[value]
+        return 0.0
+
+    best = max(offers, key=weight)
+    return best if weight(best) > 0 else None
+
+
+def negotiate_media_type(request: Request) -> str:
+    """Format asked by the `Accept` header: JSON unless Arrow or MessagePack."""
+    return preferred(request.headers.get("accept"), MEDIA_TYPES) or JSON
+
+
+def negotiate_encoding(request: Request) -> Optional[str]:
+    """Compression asked by `Accept-Encoding`, None for none."""
+    return preferred(request.headers.get("accept-encoding"), ENCODINGS)
+
+
+def representation(request: Request) -> str:
+    """Media type and encoding of the response, for its ETag."""
+    return f"{negotiate_media_type(request)};{negotiate_encoding(request)}"
+
+
+def grouped_columns(key: str, groups: Iterable[Tuple[str, Optional[list]]]) -> Columns:
+    """
+    Rows of every group as one table, column by column, with the group in
+    column `key`. Rows reduced to a food name become a `nom` column.
+    """
+    labels, rows = [], []
+    for label, items in groups:
+        for item in items or []:
+            labels.append(label)
+            rows.append(item if isinstance(item, dict) else {"nom": item})
+
+    names = dict.fromkeys(name for row in rows for name in row)
+    return {key: labels, **{name: [row.get(name) for row in rows] for name in names}}
+
+
+def encode_arrow(columns: Columns) -> bytes:
+    """Arrow IPC stream of one record batch, typed like food_table."""
+    # Imported on first use, it is slow to import and only some clients ask
+    import pyarrow as pa
+
+    def arrow_type(name: str) -> pa.DataType:
+        if name == "id" or name in INTEGER_COLUMNS:
+            return pa.int64()
+        if name in TEXT_COLUMNS or name == "nutrient":
+            return pa.string()
+        return pa.float64()
+
+    batch = pa.record_batch(
+        [pa.array(values, type=arrow_type(name)) for name, values in columns.items()],
+        names=list(columns),
+    )
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
+
+
+def encode_msgpack(columns: Columns) -> bytes:
+    """MessagePack map of column name -> values."""
+    return msgpack.packb(columns)
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+def negotiated_response(
+    request: Request, content: Any, columns: Callable[[], Columns]
+) -> Response:
+    """
+    `content` in the format the client asks for. Arrow and MessagePack bodies
+    are columnar, built by `columns`, so that they load as a DataFrame
+    directly; the JSON fallback keeps the documented shape, compressed when
+    the client accepts it.
+    """
+    headers = {"Vary": VARY}
+    media_type = negotiate_media_type(request)
+
+    if media_type == ARROW:
+        return Response(encode_arrow(columns()), media_type=ARROW, headers=headers)
+    if media_type == MSGPACK:
+        return Response(encode_msgpack(columns()), media_type=MSGPACK, headers=headers)
+
+    # Same options as ORJSONResponse
+    body = orjson.dumps(
+        content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+    )
+    encoding = negotiate_encoding(request)
+    if encoding is not None and len(body) >= COMPRESS_MIN_SIZE:
+        body = compress(body, encoding)
+        headers["Content-Encoding"] = encoding
+    return Response(body, media_type=JSON, headers=headers)
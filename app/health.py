@@ -0,0 +1,64 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.log import logger
+
+STARTING = "starting"
+WARMING = "warming"
+READY = "ready"
+FAILED = "failed"
+
+
+class WarmUp:
+    """
+    Startup work (opening the pool, loading caches) run in a background task,
+    so that the server answers right away: liveness probes pass at once, and
+    readiness waits for `ready`. A failed warm-up can be started again.
+    """
+
+    def __init__(self, steps: Callable[[], Awaitable[None]]):
+        self.steps = steps
+        self.state = STARTING
+        self.error: Optional[str] = None
+        self.duration: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state == READY
+
+    def start(self) -> None:
+        if self._task is None or (self._task.done() and self.state == FAILED):
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self) -> None:
+        self.state, self.error = WARMING, None
+        start = time.perf_counter()
+        try:
+            await self.steps()
+        except Exception as e:  # any failure must show in readiness, not hang it
+            self.state, self.error = FAILED, str(e)
+            logger.warning("Warm-up failed, data will be read on first request: %s", e)
+        else:
+            self.state = READY
+        self.duration = time.perf_counter() - start
+        logger.info(
+            "Warm-up finished",
+            extra={"fields": {"state": self.state, "duration": self.duration}},
+        )
+
+    async def wait(self) -> None:
+        if self._task is not None:
+            await asyncio.shield(self._task)
+
+    async def stop(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def report(self) -> Dict[str, Any]:
+        return {"status": self.state, "duration": self.duration, "error": self.error}
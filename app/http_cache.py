@@ -0,0 +1,33 @@
+import hashlib
+import os
+from typing import Optional
+
+from starlette.requests import Request
+
+# How long clients and CDNs may reuse a response before revalidating it
+CACHE_MAX_AGE = int(os.environ.get("CACHE_MAX_AGE", "300"))
+
+
+def make_etag(version: str, request: Request, variant: str = "") -> str:
+    """
+    Strong ETag for a dataset version and a normalized request URL, and the
+    `variant` (format and encoding) of the response if it has several.
+    """
+    query = "&".join(
+        f"{key}={value}" for key, value in sorted(request.query_params.multi_items())
+    )
+    key = f"{version}|{request.url.path}|{query}|{variant}"
+    return '"' + hashlib.sha256(key.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match check, with weak comparison as required for GET."""
+    if not if_none_match:
+        return False
+
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in (tag.removeprefix("W/") for tag in tags)
+
+
+def cache_headers(etag: str) -> dict:
+    return {"ETag": etag, "Cache-Control": f"public, max-age={CACHE_MAX_AGE}"}
@@ -0,0 +1,37 @@
+import json
+import logging
+import os
+import sys
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with the `fields` passed in `extra`."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        data.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+def configure_logging() -> None:
+    app_logger = logging.getLogger("app")
+    if app_logger.handlers:
+        return
+
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter())
+    app_logger.addHandler(handler)
+    app_logger.setLevel(LOG_LEVEL)
+    app_logger.propagate = False
+
+
+logger = logging.getLogger("app")
@@ -1,93 +1,458 @@
-from fastapi import FastAPI, Depends
-from sqlmodel import Session
-from typing import List, Dict, Any
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, Query, Request, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import List, Dict, Any, Optional
 
 from app.utils import (
+    FOOD_COLUMNS,
+    PAGE_SIZE,
     map_categories,
+    parse_fields,
     validate_params,
-    get_top_foods_by_category,
+    get_top_foods_by_categories,
+    get_top_foods_batch,
+    validate_batch,
+    validate_ranking_params,
     validate_phase,
     get_top_food_by_abs_nutrient,
     get_seasoned_food,
+    get_phase_recommendations,
+    get_food_ranking_page,
+    stream_food_ranking,
+    validate_page_size,
+    SEARCH_LIMIT,
+    validate_search,
+    validate_basis,
+)
+from app.admission import Overloaded
+from app.categories import TOP_FOODS_CATEGORIES, get_category_index
+from app.dataset import get_dataset_version
+from app.formats import (
+    ARROW,
+    MSGPACK,
+    VARY,
+    grouped_columns,
+    negotiated_response,
+    representation,
+)
+from app.http_cache import cache_headers, etag_matches, make_etag
+from app.log import configure_logging, logger
+from app.metrics import observe_request, start_request_stats
+from app.phases import phases, phase_nutrients
+from app.schemas import (
+    FoodByPhaseResponse,
+    FoodPage,
+    SearchResponse,
+    SeasonResponse,
+    TopFoodsBatchRequest,
+    TopFoodsBatchResponse,
+    TopFoodsResponse,
 )
-from app.db import get_db_session
+from app.db import get_db_session, get_session_factory, open_pool
+from app.health import WarmUp
+from app.result_cache import get_result_cache, normalize_percentage
+from app.search import get_search_index
+from app.season import get_season_calendar
+from app.snapshot import (
+    BASIS_100G,
+    SNAPSHOT_ENABLED,
+    get_snapshot,
+    reload_snapshot,
+)
+
+
+def app_session_factory(app: FastAPI) -> async_sessionmaker:
+    """`get_session_factory`, honouring dependency overrides outside endpoints."""
+    overrides = app.dependency_overrides
+    return overrides.get(get_session_factory, get_session_factory)()
+
+
+configure_logging()
+
+
+async def warm_up(app: FastAPI) -> None:
+    """Connect to the database and load the cached data before traffic comes."""
+    session_factory = app_session_factory(app)
+    await open_pool(session_factory.kw["bind"])
+
+    async with session_factory() as session:
+        await session.run_sync(get_category_index, TOP_FOODS_CATEGORIES)
+        await session.run_sync(get_search_index)
+        if SNAPSHOT_ENABLED:
+            snapshot = await session.run_sync(reload_snapshot)
+            logger.info("Food snapshot loaded (%d rows)", len(snapshot))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    get_season_calendar().warm()
+
+    # Not awaited: the server starts at once, /health/ready tells when it is warm
+    app.state.warmup = WarmUp(lambda: warm_up(app))
+    app.state.warmup.start()
+    yield
+    await app.state.warmup.stop()
+
+
+# Endpoints return an ORJSONResponse themselves: response models document the
+# output, but the payload (plain dicts and lists) skips validation and encoding
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+
+
+async def current_dataset_version(session_factory: async_sessionmaker) -> Optional[str]:
+    async with session_factory() as session:
+        return await session.run_sync(get_dataset_version)
+
+
+async def resource_version(request: Request) -> Optional[str]:
+    """
+    Version of the data behind a route: the dataset version written by
+    `scripts/populate.py` (cached, so usually no DB access), or the seasonal
+    calendar's. None for routes that are not cached.
+    """
+    if request.url.path == "/by-season/":
+        return get_season_calendar().version
+
+    if request.url.path in (
+        "/top-foods/",
+        "/food-by-phase/",
+        "/food-by-nutrient/",
+        "/search/",
+    ):
+        return await current_dataset_version(app_session_factory(request.app))
+
+    return None
+
+
+def overloaded_response(error: Overloaded) -> Response:
+    return ORJSONResponse(
+        {"detail": str(error)},
+        status_code=503,
+        headers={"Retry-After": str(error.retry_after)},
+    )
+
+
+@app.exception_handler(Overloaded)
+async def shed_load(request: Request, error: Overloaded):
+    return overloaded_response(error)
+
+
+# Routes answering in the format negotiated by `app.formats`
+NEGOTIATED_PATHS = ("/top-foods/", "/food-by-phase/")
+# Their columnar formats, documented besides JSON
+COLUMNAR_RESPONSES = {200: {"content": {ARROW: {}, MSGPACK: {}}}}
+
+
+@app.middleware("http")
+async def dataset_etag(request: Request, call_next):
+    if request.method != "GET":
+        return await call_next(request)
+
+    try:
+        version = await resource_version(request)
+    except Overloaded as e:
+        # Raised outside of the endpoints, so not seen by the exception handler
+        return overloaded_response(e)
+    if version is None:
+        return await call_next(request)
+
+    headers = {}
+    variant = ""
+    if request.url.path in NEGOTIATED_PATHS:
+        # Each format and encoding is a representation with its own ETag
+        variant = representation(request)
+        headers["Vary"] = VARY
+
+    etag = make_etag(version, request, variant)
+    headers.update(cache_headers(etag))
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    response = await call_next(request)
+    if response.status_code == 200:
+        response.headers.update(headers)
+    return response
+
+
+# Probes and scrapes would drown the API's own traffic in the metrics
+UNMONITORED_PATHS = ("/metrics", "/health/live", "/health/ready")
+
+
+# Added last, so it wraps everything else (304 answers included)
+@app.middleware("http")
+async def request_metrics(request: Request, call_next):
+    if request.url.path in UNMONITORED_PATHS:
+        return await call_next(request)
+
+    stats = start_request_stats()
+    start = time.perf_counter()
+    response = await call_next(request)
+    duration = time.perf_counter() - start
+
+    # Label by route template, not raw path, to keep label cardinality bounded
+    route = request.scope.get("route")
+    observe_request(
+        route.path if route is not None else "other",
+        request.method,
+        response.status_code,
+        duration,
+        stats,
+    )
+    return response
+
 
-app = FastAPI()
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        # Several workers: aggregate the samples each of them writes there
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 
-@app.get("/top-foods/", response_model=List[Dict])
-def read_top_foods(
+@app.get("/health/live", include_in_schema=False)
+async def liveness():
+    return ORJSONResponse({"status": "alive"})
+
+
+@app.get("/health/ready", include_in_schema=False)
+async def readiness(request: Request):
+    warmup: WarmUp = request.app.state.warmup
+    if warmup.ready:
+        return ORJSONResponse(warmup.report())
+
+    # Retried on the next probe, e.g. when the database was not up yet
+    warmup.start()
+    return ORJSONResponse(warmup.report(), status_code=503)
+
+
+@app.get("/top-foods/", response_model=TopFoodsResponse, responses=COLUMNAR_RESPONSES)
+async def read_top_foods(
+    request: Request,
     nutrient,
     percentage: float = 0.20,
-    session: Session = Depends(get_db_session),
+    fields: Optional[str] = None,
+    basis: str = BASIS_100G,
+    session_factory: async_sessionmaker = Depends(get_session_factory),
 ):
-    categories = [
-        "Fruits",
-        "Légumes",
-        "Lait",
-        "Poisson",
-        "Œufs",
-        "Produits céréaliers",
-        "Noix",
-        "arômes",
-        "viande",
-        "petit-déjeuner",
-    ]
-
     validate_params(nutrient, percentage)
+    validate_basis(basis, nutrient)
+    selected_fields = parse_fields(fields)
+    percentage = normalize_percentage(percentage)
 
-    category_mapping: Dict[str, List[str]] = map_categories(session, categories)
-
-    final_result: List[Dict[str, Any]] = []
-
-    for key, value in category_mapping.items():
-        top_foods = get_top_foods_by_category(session, value, percentage, nutrient)
-        final_result.append({"categorie": key, "aliments": top_foods})
-
-    return final_result
-
-
-phases = {
-    "menstruelle": [
-        ("fer", []),
-        ("vitamine_c", ["Fruits", "Légumes"]),
-        ("magnesium", []),
-        ("acide_alpha_linolenique", ["Poissons"]),
-    ],
-    "folliculaire": [
-        ("proteines", []),
-        ("*", ["Légumes"]),
-        ("glucides_disponibles", ["flocons et céréales"]),
-    ],
-    "ovulatoire": [
-        ("zinc", ["Fruits de mer", "Viande"]),
-        ("fibres_alimentaires", []),
-        ("vitamine_c", []),
-        ("selenium", []),
-        ("zinc", []),
-    ],
-    "luteale": [("vitamine_b", []), ("magnesium", [])],
-}
-
-
-@app.get("/food-by-phase/", response_model=List[Dict])
-def read_food_by_phase(
-    phase: str, percentage: float = 0.1, session: Session = Depends(get_db_session)
+    # Its own session: the result may outlive this request, see ResultCache
+    async def compute() -> List[Dict[str, Any]]:
+        async with session_factory() as session:
+            category_mapping: Dict[str, List[str]] = await session.run_sync(
+                map_categories, TOP_FOODS_CATEGORIES
+            )
+            return await session.run_sync(
+                get_top_foods_by_categories,
+                category_mapping,
+                percentage,
+                nutrient,
+                selected_fields,
+                basis,
+            )
+
+    key = (
+        nutrient,
+        percentage,
+        selected_fields and tuple(selected_fields),
+        basis,
+        await current_dataset_version(session_factory),
+    )
+    final_result = await get_result_cache("/top-foods/").get(key, compute)
+
+    return negotiated_response(
+        request,
+        final_result,
+        lambda: grouped_columns(
+            "categorie",
+            ((group["categorie"], group["aliments"]) for group in final_result),
+        ),
+    )
+
+
+@app.post("/top-foods/batch", response_model=TopFoodsBatchResponse)
+async def read_top_foods_batch(
+    batch: TopFoodsBatchRequest,
+    session: AsyncSession = Depends(get_db_session),
+):
+    keys = [spec.result_key() for spec in batch.specs]
+    validate_batch(keys)
+
+    specs = []
+    for spec in batch.specs:
+        validate_ranking_params(spec.nutrient, spec.percentage)
+        validate_basis(spec.basis, spec.nutrient)
+        specs.append(
+            (
+                spec.nutrient,
+                spec.percentage,
+                list(dict.fromkeys(spec.categories or TOP_FOODS_CATEGORIES)),
+                parse_fields(spec.fields),
+                spec.basis,
+            )
+        )
+
+    # Keywords shared by several specs are mapped once
+    keywords = list(
+        dict.fromkeys(keyword for _, _, names, _, _ in specs for keyword in names)
+    )
+    category_mapping: Dict[str, List[str]] = await session.run_sync(
+        map_categories, keywords
+    )
+
+    results = await session.run_sync(get_top_foods_batch, specs, category_mapping)
+
+    return ORJSONResponse(dict(zip(keys, results)))
+
+
+async def rank_nutrient(
+    session_factory: async_sessionmaker,
+    nutrient: str,
+    percentage: float,
+    fields: Optional[List[str]],
+    basis: str = BASIS_100G,
+):
+    # One session per nutrient, so that the queries can run concurrently
+    async with session_factory() as session:
+        return await session.run_sync(
+            lambda sync_session: get_top_food_by_abs_nutrient(
+                nutrient, percentage, sync_session, fields=fields, basis=basis
+            )
+        )
+
+
+@app.get(
+    "/food-by-phase/", response_model=FoodByPhaseResponse, responses=COLUMNAR_RESPONSES
+)
+async def read_food_by_phase(
+    request: Request,
+    phase: str,
+    percentage: float = 0.1,
+    fields: Optional[str] = None,
+    basis: str = BASIS_100G,
+    session_factory: async_sessionmaker = Depends(get_session_factory),
 ):
     validate_phase(phase, phases.keys())
+    validate_basis(basis)
+    selected_fields = parse_fields(fields)
+    percentage = normalize_percentage(percentage)
+
+    names = phase_nutrients(phase)
+
+    # By default only the name and the ranked nutrient are sent, fields=* gives
+    # full rows
+    projections = {
+        name: selected_fields or ["nom", name] for name in names if name in FOOD_COLUMNS
+    }
+
+    async def compute() -> Dict[str, List[Dict[str, Any]]]:
+        if get_snapshot() is None:
+            async with session_factory() as session:
+                top_food = await session.run_sync(
+                    get_phase_recommendations,
+                    phase,
+                    names,
+                    percentage,
+                    projections,
+                    basis,
+                )
+            if top_food is not None:
+                return top_food
+
+        results = await asyncio.gather(
+            *(
+                rank_nutrient(
+                    session_factory, name, percentage, projections.get(name), basis
+                )
+                for name in names
+            )
+        )
+        return dict(zip(names, results))
+
+    key = (
+        phase,
+        percentage,
+        selected_fields and tuple(selected_fields),
+        basis,
+        await current_dataset_version(session_factory),
+    )
+    top_food = await get_result_cache("/food-by-phase/").get(key, compute)
+
+    return negotiated_response(
+        request, [top_food], lambda: grouped_columns("nutrient", top_food.items())
+    )
+
 
-    nutrients_array = phases[phase]
-    top_food = {}
-    for nutrient in nutrients_array:
-        name, _ = (
-            nutrient  # The _ stands for a specific category (not in use right now)
+@app.get("/food-by-nutrient/", response_model=FoodPage)
+async def read_food_by_nutrient(
+    nutrient: str,
+    percentage: float = 0.1,
+    fields: Optional[str] = None,
+    limit: int = PAGE_SIZE,
+    cursor: Optional[str] = None,
+    stream: bool = False,
+    basis: str = BASIS_100G,
+    session_factory: async_sessionmaker = Depends(get_session_factory),
+):
+    validate_ranking_params(nutrient, percentage)
+    validate_basis(basis, nutrient)
+    validate_page_size(limit)
+    selected_fields = parse_fields(fields) or ["nom", nutrient]
+
+    if stream:
+        # The first chunk is read before the response starts, so that an
+        # overloaded database still gets its 503
+        chunks = await stream_food_ranking(
+            session_factory, nutrient, percentage, selected_fields, basis
+        )
+
+        return StreamingResponse(chunks, media_type="application/x-ndjson")
+
+    async with session_factory() as session:
+        page = await session.run_sync(
+            get_food_ranking_page,
+            nutrient,
+            percentage,
+            selected_fields,
+            limit,
+            cursor,
+            basis,
         )
-        top_food[name] = get_top_food_by_abs_nutrient(name, percentage, session)
 
-    return [top_food]
+    return ORJSONResponse(page)
+
+
+@app.get("/search/", response_model=SearchResponse)
+async def search_foods(
+    q: str,
+    limit: int = SEARCH_LIMIT,
+    session: AsyncSession = Depends(get_db_session),
+):
+    validate_search(q, limit)
+
+    # Built once per dataset version, then queries never reach the database
+    index = await session.run_sync(get_search_index)
+
+    return ORJSONResponse(index.search(q, limit))
 
 
-@app.get("/by-season/", response_model=List[Dict])
-def read_season(month: int, session: Session = Depends(get_db_session)):
-    foods = get_seasoned_food(month)
-    return [foods]
+@app.get("/by-season/", response_model=SeasonResponse)
+async def read_season(month: int = Query(ge=1, le=12)):
+    foods = await get_seasoned_food(month)
+    return ORJSONResponse([foods])
@@ -0,0 +1,173 @@
+import os
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Optional
+
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import ORMExecuteState, Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.log import logger
+
+# Requests slower than this are logged with their DB statistics
+SLOW_REQUEST_SECONDS = float(os.environ.get("SLOW_REQUEST_SECONDS", "0.5"))
+
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+ROW_BUCKETS = (0, 1, 10, 50, 100, 500, 1000, 5000, 10000)
+
+REQUESTS = Counter("api_requests_total", "HTTP requests", ["route", "method", "status"])
+REQUEST_DURATION = Histogram(
+    "api_request_duration_seconds", "HTTP request duration", ["route", "method"]
+)
+DB_STATEMENTS = Histogram(
+    "api_db_statements_per_request",
+    "SQL statements per request",
+    ["route"],
+    buckets=COUNT_BUCKETS,
+)
+DB_TIME = Histogram(
+    "api_db_time_seconds", "Time spent executing SQL per request", ["route"]
+)
+DB_ROWS = Histogram(
+    "api_db_rows_per_request",
+    "Rows returned by the DB per request",
+    ["route"],
+    buckets=ROW_BUCKETS,
+)
+DB_POOL_WAIT = Histogram(
+    "api_db_pool_wait_seconds", "Time waiting for a pooled connection", ["route"]
+)
+SLOW_REQUESTS = Counter(
+    "api_slow_requests_total", "Requests slower than SLOW_REQUEST_SECONDS", ["route"]
+)
+# "livesum": with several workers, the sum over the running ones
+ADMISSION_ACTIVE = Gauge(
+    "api_admission_active",
+    "Database connections admitted and in use",
+    ["backend"],
+    multiprocess_mode="livesum",
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "api_admission_queue_depth",
+    "Requests waiting to be admitted to the database",
+    ["backend"],
+    multiprocess_mode="livesum",
+)
+ADMISSION_WAIT = Histogram(
+    "api_admission_wait_seconds",
+    "Time waited before being admitted to the database",
+    ["backend"],
+)
+ADMISSION_REJECTED = Counter(
+    "api_admission_rejected_total",
+    "Requests answered 503 because the database was saturated",
+    ["backend", "reason"],
+)
+RESULT_CACHE = Counter(
+    "api_result_cache_requests_total",
+    "Results served from the cache (hit), computed (miss), or shared with an "
+    "identical request in flight (coalesced)",
+    ["route", "outcome"],
+)
+
+
+@dataclass
+class RequestStats:
+    statements: int = 0
+    db_time: float = 0.0
+    rows: int = 0
+    pool_wait: float = 0.0
+
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar(
+    "request_stats", default=None
+)
+
+
+def start_request_stats() -> RequestStats:
+    """Collect DB statistics for the current request (and the tasks it starts)."""
+    stats = RequestStats()
+    _request_stats.set(stats)
+    return stats
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    return _request_stats.get()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info["query_start"].pop()
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.db_time += time.perf_counter() - start
+
+
+def _count_rows(orm_execute_state: ORMExecuteState):
+    stats = _request_stats.get()
+    if stats is None or not orm_execute_state.is_select:
+        return None
+    if orm_execute_state.execution_options.get("stream_results"):
+        return None
+
+    # Buffer the result to count its rows; callers read it all anyway
+    frozen = orm_execute_state.invoke_statement().freeze()
+    stats.rows += len(frozen.data)
+    return frozen()
+
+
+def instrument_engine(engine: Engine) -> None:
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+event.listen(Session, "do_orm_execute", _count_rows)
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Pool recording how long each checkout waited for a connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            stats = _request_stats.get()
+            if stats is not None:
+                stats.pool_wait += time.perf_counter() - start
+
+
+def observe_request(
+    route: str, method: str, status: int, duration: float, stats: RequestStats
+) -> None:
+    REQUESTS.labels(route, method, str(status)).inc()
+    REQUEST_DURATION.labels(route, method).observe(duration)
+    DB_STATEMENTS.labels(route).observe(stats.statements)
+    DB_TIME.labels(route).observe(stats.db_time)
+    DB_ROWS.labels(route).observe(stats.rows)
+    DB_POOL_WAIT.labels(route).observe(stats.pool_wait)
+
+    if duration >= SLOW_REQUEST_SECONDS:
+        SLOW_REQUESTS.labels(route).inc()
+        logger.warning(
+            "Slow request",
+            extra={
+                "fields": {
+                    "route": route,
+                    "method": method,
+                    "status": status,
+                    "duration_ms": round(duration * 1000, 1),
+                    "db_statements": stats.statements,
+                    "db_time_ms": round(stats.db_time * 1000, 1),
+                    "db_rows": stats.rows,
+                    "pool_wait_ms": round(stats.pool_wait * 1000, 1),
+                }
+            },
+        )
@@ -1,5 +1,6 @@
 from sqlmodel import Field, SQLModel
 from typing import Optional
+from datetime import datetime
 
 
 class Food(SQLModel, table=True):
@@ -50,3 +51,77 @@ class Food(SQLModel, table=True):
     iode: Optional[float]
     zinc: Optional[float]
     selenium: Optional[float]
+
+
+class DatasetVersion(SQLModel, table=True):
+    __tablename__ = "dataset_version"
+    __table_args__ = {"schema": "dbo"}
+
+    version: str = Field(primary_key=True)
+    loaded_at: datetime
+
+
+class FoodDensity(SQLModel, table=True):
+    """
+    Nutrients of each food per kcal, in g/kcal, built at ingest. NULL when the
+    nutrient is missing or the food has no calories.
+    """
+
+    __tablename__ = "food_density_table"
+    __table_args__ = {"schema": "dbo"}
+
+    id: int = Field(primary_key=True)
+    lipides_totaux: Optional[float] = None
+    acides_gras_satures: Optional[float] = None
+    acides_gras_mono_insatures: Optional[float] = None
+    acides_gras_poly_insatures: Optional[float] = None
+    acide_linoleique: Optional[float] = None
+    acide_alpha_linolenique: Optional[float] = None
+    cholesterol: Optional[float] = None
+    glucides_disponibles: Optional[float] = None
+    sucres: Optional[float] = None
+    amidon: Optional[float] = None
+    fibres_alimentaires: Optional[float] = None
+    proteines: Optional[float] = None
+    sel: Optional[float] = None
+    alcool: Optional[float] = None
+    eau: Optional[float] = None
+    retinol: Optional[float] = None
+    betacarotene: Optional[float] = None
+    vitamine_b1: Optional[float] = None
+    vitamine_b2: Optional[float] = None
+    vitamine_b6: Optional[float] = None
+    vitamine_b12: Optional[float] = None
+    niacine: Optional[float] = None
+    folate: Optional[float] = None
+    acide_pantothenique: Optional[float] = None
+    vitamine_c: Optional[float] = None
+    vitamine_d: Optional[float] = None
+    vitamine_e: Optional[float] = None
+    potassium: Optional[float] = None
+    sodium: Optional[float] = None
+    chlore: Optional[float] = None
+    calcium: Optional[float] = None
+    magnesium: Optional[float] = None
+    phosphore: Optional[float] = None
+    fer: Optional[float] = None
+    iode: Optional[float] = None
+    zinc: Optional[float] = None
+    selenium: Optional[float] = None
+
+
+class PhaseRecommendation(SQLModel, table=True):
+    """
+    Ranking of every food for each nutrient of each phase, built at ingest,
+    per 100 g and per kcal (`basis`).
+    """
+
+    __tablename__ = "phase_recommendation_table"
+    __table_args__ = {"schema": "dbo"}
+
+    phase: str = Field(primary_key=True, max_length=32)
+    basis: str = Field(primary_key=True, max_length=8)
+    nutrient: str = Field(primary_key=True, max_length=64)
+    food_rank: int = Field(primary_key=True)
+    food_id: int
+    total_count: int
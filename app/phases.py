@@ -0,0 +1,31 @@
+from typing import List
+
+phases = {
+    "menstruelle": [
+        ("fer", []),
+        ("vitamine_c", ["Fruits", "Légumes"]),
+        ("magnesium", []),
+        ("acide_alpha_linolenique", ["Poissons"]),
+    ],
+    "folliculaire": [
+        ("proteines", []),
+        ("*", ["Légumes"]),
+        ("glucides_disponibles", ["flocons et céréales"]),
+    ],
+    "ovulatoire": [
+        ("zinc", ["Fruits de mer", "Viande"]),
+        ("fibres_alimentaires", []),
+        ("vitamine_c", []),
+        ("selenium", []),
+        ("zinc", []),
+    ],
+    "luteale": [("vitamine_b", []), ("magnesium", [])],
+}
+
+
+def phase_nutrients(phase: str) -> List[str]:
+    """
+    Nutrients of a phase, each listed once (e.g. zinc for 'ovulatoire').
+    The category part of each entry is not in use right now.
+    """
+    return list(dict.fromkeys(name for name, _ in phases[phase]))
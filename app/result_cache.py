@@ -0,0 +1,138 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+import orjson
+
+from app.metrics import RESULT_CACHE
+
+# Bytes of results kept per route and process, and for how long (seconds)
+RESULT_CACHE_BYTES = int(os.environ.get("RESULT_CACHE_BYTES", str(64 * 2**20)))
+RESULT_CACHE_TTL = float(os.environ.get("RESULT_CACHE_TTL", "60"))
+# Larger results (e.g. fields=* over most foods) are computed but not kept
+RESULT_CACHE_MAX_RESULT = int(
+    os.environ.get("RESULT_CACHE_MAX_RESULT", str(RESULT_CACHE_BYTES // 16))
+)
+# Percentages in cache keys, and the rankings computed for them, are rounded to
+# this many decimals: closer ones rank practically the same foods
+PERCENTAGE_DIGITS = 4
+
+HIT = "hit"
+MISS = "miss"
+COALESCED = "coalesced"
+
+
+class ResultCache:
+    """
+    Results of identical requests, computed once: a bounded LRU of recent
+    results expiring after `ttl` seconds, in front of a single-flight layer
+    where concurrent requests for a key being computed wait for that same
+    computation instead of starting their own.
+
+    The LRU is bounded by the estimated size of its results, `max_bytes` in
+    all, and results larger than `max_result` are not kept at all.
+
+    Keys must include the dataset version, so that a new load is never
+    answered from results of the previous one.
+    """
+
+    def __init__(
+        self,
+        route: str,
+        max_bytes: int,
+        ttl: float,
+        max_result: Optional[int] = None,
+    ):
+        self.route = route
+        self.max_bytes = max_bytes
+        self.max_result = max_bytes if max_result is None else max_result
+        self.ttl = ttl
+        self.size = 0
+        self._entries: OrderedDict[Hashable, Tuple[float, int, Any]] = OrderedDict()
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+
+    async def get(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None:
+            stored_at, _, value = entry
+            if time.monotonic() - stored_at < self.ttl:
+                self._entries.move_to_end(key)
+                RESULT_CACHE.labels(self.route, HIT).inc()
+                return value
+            self._evict(key)
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            RESULT_CACHE.labels(self.route, COALESCED).inc()
+        else:
+            RESULT_CACHE.labels(self.route, MISS).inc()
+            task = asyncio.ensure_future(compute())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+
+        # Shielded: a client going away must not cancel the others' result
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Task) -> None:
+        del self._in_flight[key]
+        # Failures are not cached, the next request tries again
+        if task.cancelled() or task.exception() is not None:
+            return
+        value = task.result()
+        size = estimated_size(value)
+        if size > min(self.max_result, self.max_bytes):
+            return
+
+        if key in self._entries:
+            self._evict(key)
+        self._entries[key] = (time.monotonic(), size, value)
+        self.size += size
+        while self.size > self.max_bytes:
+            self._evict(next(iter(self._entries)))
+
+    def _evict(self, key: Hashable) -> None:
+        _, size, _ = self._entries.pop(key)
+        self.size -= size
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.size = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def estimated_size(value: Any) -> int:
+    """Size of a result as JSON, a proxy for the memory it holds."""
+    return len(
+        orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    )
+
+
+def normalize_percentage(percentage: float) -> float:
+    """
+    `percentage` rounded to PERCENTAGE_DIGITS decimals, so that a few keys
+    cover every percentage clients send. Positive ones stay positive.
+    """
+    if percentage <= 0:
+        return percentage
+    return max(round(percentage, PERCENTAGE_DIGITS), 10**-PERCENTAGE_DIGITS)
+
+
+_caches: Dict[str, ResultCache] = {}
+
+
+def get_result_cache(route: str) -> ResultCache:
+    """The process-wide `ResultCache` of a route."""
+    if route not in _caches:
+        _caches[route] = ResultCache(
+            route, RESULT_CACHE_BYTES, RESULT_CACHE_TTL, RESULT_CACHE_MAX_RESULT
+        )
+    return _caches[route]
+
+
+def clear_result_caches() -> None:
+    for cache in _caches.values():
+        cache.clear()
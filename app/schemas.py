@@ -0,0 +1,74 @@
+from typing import Dict, List, Optional, Union
+
+from pydantic import BaseModel, create_model
+
+from app.models import Food
+
+# Any subset of food_table columns, depending on the `fields` parameter
+FoodRow = create_model(
+    "FoodRow",
+    **{
+        name: (Optional[field.annotation], None)
+        for name, field in Food.model_fields.items()
+    },
+)
+
+
+class TopFoodsGroup(BaseModel):
+    categorie: str
+    aliments: List[Union[str, FoodRow]]
+
+
+class FoodPage(BaseModel):
+    items: List[FoodRow]
+    # Pass it as `cursor` to get the next page, None on the last one
+    next_cursor: Optional[str] = None
+
+
+class TopFoodsSpec(BaseModel):
+    nutrient: str
+    percentage: float = 0.20
+    # Category keywords, those of /top-foods/ by default
+    categories: Optional[List[str]] = None
+    fields: Optional[str] = None
+    # Rank per 100 g or per kcal
+    basis: str = "100g"
+    # Key of the result, "<nutrient>:<percentage>" by default, followed by
+    # ":kcal" per kcal and the categories and fields when given
+    key: Optional[str] = None
+
+    def result_key(self) -> str:
+        if self.key:
+            return self.key
+        key = f"{self.nutrient}:{self.percentage:g}"
+        if self.basis == "kcal":
+            key += ":kcal"
+        if self.categories is not None:
+            key += f":categories={','.join(self.categories)}"
+        if self.fields is not None:
+            key += f":fields={self.fields}"
+        return key
+
+
+class TopFoodsBatchRequest(BaseModel):
+    specs: List[TopFoodsSpec]
+
+
+class SearchResult(BaseModel):
+    id: int
+    nom: str
+    categorie: str
+    # Similarity with the query, from 0 to 1
+    score: float
+
+
+class SeasonFoods(BaseModel):
+    legumes: Optional[List[str]] = None
+    fruits: Optional[List[str]] = None
+
+
+TopFoodsResponse = List[TopFoodsGroup]
+TopFoodsBatchResponse = Dict[str, TopFoodsResponse]
+FoodByPhaseResponse = List[Dict[str, Optional[List[FoodRow]]]]
+SearchResponse = List[SearchResult]
+SeasonResponse = List[Optional[SeasonFoods]]
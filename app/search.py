@@ -0,0 +1,172 @@
+import re
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlmodel import Session, select
+
+from app.categories import normalize_text
+from app.dataset import get_dataset_version
+from app.models import Food
+
+# Foods scoring below this similarity are not returned
+MIN_SIMILARITY = 0.4
+# Matches on a synonym rank a little below the same match on the name
+SYNONYM_WEIGHT = 0.9
+
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def words(text: Optional[str]) -> List[str]:
+    return WORD_PATTERN.findall(normalize_text(text)) if text else []
+
+
+def trigrams(word: str, prefix: bool = False) -> List[str]:
+    """
+    Trigrams of a word padded like PostgreSQL's pg_trgm ("  word "). Without
+    the end padding (`prefix`), they also match longer words.
+    """
+    padded = f"  {word}" if prefix else f"  {word} "
+    return list(dict.fromkeys(map("".join, zip(padded, padded[1:], padded[2:]))))
+
+
+class SearchIndex:
+    """
+    Accent and case insensitive trigram index on the names and synonyms of
+    the foods, built once per dataset version.
+
+    Each query word is compared to every indexed word at once: the score mixes
+    how much of the query word starts the indexed word (prefix matches score 1)
+    and their trigram similarity (exact matches score 1, typos a bit less).
+    A food scores the mean, over the query words, of its best matching word.
+    """
+
+    def __init__(
+        self,
+        foods: Iterable[Tuple[int, str, Optional[str], str]],
+        version: Optional[str] = None,
+    ):
+        self.version = version
+        self._foods: List[Dict[str, Any]] = []
+        self._names: List[str] = []
+
+        vocabulary: Dict[str, int] = {}
+        entries: Dict[Tuple[int, int], float] = {}
+        for food_id, nom, synonymes, categorie in foods:
+            # populate.py stores missing synonyms as the string "nan"
+            synonym_words = [] if synonymes == "nan" else words(synonymes)
+            food_words = [(word, 1.0) for word in words(nom)]
+            food_words += [(word, SYNONYM_WEIGHT) for word in synonym_words]
+            if not food_words:
+                continue
+
+            food = len(self._foods)
+            self._foods.append({"id": food_id, "nom": nom, "categorie": categorie})
+            self._names.append(" ".join(words(nom)))
+            for word, weight in food_words:
+                key = (food, vocabulary.setdefault(word, len(vocabulary)))
+                entries[key] = max(weight, entries.get(key, 0.0))
+
+        # (food, word, weight) entries sorted by food, to reduce scores per food
+        pairs = sorted(entries)
+        self._entry_words = np.array([word for _, word in pairs], dtype=np.int64)
+        self._entry_weights = np.array([entries[pair] for pair in pairs])
+        entry_foods = np.array([food for food, _ in pairs], dtype=np.int64)
+        self._food_starts = np.flatnonzero(
+            np.r_[True, entry_foods[1:] != entry_foods[:-1]]
+        )
+
+        postings: Dict[str, List[int]] = {}
+        word_sizes = np.zeros(len(vocabulary), dtype=np.float64)
+        for word, word_id in vocabulary.items():
+            word_trigrams = trigrams(word)
+            word_sizes[word_id] = len(word_trigrams)
+            for trigram in word_trigrams:
+                postings.setdefault(trigram, []).append(word_id)
+
+        self._word_sizes = word_sizes
+        self._postings = {
+            trigram: np.array(ids, dtype=np.int64) for trigram, ids in postings.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self._foods)
+
+    def _shared(self, query_trigrams: List[str]) -> np.ndarray:
+        """Number of `query_trigrams` in each indexed word."""
+        matches = [self._postings[t] for t in query_trigrams if t in self._postings]
+        if not matches:
+            return np.zeros(len(self._word_sizes))
+        return np.bincount(np.concatenate(matches), minlength=len(self._word_sizes))
+
+    def _word_scores(self, word: str) -> np.ndarray:
+        prefix_trigrams, full_trigrams = trigrams(word, prefix=True), trigrams(word)
+
+        containment = self._shared(prefix_trigrams) / len(prefix_trigrams)
+        shared = self._shared(full_trigrams)
+        similarity = shared / (len(full_trigrams) + self._word_sizes - shared)
+
+        return (containment + similarity) / 2
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Foods matching `query`, best first, with their similarity score."""
+        query_words = words(query)
+        if not query_words or not self._foods:
+            return []
+
+        scores = np.zeros(len(self._foods))
+        for word in query_words:
+            entry_scores = self._word_scores(word)[self._entry_words]
+            entry_scores *= self._entry_weights
+            scores += np.maximum.reduceat(entry_scores, self._food_starts)
+        scores /= len(query_words)
+
+        candidates = np.flatnonzero(scores >= MIN_SIMILARITY)
+
+        # Best score first, then names starting with the query, then shortest
+        start = " ".join(query_words)
+        names = [self._names[food] for food in candidates.tolist()]
+        order = np.lexsort(
+            (
+                [len(name) for name in names],
+                [not name.startswith(start) for name in names],
+                -scores[candidates],
+            )
+        )
+
+        return [
+            {**self._foods[food], "score": round(float(scores[food]), 3)}
+            for food in candidates[order[:limit]].tolist()
+        ]
+
+
+def build_search_index(session: Session, version: Optional[str] = None) -> SearchIndex:
+    statement = select(Food.id, Food.nom, Food.synonymes, Food.categorie)
+    return SearchIndex(session.exec(statement).all(), version)
+
+
+_index: Optional[SearchIndex] = None
+_lock = threading.Lock()
+
+
+def get_search_index(session: Session) -> SearchIndex:
+    """Cached `SearchIndex`, rebuilt when the dataset version changes."""
+    global _index
+
+    version = get_dataset_version(session)
+
+    index = _index
+    if index is None or index.version != version:
+        # Built without holding the lock, see `get_category_index`
+        index = build_search_index(session, version)
+        with _lock:
+            _index = index
+
+    return index
+
+
+def clear_search_index() -> None:
+    global _index
+
+    with _lock:
+        _index = None
@@ -0,0 +1,203 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from app.log import logger
+
+SEASON_URL = "https://www.greenpeace.fr/guetteur/calendrier/"
+
+SEASON_CACHE_PATH = Path(
+    os.environ.get(
+        "SEASON_CACHE_PATH",
+        os.path.join(tempfile.gettempdir(), "season_calendar.json"),
+    )
+)
+# After this many seconds the calendar is still served, but refreshed in background
+SEASON_TTL = float(os.environ.get("SEASON_TTL", str(7 * 24 * 3600)))
+# After a failed fetch, seconds during which the page is not fetched again
+SEASON_RETRY_AFTER = float(os.environ.get("SEASON_RETRY_AFTER", "60"))
+
+MONTHS = [
+    "janvier",
+    "fevrier",
+    "mars",
+    "avril",
+    "mai",
+    "juin",
+    "juillet",
+    "aout",
+    "septembre",
+    "octobre",
+    "novembre",
+    "decembre",
+]
+KINDS = ["legumes", "fruits"]
+
+SeasonTable = Dict[int, Dict[str, List[str]]]
+
+
+async def fetch_calendar_html() -> str:
+    # httpx and bs4 are imported on first fetch only: with a fresh saved
+    # calendar they are never loaded, which shortens cold starts
+    import httpx
+
+    async with httpx.AsyncClient(timeout=10) as client:
+        response = await client.get(SEASON_URL)
+    response.raise_for_status()
+    return response.content.decode("utf-8")
+
+
+def parse_calendar(html_content: str) -> SeasonTable:
+    """
+    Parse the whole calendar page into month (1-12) -> {kind: [foods]}.
+    Raises ValueError when no month has any food: not the calendar page, or
+    its layout changed.
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html_content, "html.parser")
+
+    table: SeasonTable = {}
+    for month, month_name in enumerate(MONTHS, start=1):
+        result = {}
+        for kind in KINDS:
+            a_balise = soup.find("a", id=f"{month_name}-{kind}")
+            if a_balise:
+                article_balise = a_balise.find_next_sibling("article")
+                if article_balise:
+                    li_tags = article_balise.find_all("li")
+                    result[kind] = [li.get_text(strip=True) for li in li_tags]
+        table[month] = result
+
+    if not any(table.values()):
+        raise ValueError("no seasonal food found in the page")
+    return table
+
+
+class SeasonCalendar:
+    """
+    Seasonal calendar served from memory, persisted to `path`.
+
+    The page is only fetched when nothing is cached yet, or in a background
+    task once the cached table is older than `ttl` (stale-while-revalidate).
+    After a failed fetch it is not fetched again for `retry_after` seconds:
+    requests meanwhile get the cached table, or None, at once.
+    """
+
+    def __init__(
+        self,
+        path: Path = SEASON_CACHE_PATH,
+        ttl: float = SEASON_TTL,
+        fetch: Callable[[], Awaitable[str]] = fetch_calendar_html,
+        retry_after: float = SEASON_RETRY_AFTER,
+    ):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.fetch = fetch
+        self.retry_after = retry_after
+
+        self._table: Optional[SeasonTable] = None
+        self._fetched_at = 0.0
+        self._failed_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    def load(self) -> bool:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        self._table = {int(month): kinds for month, kinds in data["months"].items()}
+        self._fetched_at = data["fetched_at"]
+        return True
+
+    def save(self) -> None:
+        data = {"fetched_at": self._fetched_at, "months": self._table}
+
+        # Write then rename, so a concurrent load never reads a partial file
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    async def refresh(self) -> bool:
+        import httpx
+        from bs4 import ParserRejectedMarkup
+
+        try:
+            html_content = await self.fetch()
+            # Parsing the whole page takes a while, keep it off the event loop
+            table = await asyncio.to_thread(parse_calendar, html_content)
+        except (httpx.HTTPError, ParserRejectedMarkup, ValueError) as e:
+            # ValueError covers undecodable and unexpected pages too
+            logger.warning("Season calendar not fetched: %s", e)
+            self._failed_at = time.monotonic()
+            return False
+
+        self._table, self._fetched_at = table, time.time()
+        self._failed_at = None
+        try:
+            await asyncio.to_thread(self.save)
+        except OSError as e:
+            logger.warning("Season calendar not saved to %s: %s", self.path, e)
+        return True
+
+    @property
+    def version(self) -> Optional[str]:
+        """Changes each time a new calendar is fetched, None until then."""
+        if self._table is None:
+            return None
+        return f"season-{self._fetched_at:.0f}"
+
+    def is_stale(self) -> bool:
+        return time.time() - self._fetched_at > self.ttl
+
+    def is_backing_off(self) -> bool:
+        """Whether the last fetch failed less than `retry_after` seconds ago."""
+        if self._failed_at is None:
+            return False
+        return time.monotonic() - self._failed_at < self.retry_after
+
+    def _refresh_in_background(self) -> None:
+        if self.is_backing_off():
+            return
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.get_running_loop().create_task(self.refresh())
+
+    def warm(self) -> None:
+        """Load the saved table, or start fetching it without blocking startup."""
+        if not self.load() or self.is_stale():
+            self._refresh_in_background()
+
+    async def get(self, month: int) -> Optional[Dict[str, List[str]]]:
+        if self._table is None and not self.is_backing_off():
+            async with self._lock:
+                # Requests queued behind a failed fetch do not fetch again
+                if self._table is None and not self.is_backing_off():
+                    if not self.load():
+                        await self.refresh()
+
+        if self._table is None:
+            return None
+        if self.is_stale():
+            self._refresh_in_background()
+
+        return self._table.get(month, {})
+
+
+_calendar: Optional[SeasonCalendar] = None
+
+
+def get_season_calendar() -> SeasonCalendar:
+    global _calendar
+
+    if _calendar is None:
+        _calendar = SeasonCalendar()
+    return _calendar
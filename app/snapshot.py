@@ -0,0 +1,418 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+from sqlalchemy import Float, Integer
+from sqlalchemy.exc import SQLAlchemyError
+from sqlmodel import Session, select
+
+from app.dataset import DATASET_VERSION_TTL, get_dataset_version
+from app.models import Food, FoodDensity
+
+SNAPSHOT_ENABLED = os.environ.get("FOOD_SNAPSHOT", "1") == "1"
+# When set, the snapshot is written there once and memory-mapped by every worker
+SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR")
+# Files of other versions are removed once older than this (seconds): workers
+# still on the previous version for up to DATASET_VERSION_TTL may write them
+SNAPSHOT_GRACE = float(os.environ.get("SNAPSHOT_GRACE", str(10 * DATASET_VERSION_TTL)))
+
+TEXT_COLUMNS = ["nom", "synonymes", "categorie", "unite_de_matrice"]
+NUMERIC_COLUMNS = [
+    name
+    for name, column in Food.__table__.columns.items()
+    if name != "id" and isinstance(column.type, (Integer, Float))
+]
+INTEGER_COLUMNS = {
+    name
+    for name, column in Food.__table__.columns.items()
+    if name != "id" and isinstance(column.type, Integer)
+}
+# Nutrients with a precomputed density per kcal
+DENSITY_COLUMNS = [
+    name for name in FoodDensity.__table__.columns.keys() if name != "id"
+]
+
+# Rankings are by amount per 100 g of food, or by amount per kcal
+BASIS_100G = "100g"
+BASIS_KCAL = "kcal"
+BASES = (BASIS_100G, BASIS_KCAL)
+
+
+def _readonly(array: np.ndarray) -> np.ndarray:
+    array.flags.writeable = False
+    return array
+
+
+class FoodSnapshot:
+    """
+    Read-only, columnar copy of food_table.
+
+    Every nutrient is a float64 array (NULL -> NaN), and so is its density per
+    kcal from food_density_table. Categories are stored as integer codes into
+    `categories`, and rows keep the order they were loaded in.
+    """
+
+    def __init__(
+        self,
+        ids: np.ndarray,
+        texts: Dict[str, np.ndarray],
+        category_codes: np.ndarray,
+        categories: np.ndarray,
+        nutrients: Dict[str, np.ndarray],
+        densities: Optional[Dict[str, np.ndarray]] = None,
+        version: Optional[str] = None,
+    ):
+        self.ids = _readonly(ids)
+        self.texts = {name: _readonly(values) for name, values in texts.items()}
+        self.category_codes = _readonly(category_codes)
+        self.categories = _readonly(categories)
+        self.nutrients = {name: _readonly(values) for name, values in nutrients.items()}
+        self.densities = {
+            name: _readonly(values) for name, values in (densities or {}).items()
+        }
+        self._category_lookup = {name: code for code, name in enumerate(categories)}
+        # Dataset version the rows were read at, see `current_snapshot`
+        self.version = version
+
+    @classmethod
+    def from_rows(
+        cls,
+        rows: Iterable[Any],
+        density_rows: Iterable[Any] = (),
+        version: Optional[str] = None,
+    ) -> "FoodSnapshot":
+        rows = list(rows)
+
+        ids = np.array([row.id for row in rows], dtype=np.int64)
+        texts = {
+            name: np.array([getattr(row, name) for row in rows], dtype=object)
+            for name in TEXT_COLUMNS
+        }
+        categories, category_codes = np.unique(
+            texts["categorie"].astype(str), return_inverse=True
+        )
+        # None becomes NaN in a float64 array
+        nutrients = {
+            name: np.array([getattr(row, name) for row in rows], dtype=np.float64)
+            for name in NUMERIC_COLUMNS
+        }
+
+        # Densities are aligned on the foods' order, NaN for foods without any
+        positions = {food_id: i for i, food_id in enumerate(ids.tolist())}
+        density_rows = [row for row in density_rows if row.id in positions]
+        found = np.array([positions[row.id] for row in density_rows], dtype=np.int64)
+        densities = {}
+        for name in DENSITY_COLUMNS:
+            densities[name] = np.full(len(rows), np.nan)
+            densities[name][found] = np.array(
+                [getattr(row, name) for row in density_rows], dtype=np.float64
+            )
+
+        return cls(
+            ids,
+            texts,
+            category_codes.astype(np.int32),
+            categories.astype(object),
+            nutrients,
+            densities,
+            version,
+        )
+
+    def save(self, path: Path) -> None:
+        """
+        Write the snapshot as .npy files in the new directory `path`. Texts are
+        fixed width strings, and nutrients one column-major matrix per kind,
+        so that `load` maps every column as a contiguous array.
+        """
+        path.mkdir(parents=True)
+        np.save(path / "ids.npy", self.ids)
+        np.save(path / "category_codes.npy", self.category_codes)
+        np.save(path / "categories.npy", self.categories.astype(str))
+
+        for name, values in self.texts.items():
+            nulls = np.array([value is None for value in values.tolist()], dtype=bool)
+            np.save(path / f"text_{name}.npy", np.where(nulls, "", values).astype(str))
+            if nulls.any():
+                np.save(path / f"text_{name}_nulls.npy", nulls)
+
+        for kind, columns in (
+            ("nutrients", self.nutrients),
+            ("densities", self.densities),
+        ):
+            matrix = np.empty((len(self), len(columns)), order="F")
+            for i, values in enumerate(columns.values()):
+                matrix[:, i] = values
+            np.save(path / f"{kind}.npy", matrix)
+
+        names = {
+            "texts": list(self.texts),
+            "nutrients": list(self.nutrients),
+            "densities": list(self.densities),
+        }
+        (path / "columns.json").write_text(json.dumps(names))
+
+    @classmethod
+    def load(cls, path: Path, version: Optional[str] = None) -> "FoodSnapshot":
+        """
+        Snapshot written by `save`, memory-mapped read-only: processes mapping
+        the same files share their pages instead of holding a copy each.
+        """
+        names = json.loads((path / "columns.json").read_text())
+
+        def mapped(name: str) -> np.ndarray:
+            return np.load(path / f"{name}.npy", mmap_mode="r")
+
+        texts = {}
+        for name in names["texts"]:
+            values = mapped(f"text_{name}")
+            if (path / f"text_{name}_nulls.npy").exists():
+                # Rare, so NULL texts are simply restored in memory
+                nulls = mapped(f"text_{name}_nulls").tolist()
+                values = np.array(
+                    [
+                        None if null else text
+                        for text, null in zip(values.tolist(), nulls)
+                    ],
+                    dtype=object,
+                )
+            texts[name] = values
+
+        nutrients, densities = mapped("nutrients"), mapped("densities")
+        return cls(
+            mapped("ids"),
+            texts,
+            mapped("category_codes"),
+            mapped("categories"),
+            {name: nutrients[:, i] for i, name in enumerate(names["nutrients"])},
+            {name: densities[:, i] for i, name in enumerate(names["densities"])},
+            version,
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def column(self, name: str, indices: np.ndarray) -> list:
+        """Values of one food_table column, with the model's column types."""
+        if name == "id":
+            return self.ids[indices].tolist()
+        if name in self.texts:
+            return self.texts[name][indices].tolist()
+
+        cast = int if name in INTEGER_COLUMNS else float
+        return [
+            None if value != value else cast(value)  # NaN -> None
+            for value in self.nutrients[name][indices].tolist()
+        ]
+
+    def rows(
+        self, indices: np.ndarray, fields: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """Rebuild food_table rows as dicts, restricted to `fields` if given."""
+        names = fields or ["id", *TEXT_COLUMNS, *NUMERIC_COLUMNS]
+        columns = [self.column(name, indices) for name in names]
+        return [dict(zip(names, row)) for row in zip(*columns)]
+
+    def ranks(self, nutrient: str, basis: str = BASIS_100G) -> bool:
+        """Whether the snapshot can rank foods by `nutrient` on `basis`."""
+        values = self.densities if basis == BASIS_KCAL else self.nutrients
+        return nutrient in values
+
+    def values(self, nutrient: str, basis: str = BASIS_100G) -> np.ndarray:
+        """Values foods are ranked by: per 100 g, or per kcal."""
+        if basis == BASIS_KCAL:
+            return self.densities[nutrient]
+        return self.nutrients[nutrient]
+
+    def _top_indices(
+        self,
+        nutrient: str,
+        candidates: np.ndarray,
+        limit: int,
+        basis: str = BASIS_100G,
+    ) -> np.ndarray:
+        # NULLs sort last, like ORDER BY <nutrient> DESC on SQL Server
+        keys = self.values(nutrient, basis)[candidates]
+        keys = -np.where(np.isnan(keys), -np.inf, keys)
+
+        if limit < len(keys):
+            selected = np.argpartition(keys, limit - 1)[:limit]
+        else:
+            selected = np.arange(len(keys))
+
+        return candidates[selected[np.argsort(keys[selected], kind="stable")]]
+
+    def _top_indices_by_category(
+        self,
+        categories: List[str],
+        percentage: float,
+        nutrient: str,
+        basis: str = BASIS_100G,
+    ) -> np.ndarray:
+        codes = [
+            self._category_lookup[name]
+            for name in categories
+            if name in self._category_lookup
+        ]
+        candidates = np.flatnonzero(np.isin(self.category_codes, codes))
+
+        limit = max(1, round(len(candidates) * percentage))
+
+        return self._top_indices(nutrient, candidates, limit, basis)
+
+    def top_names_by_category(
+        self,
+        categories: List[str],
+        percentage: float,
+        nutrient: str,
+        basis: str = BASIS_100G,
+    ) -> List[str]:
+        """Snapshot equivalent of `get_top_foods_by_category`."""
+        top = self._top_indices_by_category(categories, percentage, nutrient, basis)
+        return self.texts["nom"][top].tolist()
+
+    def top_rows_by_category(
+        self,
+        categories: List[str],
+        percentage: float,
+        nutrient: str,
+        fields: List[str],
+        basis: str = BASIS_100G,
+    ) -> List[Dict[str, Any]]:
+        top = self._top_indices_by_category(categories, percentage, nutrient, basis)
+        return self.rows(top, fields)
+
+    def top_rows_by_nutrient(
+        self,
+        nutrient: str,
+        percentage: float,
+        fields: Optional[List[str]] = None,
+        basis: str = BASIS_100G,
+    ) -> List[Dict[str, Any]]:
+        """Snapshot equivalent of `get_top_food_by_abs_nutrient`."""
+        total_count = self.count(nutrient, basis)
+
+        top_limit = max(1, round(total_count * percentage))
+
+        top = self._top_indices(nutrient, np.arange(len(self)), top_limit, basis)
+        return self.rows(top, fields)
+
+    def count(self, nutrient: str, basis: str = BASIS_100G) -> int:
+        """Rows with a value for `nutrient`, like COUNT(<nutrient>)."""
+        return int(np.count_nonzero(~np.isnan(self.values(nutrient, basis))))
+
+    def ranked_indices(
+        self, nutrient: str, limit: int, basis: str = BASIS_100G
+    ) -> np.ndarray:
+        """
+        Top `limit` rows for a nutrient, ordered by value then id like the
+        keyset pages of `get_food_ranking_page`. NULLs are left out.
+        """
+        values = self.values(nutrient, basis)
+        candidates = np.flatnonzero(~np.isnan(values))
+        order = np.lexsort((self.ids[candidates], -values[candidates]))
+        return candidates[order[:limit]]
+
+
+def load_snapshot(session: Session) -> FoodSnapshot:
+    # Read first: a load committing meanwhile makes the snapshot look stale
+    # and rebuilt once more, never fresh when it is not
+    version = get_dataset_version(session)
+
+    # Missing until `scripts/populate.py` computes it, rankings per kcal are empty
+    try:
+        density_rows = session.exec(select(FoodDensity)).all()
+    except SQLAlchemyError:
+        session.rollback()
+        density_rows = []
+
+    rows = session.exec(select(Food)).all()
+    return FoodSnapshot.from_rows(rows, density_rows, version)
+
+
+def load_shared_snapshot(session: Session, directory: Path) -> FoodSnapshot:
+    """
+    Snapshot of the current dataset version, mapped from `directory`/<version>.
+    The first worker to need it writes it (others may race, the first rename
+    wins), so memory use does not grow with the number of workers. Called
+    again by `current_snapshot` when the version changes, so every worker
+    moves to the files of the new version.
+    """
+    version = get_dataset_version(session)
+    if version is None:
+        # Without a version, files from an older load could not be told apart
+        return load_snapshot(session)
+
+    path = directory / version
+    if not path.exists():
+        directory.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(prefix=".", dir=directory))
+        load_snapshot(session).save(staging / version)
+        try:
+            os.rename(staging / version, path)
+        except OSError:
+            pass  # written by another worker meanwhile
+        shutil.rmtree(staging, ignore_errors=True)
+
+        # Versions have no order: only files no worker can still be writing
+        # or about to map are removed. Workers still mapping them keep them
+        # until unmapped.
+        deadline = time.time() - SNAPSHOT_GRACE
+        for old in directory.iterdir():
+            if old.name == version or old.name.startswith("."):
+                continue
+            try:
+                expired = old.stat().st_mtime < deadline
+            except OSError:
+                continue  # removed by another worker meanwhile
+            if expired:
+                shutil.rmtree(old, ignore_errors=True)
+
+    return FoodSnapshot.load(path, version)
+
+
+def build_snapshot(session: Session) -> FoodSnapshot:
+    if SNAPSHOT_DIR:
+        return load_shared_snapshot(session, Path(SNAPSHOT_DIR))
+    return load_snapshot(session)
+
+
+_snapshot: Optional[FoodSnapshot] = None
+_reload_lock = threading.Lock()
+
+
+def get_snapshot() -> Optional[FoodSnapshot]:
+    return _snapshot
+
+
+def set_snapshot(snapshot: Optional[FoodSnapshot]) -> None:
+    global _snapshot
+    _snapshot = snapshot
+
+
+def reload_snapshot(session: Session) -> FoodSnapshot:
+    """
+    Build a new snapshot and swap it in. Readers keep whichever snapshot they
+    already fetched with `get_snapshot`, so they never see a half-loaded one.
+    """
+    # Built without holding the lock, see `get_category_index`
+    snapshot = build_snapshot(session)
+    with _reload_lock:
+        set_snapshot(snapshot)
+    return snapshot
+
+
+def current_snapshot(session: Session) -> Optional[FoodSnapshot]:
+    """
+    The snapshot, rebuilt first when the dataset version changed since it was
+    loaded. None when snapshots are disabled: rankings then run in SQL.
+    """
+    snapshot = get_snapshot()
+    if snapshot is not None and snapshot.version != get_dataset_version(session):
+        snapshot = reload_snapshot(session)
+    return snapshot
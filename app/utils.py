@@ -1,10 +1,39 @@
 from fastapi import HTTPException
-from bs4 import BeautifulSoup
-from app.models import Food
+from app.models import Food, FoodDensity, PhaseRecommendation
+from app.snapshot import (
+    BASES,
+    BASIS_100G,
+    BASIS_KCAL,
+    DENSITY_COLUMNS,
+    NUMERIC_COLUMNS,
+    FoodSnapshot,
+    current_snapshot,
+)
 from sqlmodel import Session, select, func
-from typing import List, Dict
-import requests
+from sqlalchemy import and_, literal, or_, union_all
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.sql import Select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from typing import Any, AsyncIterator, List, Dict, Optional, Tuple
+import base64
+import binascii
 import datetime
+import os
+
+import orjson
+
+# Specs accepted by one /top-foods/batch request
+TOP_FOODS_BATCH_MAX = int(os.environ.get("TOP_FOODS_BATCH_MAX", "50"))
+
+# Page size of /food-by-nutrient/, and rows per chunk when it is streamed
+PAGE_SIZE = int(os.environ.get("PAGE_SIZE", "100"))
+MAX_PAGE_SIZE = int(os.environ.get("MAX_PAGE_SIZE", "1000"))
+SEARCH_LIMIT = 10
+MAX_SEARCH_LIMIT = 100
+STREAM_CHUNK_SIZE = int(os.environ.get("STREAM_CHUNK_SIZE", "500"))
+
+# (nutrient, percentage, category keywords, fields, basis) of a /top-foods/batch spec
+BatchSpec = Tuple[str, float, List[str], Optional[List[str]], str]
 
 
 def valid_category(category: str, keyword: str) -> bool:
@@ -24,18 +53,38 @@ def valid_category(category: str, keyword: str) -> bool:
 
 
 def map_categories(session: Session, categories: List[str]) -> Dict[str, List[str]]:
-    all_categories_statement = select(Food.categorie).distinct()
-    all_categories = session.exec(all_categories_statement).all()
-
-    category_mapping = {}
-    for keyword in categories:
-        category_mapping[keyword] = [
-            category
-            for category in all_categories
-            if keyword.lower() in category.lower() and valid_category(category, keyword)
-        ]
+    """
+    Categories matching each keyword, served from the cached `CategoryIndex`.
+    """
+    from app.categories import get_category_index
+
+    return get_category_index(session).map(categories)
+
+
+FOOD_COLUMNS = list(Food.__table__.columns.keys())
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """
+    `fields` query parameter: comma separated columns of Food, or * for all.
+    None when the parameter is not given.
+    """
+    if fields is None:
+        return None
+
+    if fields.strip() == "*":
+        return FOOD_COLUMNS
+
+    names = list(dict.fromkeys(name.strip() for name in fields.split(",")))
+    for name in names:
+        if name not in FOOD_COLUMNS:
+            raise HTTPException(status_code=400, detail=f"Field {name} not found.")
+
+    return names
+
 
-    return category_mapping
+def food_columns(fields: List[str]) -> list:
+    return [getattr(Food, name) for name in fields]
 
 
 def validate_params(nutrient, percentage) -> None:
@@ -48,9 +97,53 @@ def validate_params(nutrient, percentage) -> None:
         raise HTTPException(status_code=400, detail=f"Nutrient {nutrient} not found.")
 
 
+def is_ranked(nutrient: str, basis: str = BASIS_100G) -> bool:
+    """Whether foods can be ranked by `nutrient` on `basis`."""
+    if basis == BASIS_KCAL:
+        return nutrient in DENSITY_COLUMNS
+    return hasattr(Food, nutrient)
+
+
+def validate_basis(basis: str, nutrient: Optional[str] = None) -> None:
+    if basis not in BASES:
+        raise HTTPException(status_code=400, detail="Basis must be '100g' or 'kcal'.")
+
+    if nutrient is not None and not is_ranked(nutrient, basis):
+        raise HTTPException(
+            status_code=400, detail=f"Nutrient {nutrient} has no density per kcal."
+        )
+
+
+def ranking_column(nutrient: str, basis: str = BASIS_100G):
+    """
+    Column foods are ranked by: the nutrient per 100 g from food_table, or its
+    density precomputed in food_density_table (statements go through
+    `join_basis`).
+    """
+    if basis == BASIS_KCAL:
+        return getattr(FoodDensity, nutrient)
+    return getattr(Food, nutrient)
+
+
+def join_basis(statement: Select, basis: str = BASIS_100G) -> Select:
+    """Join food_density_table to a statement on food_table, to rank per kcal."""
+    if basis == BASIS_KCAL:
+        return statement.join(FoodDensity, FoodDensity.id == Food.id)
+    return statement
+
+
+def count_ranked(nutrient: str, basis: str = BASIS_100G) -> Select:
+    """COUNT(<nutrient>) of the foods ranked on `basis`."""
+    return select(func.count(ranking_column(nutrient, basis)))
+
+
 def get_top_foods_by_category(
     session: Session, category: str, percentage: float, nutrient: str
 ):
+    snapshot = current_snapshot(session)
+    if snapshot is not None and nutrient in snapshot.nutrients:
+        return snapshot.top_names_by_category(category, percentage, nutrient)
+
     count_statement = select(func.count()).where(Food.categorie.in_(category))
     total_count = session.exec(count_statement).one()
 
@@ -68,6 +161,191 @@ def get_top_foods_by_category(
     return top_food
 
 
+def build_top_foods_statement(
+    category_mapping: Dict[str, List[str]],
+    percentage: float,
+    nutrient: str,
+    fields: Optional[List[str]] = None,
+    basis: str = BASIS_100G,
+) -> Optional[Select]:
+    """
+    Single statement ranking foods for every keyword at once.
+
+    The keyword -> category mapping is sent as a derived table, and each keyword
+    group is ranked with ROW_NUMBER() / COUNT() OVER (PARTITION BY keyword).
+    Rows are pre-filtered on `food_rank <= total_count * percentage + 1`, a
+    superset of the exact limit applied by `get_top_foods_by_categories`.
+
+    Only `fields` (default: nom) are selected from food_table. Foods are ranked
+    per 100 g, or per kcal from food_density_table.
+    """
+    fields = fields or ["nom"]
+
+    mapping_rows = [
+        select(literal(keyword).label("keyword"), literal(category).label("categorie"))
+        for keyword, categories in category_mapping.items()
+        for category in categories
+    ]
+    if not mapping_rows:
+        return None
+
+    keywords = union_all(*mapping_rows).subquery("keywords")
+
+    ranked = join_basis(
+        select(
+            keywords.c.keyword,
+            *food_columns(fields),
+            func.row_number()
+            .over(
+                partition_by=keywords.c.keyword,
+                order_by=ranking_column(nutrient, basis).desc(),
+            )
+            .label("food_rank"),
+            func.count().over(partition_by=keywords.c.keyword).label("total_count"),
+        )
+        .select_from(keywords)
+        .join(Food, Food.categorie == keywords.c.categorie),
+        basis,
+    ).subquery("ranked")
+
+    return (
+        select(
+            ranked.c.keyword,
+            ranked.c.food_rank,
+            ranked.c.total_count,
+            *(ranked.c[name] for name in fields),
+        )
+        .where(ranked.c.food_rank <= ranked.c.total_count * percentage + 1)
+        .order_by(ranked.c.keyword, ranked.c.food_rank)
+    )
+
+
+def get_top_foods_by_categories(
+    session: Session,
+    category_mapping: Dict[str, List[str]],
+    percentage: float,
+    nutrient: str,
+    fields: Optional[List[str]] = None,
+    basis: str = BASIS_100G,
+) -> List[Dict[str, Any]]:
+    """
+    Same result as calling `get_top_foods_by_category` for every keyword of
+    `category_mapping`, but in a single round trip.
+
+    Foods are given by name, or as dicts of `fields` when they are given.
+    """
+    snapshot = current_snapshot(session)
+    if snapshot is not None and snapshot.ranks(nutrient, basis):
+        return [
+            {
+                "categorie": keyword,
+                "aliments": (
+                    snapshot.top_names_by_category(
+                        categories, percentage, nutrient, basis
+                    )
+                    if fields is None
+                    else snapshot.top_rows_by_category(
+                        categories, percentage, nutrient, fields, basis
+                    )
+                ),
+            }
+            for keyword, categories in category_mapping.items()
+        ]
+
+    top_foods: Dict[str, list] = {keyword: [] for keyword in category_mapping}
+
+    statement = build_top_foods_statement(
+        category_mapping, percentage, nutrient, fields, basis
+    )
+    if statement is not None:
+        for keyword, food_rank, total_count, *values in session.exec(statement).all():
+            if food_rank <= max(1, round(total_count * percentage)):
+                top_foods[keyword].append(
+                    values[0] if fields is None else dict(zip(fields, values))
+                )
+
+    return [
+        {"categorie": keyword, "aliments": aliments}
+        for keyword, aliments in top_foods.items()
+    ]
+
+
+def validate_batch(keys: List[str]) -> None:
+    if not 0 < len(keys) <= TOP_FOODS_BATCH_MAX:
+        raise HTTPException(
+            status_code=400,
+            detail=f"A batch must contain between 1 and {TOP_FOODS_BATCH_MAX} specs.",
+        )
+
+    duplicates = sorted({key for key in keys if keys.count(key) > 1})
+    if duplicates:
+        raise HTTPException(
+            status_code=400, detail=f"Duplicate spec keys: {', '.join(duplicates)}."
+        )
+
+
+def validate_ranking_params(nutrient, percentage) -> None:
+    validate_params(nutrient, percentage)
+
+    # Rankings computed in memory or paged with a keyset need a numeric column
+    if nutrient not in NUMERIC_COLUMNS:
+        raise HTTPException(status_code=400, detail=f"Nutrient {nutrient} not found.")
+
+
+def get_top_foods_batch(
+    session: Session,
+    specs: List[BatchSpec],
+    category_mapping: Dict[str, List[str]],
+) -> List[List[Dict[str, Any]]]:
+    """
+    `get_top_foods_by_categories` for each spec, restricted to its keywords.
+
+    All specs are ranked in memory from a single read of the foods of their
+    categories (none when the snapshot is loaded), instead of one query each.
+    """
+    snapshot = current_snapshot(session)
+    if snapshot is None:
+        categories = sorted(
+            {
+                category
+                for _, _, keywords, _, _ in specs
+                for keyword in keywords
+                for category in category_mapping[keyword]
+            }
+        )
+        rows, density_rows = [], []
+        if categories:
+            statement = select(Food).where(Food.categorie.in_(categories))
+            rows = session.exec(statement).all()
+            if any(basis == BASIS_KCAL for *_, basis in specs):
+                statement = (
+                    select(FoodDensity)
+                    .join(Food, Food.id == FoodDensity.id)
+                    .where(Food.categorie.in_(categories))
+                )
+                density_rows = session.exec(statement).all()
+        snapshot = FoodSnapshot.from_rows(rows, density_rows)
+
+    return [
+        [
+            {
+                "categorie": keyword,
+                "aliments": (
+                    snapshot.top_names_by_category(
+                        category_mapping[keyword], percentage, nutrient, basis
+                    )
+                    if fields is None
+                    else snapshot.top_rows_by_category(
+                        category_mapping[keyword], percentage, nutrient, fields, basis
+                    )
+                ),
+            }
+            for keyword in keywords
+        ]
+        for nutrient, percentage, keywords, fields, basis in specs
+    ]
+
+
 def validate_phase(phase, phases):
     if phase not in phases:
         raise HTTPException(
@@ -89,64 +367,289 @@ def get_top_food_by_abs_nutrient(
     percentage: float,
     session: Session,
     mois: int = datetime.date.today().month,
+    fields: Optional[List[str]] = None,
+    basis: str = BASIS_100G,
 ) -> list[str]:
-    if not hasattr(Food, nutrient):
+    """
+    Top foods for a nutrient, as full Food rows or as dicts of `fields`,
+    ranked per 100 g or per kcal (`basis`).
+    """
+    if not is_ranked(nutrient, basis):
         return None
 
-    order_by_clause = getattr(Food, nutrient).desc()
+    snapshot = current_snapshot(session)
+    if snapshot is not None and snapshot.ranks(nutrient, basis):
+        return snapshot.top_rows_by_nutrient(nutrient, percentage, fields, basis)
+
+    order_by_clause = ranking_column(nutrient, basis).desc()
     # list_food_statement = select(Food.name).order_by(order_by_clause).limit()
 
-    count_statement = select(func.count(getattr(Food, nutrient)))
-    total_count = session.exec(count_statement).one()
+    total_count = session.exec(count_ranked(nutrient, basis)).one()
 
     top_limit = max(1, round(total_count * percentage))
 
+    if fields is not None:
+        # SELECT <fields> FROM food_table ORDER BY nutrient DESC LIMIT top_limit
+        statement = join_basis(select(*food_columns(fields)), basis)
+        statement = statement.order_by(order_by_clause)
+        results = session.exec(statement.limit(top_limit)).all()
+        return [dict(zip(fields, row)) for row in results]
+
     # SELECT * FROM food_table ORDER BY nutrient DESC LIMIT top_limit
-    statement = select(Food).order_by(order_by_clause).limit(top_limit)
-    results = session.exec(statement).all()
+    statement = join_basis(select(Food), basis).order_by(order_by_clause)
+    results = session.exec(statement.limit(top_limit)).all()
 
     return results
 
 
-SEASON_URL = "https://www.greenpeace.fr/guetteur/calendrier/"
+def validate_page_size(limit: int) -> None:
+    if not 0 < limit <= MAX_PAGE_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Limit must be between 1 and {MAX_PAGE_SIZE}.",
+        )
 
 
-def get_seasoned_food(mois: int):
-    mois_mot = [
-        "janvier",
-        "fevrier",
-        "mars",
-        "avril",
-        "mai",
-        "juin",
-        "juillet",
-        "aout",
-        "septembre",
-        "octobre",
-        "novembre",
-        "decembre",
-    ]
-    mois_a_chercher = mois_mot[mois - 1]
-    categories = [f"{mois_a_chercher}-legumes", f"{mois_a_chercher}-fruits"]
-    print(f"Categories: {categories}")
-
-    response = requests.get(SEASON_URL)
-    if response.status_code == 200:
-        response.encoding = "utf-8"
-        html_content = response.text
-        soup = BeautifulSoup(html_content, "html.parser")
-        result = {}
-        for cat in categories:
-            a_balise = soup.find("a", id=cat)
-            if a_balise:
-                article_balise = a_balise.find_next_sibling("article")
-                if article_balise:
-                    li_tags = article_balise.find_all("li")
-                    result[cat.split("-")[1]] = [
-                        li.get_text(strip=True) for li in li_tags
-                    ]
-        print(result)
-        return result
+def validate_search(query: str, limit: int) -> None:
+    if not query.strip():
+        raise HTTPException(status_code=400, detail="Query must not be empty.")
+    if not 0 < limit <= MAX_SEARCH_LIMIT:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Limit must be between 1 and {MAX_SEARCH_LIMIT}.",
+        )
+
+
+def encode_cursor(
+    nutrient: str, value: float, food_id: int, position: int, basis: str = BASIS_100G
+) -> str:
+    """Opaque cursor: the last food sent (keyset) and how many were sent."""
+    data = orjson.dumps([nutrient, basis, value, food_id, position])
+    return base64.urlsafe_b64encode(data).decode("ascii")
+
+
+def decode_cursor(
+    cursor: str, nutrient: str, basis: str = BASIS_100G
+) -> Tuple[float, int, int]:
+    try:
+        name, cursor_basis, value, food_id, position = orjson.loads(
+            base64.urlsafe_b64decode(cursor.encode("ascii"))
+        )
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+    if (name, cursor_basis) != (nutrient, basis):
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+    return value, food_id, position
+
+
+def ranking_statement(
+    nutrient: str,
+    fields: List[str],
+    basis: str = BASIS_100G,
+    after: Optional[Tuple[float, int]] = None,
+) -> Select:
+    """
+    Foods with a value for `nutrient`, by value then id: a total order, so that
+    pages can be read with a keyset on (value, id) instead of an OFFSET. Rows
+    are (id, value, *fields), those ranked after the (value, id) `after` only
+    when given.
+    """
+    column = ranking_column(nutrient, basis)
+    statement = select(Food.id, column, *food_columns(fields)).where(
+        column.is_not(None)
+    )
+    if after is not None:
+        value, food_id = after
+        statement = statement.where(
+            or_(column < value, and_(column == value, Food.id > food_id))
+        )
+    return join_basis(statement.order_by(column.desc(), Food.id), basis)
+
+
+def get_food_ranking_page(
+    session: Session,
+    nutrient: str,
+    percentage: float,
+    fields: List[str],
+    limit: int,
+    cursor: Optional[str] = None,
+    basis: str = BASIS_100G,
+) -> Dict[str, Any]:
+    """
+    One page of the `get_top_food_by_abs_nutrient` ranking: at most `limit`
+    foods as dicts of `fields`, and the cursor of the next page (None at the end).
+    """
+    value, food_id, position = (None, None, 0)
+    if cursor is not None:
+        value, food_id, position = decode_cursor(cursor, nutrient, basis)
+
+    snapshot = current_snapshot(session)
+    if snapshot is not None and snapshot.ranks(nutrient, basis):
+        total_count = snapshot.count(nutrient, basis)
+    else:
+        snapshot = None
+        total_count = session.exec(count_ranked(nutrient, basis)).one()
+
+    top_limit = max(1, round(total_count * percentage))
+    page_size = min(limit, top_limit - position)
+    if page_size <= 0:
+        return {"items": [], "next_cursor": None}
+
+    if snapshot is not None:
+        ranked = snapshot.ranked_indices(nutrient, position + page_size, basis)
+        ranked = ranked[position:]
+        values = snapshot.values(nutrient, basis)
+        keys = list(zip(values[ranked].tolist(), snapshot.ids[ranked]))
+        items = snapshot.rows(ranked, fields)
+    else:
+        after = None if cursor is None else (value, food_id)
+        statement = ranking_statement(nutrient, fields, basis, after)
+        rows = session.exec(statement.limit(page_size)).all()
+        keys = [(row[1], row[0]) for row in rows]
+        items = [dict(zip(fields, row[2:])) for row in rows]
+
+    next_cursor = None
+    if len(items) == page_size and position + page_size < top_limit:
+        last_value, last_id = keys[-1]
+        next_cursor = encode_cursor(
+            nutrient, last_value, int(last_id), position + page_size, basis
+        )
+
+    return {"items": items, "next_cursor": next_cursor}
+
+
+def ndjson_rows(rows: List[Any], fields: List[str]) -> bytes:
+    """Rows of `ranking_statement` as NDJSON, one food per line."""
+    return b"".join(orjson.dumps(dict(zip(fields, row[2:]))) + b"\n" for row in rows)
+
+
+async def stream_food_ranking(
+    session_factory: async_sessionmaker,
+    nutrient: str,
+    percentage: float,
+    fields: List[str],
+    basis: str = BASIS_100G,
+) -> AsyncIterator[bytes]:
+    """
+    The whole `get_top_food_by_abs_nutrient` ranking as NDJSON (one food per
+    line), in chunks of STREAM_CHUNK_SIZE foods, so memory use does not depend
+    on `percentage`.
+
+    The first chunk is read before returning, so that an `Overloaded`
+    database is answered 503 before any header is sent. The next ones are
+    read as they are sent, each with a keyset on the last (value, id) in its
+    own short session: no connection (nor admission slot) is held while the
+    client reads.
+    """
+    async with session_factory() as session:
+        snapshot = await session.run_sync(current_snapshot)
+        if snapshot is not None and snapshot.ranks(nutrient, basis):
+            top_limit = max(1, round(snapshot.count(nutrient, basis) * percentage))
+            ranked = snapshot.ranked_indices(nutrient, top_limit, basis)
+            return snapshot_chunks(snapshot, ranked, fields)
+
+        total_count = (await session.exec(count_ranked(nutrient, basis))).one()
+        top_limit = max(1, round(total_count * percentage))
+        size = min(STREAM_CHUNK_SIZE, top_limit)
+        statement = ranking_statement(nutrient, fields, basis).limit(size)
+        rows = (await session.exec(statement)).all()
+
+    async def chunks() -> AsyncIterator[bytes]:
+        chunk, sent = rows, 0
+        while chunk:
+            yield ndjson_rows(chunk, fields)
+            sent += len(chunk)
+            size = min(STREAM_CHUNK_SIZE, top_limit - sent)
+            if len(chunk) < STREAM_CHUNK_SIZE or size <= 0:
+                return
+
+            food_id, value = chunk[-1][:2]
+            statement = ranking_statement(nutrient, fields, basis, (value, food_id))
+            async with session_factory() as session:
+                chunk = (await session.exec(statement.limit(size))).all()
+
+    return chunks()
+
+
+async def snapshot_chunks(
+    snapshot: FoodSnapshot, ranked: Any, fields: List[str]
+) -> AsyncIterator[bytes]:
+    for start in range(0, len(ranked), STREAM_CHUNK_SIZE):
+        chunk = ranked[start:][:STREAM_CHUNK_SIZE]
+        yield b"".join(
+            orjson.dumps(row) + b"\n" for row in snapshot.rows(chunk, fields)
+        )
+
+
+async def get_seasoned_food(mois: int):
+    from app.season import get_season_calendar
+
+    return await get_season_calendar().get(mois)
+
+
+def get_phase_recommendations(
+    session: Session,
+    phase: str,
+    nutrients: List[str],
+    percentage: float,
+    fields: Optional[Dict[str, List[str]]] = None,
+    basis: str = BASIS_100G,
+) -> Optional[Dict[str, Any]]:
+    """
+    Top foods for each nutrient of a phase, read from the rankings that
+    `scripts/populate.py` stores in phase_recommendation_table, with a single
+    range read on its (phase, basis, nutrient, food_rank) key.
+
+    Foods are full Food rows, or dicts of `fields[nutrient]` when given.
+    Returns None when the rankings are missing, so the caller can rank live.
+    """
+    # Superset of the exact limit, trimmed below
+    max_rank = PhaseRecommendation.total_count * percentage + 1
+
+    if fields is None:
+        food_entities = [Food]
     else:
-        print("Error in connexion")
-        return
+        selected = dict.fromkeys(name for names in fields.values() for name in names)
+        food_entities = food_columns(list(selected))
+
+    statement = (
+        select(
+            PhaseRecommendation.nutrient,
+            PhaseRecommendation.food_rank,
+            PhaseRecommendation.total_count,
+            *food_entities,
+        )
+        .join(Food, Food.id == PhaseRecommendation.food_id)
+        .where(PhaseRecommendation.phase == phase)
+        .where(PhaseRecommendation.basis == basis)
+        .where(PhaseRecommendation.food_rank <= max_rank)
+        .order_by(PhaseRecommendation.nutrient, PhaseRecommendation.food_rank)
+    )
+
+    try:
+        rows = session.exec(statement).all()
+    except SQLAlchemyError:
+        session.rollback()
+        return None
+
+    top_food: Dict[str, Any] = {nutrient: None for nutrient in nutrients}
+    for row in rows:
+        nutrient, food_rank, total_count = row[:3]
+        if nutrient not in top_food:
+            continue
+        if top_food[nutrient] is None:
+            top_food[nutrient] = []
+        if food_rank <= max(1, round(total_count * percentage)):
+            top_food[nutrient].append(
+                row[3]
+                if fields is None
+                else {name: row._mapping[name] for name in fields[nutrient]}
+            )
+
+    # Nutrients that cannot be ranked stay None, as in
+    # `get_top_food_by_abs_nutrient`; any other gap means stale rankings
+    if any(top_food[n] is None and is_ranked(n, basis) for n in nutrients):
+        return None
+
+    return top_food
@@ -0,0 +1,198 @@
+"""
+Offline benchmark of the API endpoints.
+
+Builds a local SQLite copy of the database from data/food_data.xlsx with the
+same functions as scripts/populate.py, serves the app on it through the
+FastAPI TestClient, and measures for each endpoint: latency percentiles,
+throughput and SQL statements per request.
+
+Results are written as JSON (one file per commit by default), and can be
+compared with an earlier run:
+
+    python benchmarks/bench_endpoints.py
+    python benchmarks/bench_endpoints.py --compare benchmarks/results/<commit>.json
+
+Set FOOD_SNAPSHOT=0 to measure the SQL paths instead of the in-memory snapshot.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+sys.path.append(str(ROOT / "scripts"))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine  # noqa: E402
+from sqlmodel.ext.asyncio.session import AsyncSession  # noqa: E402
+
+import populate  # noqa: E402
+from app import season  # noqa: E402
+from app.admission import AdmittedQueuePool  # noqa: E402
+from app.db import admission_controller, get_session_factory  # noqa: E402
+from app.main import app  # noqa: E402
+
+RESULTS_DIR = ROOT / "benchmarks" / "results"
+SEASON_FIXTURE = ROOT / "tests" / "fixtures" / "season_calendar.html"
+
+ENDPOINTS = {
+    "top_foods": "/top-foods/?nutrient=proteines",
+    "top_foods_fields": "/top-foods/?nutrient=fer&percentage=0.5&fields=nom,fer",
+    "top_foods_kcal": "/top-foods/?nutrient=proteines&basis=kcal",
+    "food_by_phase": "/food-by-phase/?phase=ovulatoire",
+    "food_by_phase_full": "/food-by-phase/?phase=menstruelle&percentage=0.2&fields=*",
+    "by_season": "/by-season/?month=1",
+}
+
+
+def build_database(path: Path):
+    """SQLite stand-in for the Azure SQL database, loaded like populate.py does."""
+    engine = populate.sqlite_engine(path)
+    food_table, measures_table, qualifier_table = populate.prepare_tables()
+    populate.load_tables(
+        food_table, measures_table, engine, qualifier_table=qualifier_table
+    )
+    engine.dispose()
+
+
+def session_factory_for(path: Path, statements: list):
+    # Admitted like the API's own engines, so bursts are shed the same way
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{path}",
+        poolclass=AdmittedQueuePool,
+        admission=admission_controller("sqlite"),
+    ).execution_options(schema_translate_map={"dbo": None})
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    return async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+async def fetch_season_fixture() -> str:
+    return SEASON_FIXTURE.read_text(encoding="utf-8")
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def measure(client, url, requests, concurrency, statements):
+    client.get(url).raise_for_status()  # warm-up
+
+    latencies = []
+    lock = threading.Lock()
+
+    def call(_):
+        start = time.perf_counter()
+        client.get(url).raise_for_status()
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            latencies.append(elapsed)
+
+    statements.clear()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(call, range(requests)))
+    wall = time.perf_counter() - start
+
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "p50_ms": round(percentile(latencies, 0.50), 3),
+        "p90_ms": round(percentile(latencies, 0.90), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+        "mean_ms": round(statistics.fmean(latencies), 3),
+        "throughput_rps": round(requests / wall, 1),
+        "statements_per_request": round(len(statements) / requests, 2),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results, baseline_path):
+    baseline = json.loads(Path(baseline_path).read_text())
+    print(f"\nCompared with {baseline['commit']}:")
+    for name, current in results["endpoints"].items():
+        previous = baseline["endpoints"].get(name)
+        if previous is None:
+            continue
+        change = (current["p50_ms"] / previous["p50_ms"] - 1) * 100
+        print(
+            f"{name:<22} p50 {previous['p50_ms']:>8.2f} -> {current['p50_ms']:>8.2f} ms"
+            f" ({change:+.0f}%), statements {previous['statements_per_request']}"
+            f" -> {current['statements_per_request']}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--output", help="JSON file, default results/<commit>.json")
+    parser.add_argument("--compare", help="earlier JSON results to compare with")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "food.db"
+        build_database(db_path)
+
+        statements = []
+        session_factory = session_factory_for(db_path, statements)
+        app.dependency_overrides[get_session_factory] = lambda: session_factory
+        season._calendar = season.SeasonCalendar(
+            Path(tmp) / "season.json", fetch=fetch_season_fixture
+        )
+
+        endpoints = {}
+        with TestClient(app) as client:
+            for name, url in ENDPOINTS.items():
+                endpoints[name] = measure(
+                    client, url, args.requests, args.concurrency, statements
+                )
+                print(f"{name:<22}{endpoints[name]}")
+
+    results = {
+        "commit": git_commit(),
+        "date": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "snapshot": os.environ.get("FOOD_SNAPSHOT", "1") == "1",
+        "endpoints": endpoints,
+    }
+
+    output = Path(args.output or RESULTS_DIR / f"{results['commit']}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print(f"Results written to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Encoding cost per response: the previous path (validation against
+`response_model=List[Dict]`, jsonable_encoder, then JSONResponse) against the
+typed endpoints returning an ORJSONResponse directly.
+
+Then, for full rows of /food-by-phase/, the cost of each negotiated format:
+encoding on the server, body size, and decoding into a pandas DataFrame as
+the frontend does.
+
+Usage: python benchmarks/bench_serialization.py [--repeat 200]
+"""
+
+import argparse
+import gzip
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import brotli
+import msgpack
+import orjson
+import pandas as pd
+import pyarrow as pa
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import TypeAdapter
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from app.formats import (  # noqa: E402
+    compress,
+    encode_arrow,
+    encode_msgpack,
+    grouped_columns,
+)
+from tests.conftest import make_foods  # noqa: E402
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    foods = make_foods(119)
+    nutrients = ["zinc", "fibres_alimentaires", "vitamine_c", "selenium"]
+    groups = [f"Categorie {i}" for i in range(10)]
+
+    # (before, after) payloads: before, /food-by-phase/ sent full Food objects
+    payloads = {
+        "phase_full_rows": (
+            [{n: foods for n in nutrients}],
+            [{n: [f.model_dump() for f in foods] for n in nutrients}],
+        ),
+        "phase_slim": (
+            [{n: foods for n in nutrients}],
+            [{n: [{"nom": f.nom, n: getattr(f, n)} for f in foods] for n in nutrients}],
+        ),
+        "top_foods_names": (
+            [{"categorie": g, "aliments": [f.nom for f in foods[:12]]} for g in groups],
+            [{"categorie": g, "aliments": [f.nom for f in foods[:12]]} for g in groups],
+        ),
+    }
+
+    generic = TypeAdapter(List[Dict])
+
+    def before(payload):
+        return JSONResponse(jsonable_encoder(generic.validate_python(payload))).body
+
+    def after(payload):
+        return ORJSONResponse(payload).body
+
+    print(f"{'payload':<18}{'before (us)':>14}{'after (us)':>14}{'speedup':>10}")
+    for name, (old_payload, new_payload) in payloads.items():
+        old = timed(lambda: before(old_payload), args.repeat)
+        new = timed(lambda: after(new_payload), args.repeat)
+        print(f"{name:<18}{old:>14.1f}{new:>14.1f}{old / new:>9.1f}x")
+
+    top_food = {n: [f.model_dump() for f in foods] for n in nutrients}
+
+    def from_json(body):
+        rows = [
+            {"nutrient": n, **food}
+            for n, foods in orjson.loads(body)[0].items()
+            for food in foods
+        ]
+        return pd.DataFrame(rows)
+
+    def json_body():
+        return ORJSONResponse([top_food]).body
+
+    def columns():
+        return grouped_columns("nutrient", top_food.items())
+
+    formats = {
+        "json": (json_body, from_json),
+        "json_gzip": (
+            lambda: compress(json_body(), "gzip"),
+            lambda body: from_json(gzip.decompress(body)),
+        ),
+        "json_br": (
+            lambda: compress(json_body(), "br"),
+            lambda body: from_json(brotli.decompress(body)),
+        ),
+        "arrow": (
+            lambda: encode_arrow(columns()),
+            lambda body: pa.ipc.open_stream(body).read_pandas(),
+        ),
+        "msgpack": (
+            lambda: encode_msgpack(columns()),
+            lambda body: pd.DataFrame(msgpack.unpackb(body)),
+        ),
+    }
+
+    print()
+    print(f"{'format':<18}{'encode (us)':>14}{'bytes':>10}{'to DataFrame (us)':>20}")
+    for name, (encode, decode) in formats.items():
+        body = encode()
+        encoding = timed(encode, args.repeat)
+        decoding = timed(lambda: decode(body), args.repeat)
+        print(f"{name:<18}{encoding:>14.1f}{len(body):>10}{decoding:>20.1f}")
+
+
+if __name__ == "__main__":
+    main()
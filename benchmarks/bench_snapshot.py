@@ -0,0 +1,76 @@
+"""
+Compare the SQL ranking path with the in-memory snapshot.
+
+The SQL side runs against a local SQLite copy, so it does not include the
+network round trip to Azure SQL: real gains are larger than what is shown here.
+
+Usage: python benchmarks/bench_snapshot.py [--rows 1190] [--repeat 200]
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from app.snapshot import reload_snapshot, set_snapshot  # noqa: E402
+from app.utils import (  # noqa: E402
+    get_top_food_by_abs_nutrient,
+    get_top_foods_by_category,
+)
+from tests.conftest import CATEGORIES, make_foods  # noqa: E402
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(samples), max(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1190)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://", poolclass=StaticPool).execution_options(
+        schema_translate_map={"dbo": None}
+    )
+    SQLModel.metadata.create_all(engine)
+
+    with Session(engine) as session:
+        session.add_all(make_foods(args.rows))
+        session.commit()
+
+        cases = {
+            "by_category": lambda: get_top_foods_by_category(
+                session, CATEGORIES[:2], 0.2, "proteines"
+            ),
+            "by_abs_nutrient": lambda: get_top_food_by_abs_nutrient(
+                "fer", 0.1, session
+            ),
+        }
+
+        print(f"{'case':<18}{'path':<10}{'median (us)':>14}{'max (us)':>14}")
+        for name, fn in cases.items():
+            set_snapshot(None)
+            sql = timed(fn, args.repeat)
+            reload_snapshot(session)
+            snap = timed(fn, args.repeat)
+
+            print(f"{name:<18}{'sql':<10}{sql[0]:>14.1f}{sql[1]:>14.1f}")
+            print(f"{name:<18}{'snapshot':<10}{snap[0]:>14.1f}{snap[1]:>14.1f}")
+            print(f"{'':<18}{'speedup':<10}{sql[0] / snap[0]:>14.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Cold start of the API, as a scaled-to-zero container sees it.
+
+Each run is a fresh Python process which imports the app, starts it on a local
+SQLite copy of the database (built like bench_endpoints.py does) and measures:
+- import: `import app.main`
+- live: from the start of the lifespan until /health/live answers
+- ready: from the start of the lifespan until /health/ready answers 200, i.e.
+  the pool is open and the caches are loaded
+- first_request: a /top-foods/ request once ready
+
+It also lists the heavy modules that importing the app loaded.
+
+    python benchmarks/bench_startup.py --runs 10
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+# Only needed once the app fetches or connects, not to import it
+DEFERRED_MODULES = ["bs4", "httpx", "pyodbc", "aioodbc", "pyarrow"]
+
+
+def child(db_path: str) -> dict:
+    """One cold start, in the current (fresh) process."""
+    start = time.perf_counter()
+    import app.main
+
+    import_seconds = time.perf_counter() - start
+    loaded = [name for name in DEFERRED_MODULES if name in sys.modules]
+
+    sys.path.append(str(ROOT / "benchmarks"))
+    from fastapi.testclient import TestClient
+
+    from app import season
+    from app.db import get_session_factory
+    from bench_endpoints import SEASON_FIXTURE, session_factory_for
+
+    async def fetch_season_fixture() -> str:
+        return SEASON_FIXTURE.read_text(encoding="utf-8")
+
+    session_factory = session_factory_for(Path(db_path), [])
+    app.main.app.dependency_overrides[get_session_factory] = lambda: session_factory
+    season._calendar = season.SeasonCalendar(
+        Path(db_path).with_suffix(".json"), fetch=fetch_season_fixture
+    )
+
+    start = time.perf_counter()
+    with TestClient(app.main.app) as client:
+        client.get("/health/live").raise_for_status()
+        live_seconds = time.perf_counter() - start
+
+        while client.get("/health/ready").status_code != 200:
+            if time.perf_counter() - start > 60:
+                raise RuntimeError("warm-up did not finish within 60 s")
+            time.sleep(0.001)
+        ready_seconds = time.perf_counter() - start
+
+        request_start = time.perf_counter()
+        client.get("/top-foods/?nutrient=proteines").raise_for_status()
+        first_request_seconds = time.perf_counter() - request_start
+
+    return {
+        "import_ms": round(import_seconds * 1000, 1),
+        "live_ms": round(live_seconds * 1000, 1),
+        "ready_ms": round(ready_seconds * 1000, 1),
+        "first_request_ms": round(first_request_seconds * 1000, 1),
+        "loaded_on_import": loaded,
+    }
+
+
+def summarize(runs):
+    summary = {}
+    for key in ("import_ms", "live_ms", "ready_ms", "first_request_ms"):
+        samples = [run[key] for run in runs]
+        summary[key] = {
+            "median": round(statistics.median(samples), 1),
+            "min": min(samples),
+            "max": max(samples),
+        }
+    summary["loaded_on_import"] = sorted(
+        {name for run in runs for name in run["loaded_on_import"]}
+    )
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--output", help="JSON file for the results")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(child(args.child)))
+        return
+
+    sys.path.append(str(ROOT / "benchmarks"))
+    from bench_endpoints import build_database, git_commit
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "food.db"
+        build_database(db_path)
+
+        runs = []
+        for _ in range(args.runs):
+            output = subprocess.run(
+                [sys.executable, __file__, "--child", str(db_path)],
+                cwd=ROOT,
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout
+            runs.append(json.loads(output.splitlines()[-1]))
+
+    results = {"commit": git_commit(), "runs": args.runs, **summarize(runs)}
+    print(json.dumps(results, indent=2))
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Memory and throughput of the snapshot across worker processes.
+
+The snapshot is written once with `FoodSnapshot.save`, then 1, 2, 4... worker
+processes either map it (`FoodSnapshot.load`, what SNAPSHOT_DIR does) or hold
+their own copy in memory (the default). For each run it reports:
+- private_mb: memory the snapshot added to the workers, summed over workers
+- pss_mb: the same, with shared pages split between the processes mapping them
+- rankings_per_s: /food-by-nutrient/ rankings computed by all workers together
+
+Linux only (memory is read from /proc/self/smaps_rollup). Rows are synthetic,
+as in bench_snapshot.py, so that the snapshot is large enough to measure.
+
+    python benchmarks/bench_workers.py --rows 200000 --workers 1 2 4
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+from app.snapshot import NUMERIC_COLUMNS, FoodSnapshot  # noqa: E402
+from tests.conftest import make_densities, make_foods  # noqa: E402
+
+MODES = ["memory", "mapped"]
+
+
+def memory_kb() -> dict:
+    fields = {}
+    with open("/proc/self/smaps_rollup") as smaps:
+        for line in smaps:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return {
+        "private": fields["Private_Clean"] + fields["Private_Dirty"],
+        "pss": fields["Pss"],
+    }
+
+
+def in_memory(snapshot: FoodSnapshot) -> FoodSnapshot:
+    """Private copy of a mapped snapshot, as `load_snapshot` builds one."""
+    return FoodSnapshot(
+        np.array(snapshot.ids),
+        {name: values.astype(object) for name, values in snapshot.texts.items()},
+        np.array(snapshot.category_codes),
+        snapshot.categories.astype(object),
+        {name: np.array(values) for name, values in snapshot.nutrients.items()},
+        {name: np.array(values) for name, values in snapshot.densities.items()},
+    )
+
+
+def rank(snapshot: FoodSnapshot, i: int) -> None:
+    nutrient = NUMERIC_COLUMNS[i % len(NUMERIC_COLUMNS)]
+    snapshot.top_rows_by_nutrient(nutrient, 0.01, ["id", "nom", nutrient])
+
+
+def worker(path, mode, barrier, seconds, results):
+    before = memory_kb()
+    snapshot = FoodSnapshot.load(Path(path))
+    if mode == "memory":
+        snapshot = in_memory(snapshot)
+    # Touch every column, as serving requests would
+    for i in range(len(NUMERIC_COLUMNS)):
+        rank(snapshot, i)
+    after = memory_kb()
+
+    barrier.wait()
+    count, deadline = 0, time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        rank(snapshot, count)
+        count += 1
+
+    # Measured again once every worker has mapped the files
+    results.put(
+        {
+            "private_kb": after["private"] - before["private"],
+            "pss_kb": memory_kb()["pss"] - before["pss"],
+            "rankings": count,
+        }
+    )
+
+
+def run(path: Path, mode: str, workers: int, seconds: float) -> dict:
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [
+        context.Process(
+            target=worker, args=(str(path), mode, barrier, seconds, results)
+        )
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    samples = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    return {
+        "mode": mode,
+        "workers": workers,
+        "private_mb": round(sum(s["private_kb"] for s in samples) / 1024, 1),
+        "pss_mb": round(sum(s["pss_kb"] for s in samples) / 1024, 1),
+        "rankings_per_s": round(sum(s["rankings"] for s in samples) / seconds),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--output", help="JSON file for the results")
+    args = parser.parse_args()
+
+    sys.path.append(str(ROOT / "benchmarks"))
+    from bench_endpoints import git_commit
+
+    foods = make_foods(args.rows)
+    snapshot = FoodSnapshot.from_rows(foods, make_densities(foods))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "snapshot"
+        snapshot.save(path)
+        size = sum(file.stat().st_size for file in path.iterdir())
+
+        runs = [
+            run(path, mode, workers, args.seconds)
+            for workers in args.workers
+            for mode in MODES
+        ]
+
+    print(f"{args.rows} rows, {size / 2**20:.1f} MB on disk, {os.cpu_count()} CPUs")
+    print(f"{'mode':<8}{'workers':>8}{'private MB':>12}{'PSS MB':>10}{'rank/s':>10}")
+    for result in runs:
+        print(
+            f"{result['mode']:<8}{result['workers']:>8}{result['private_mb']:>12}"
+            f"{result['pss_mb']:>10}{result['rankings_per_s']:>10}"
+        )
+
+    if args.output:
+        results = {
+            "commit": git_commit(),
+            "rows": args.rows,
+            "cpus": os.cpu_count(),
+            "runs": runs,
+        }
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
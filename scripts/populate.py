@@ -1,8 +1,36 @@
+import argparse
+import contextlib
+import numpy as np
+import openpyxl
 import pandas as pd
+import hashlib
 import re
+import sys
 import unicodedata
 import os
-from sqlalchemy import create_engine
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Optional, Tuple
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    Float,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    Text,
+    create_engine,
+    delete,
+    inspect,
+)
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from app.models import FoodDensity, PhaseRecommendation  # noqa: E402
+from app.phases import phases, phase_nutrients  # noqa: E402
+from app.snapshot import BASIS_100G, BASIS_KCAL, DENSITY_COLUMNS  # noqa: E402
 
 # web archive to have a fix URL
 DATASET_URL = (
@@ -11,6 +39,10 @@ DATASET_URL = (
     "Base_de_donnees_suisse_des_valeurs_nutritives.xlsx",
 )
 
+DATA_PATH = Path(__file__).resolve().parent.parent / "data" / "food_data.xlsx"
+# Cleaned tables, so that an unchanged workbook is not parsed again
+CACHE_DIR = Path(os.environ.get("POPULATE_CACHE_DIR", DATA_PATH.parent / "cache"))
+
 CONVERSION_FACTORS = {"g": 1, "mg": 0.001, "kj": 1000, "µg": 0.000001, "kcal": 1000}
 
 USERNAME = os.environ.get("TF_VAR_admin_username")
@@ -30,9 +62,21 @@ DRIVER_OPTIONS = (
 )
 
 CONN_STR = f"mssql+pyodbc://?odbc_connect={DRIVER_OPTIONS}"
-print(f"Connection String being used: {CONN_STR}")
 
-engine = create_engine(CONN_STR)
+# "replace" reloads every table, "incremental" only writes the foods that changed
+LOAD_MODES = ("replace", "incremental")
+LOAD_MODE = os.environ.get("LOAD_MODE", "replace")
+# Rows per INSERT batch
+CHUNK_SIZE = int(os.environ.get("LOAD_CHUNK_SIZE", "1000"))
+
+FOOD_TABLE = "food_table"
+# Content hash of each food row, compared by incremental loads
+FOOD_HASH_TABLE = "food_hash_table"
+# Values that were traces, below a detection limit or not investigated
+QUALIFIER_TABLE = "food_qualifier_table"
+STAGING_SUFFIX = "_staging"
+# Length of the indexed text columns (nom, categorie)
+TEXT_LENGTH = 255
 
 dtype_food = {
     "id": "int",
@@ -95,10 +139,101 @@ def fetch_data(URL):
     # except requests.exceptions.RequestException as e:
     #     print(f"Error during download : {e}")
     #     return
-    data = pd.read_excel("../data/food_data.xlsx", engine="openpyxl", skiprows=2)
+    data = read_workbook(DATA_PATH)
     return data
 
 
+def column_names(header) -> List[str]:
+    """
+    Header cells named as `pd.read_excel` names them: "Unnamed: <i>" when
+    empty, and repeated names suffixed with ".1", ".2"... skipping names
+    already in the header.
+    """
+    names = [f"Unnamed: {i}" if name is None else name for i, name in enumerate(header)]
+    unnamed = [i for i, name in enumerate(header) if name is None]
+    named = [i for i, name in enumerate(header) if name is not None]
+
+    counts: dict = {}
+    # Like pandas, empty cells are renamed last
+    for i in named + unnamed:
+        name = original = names[i]
+        count = counts.get(name, 0)
+        while count > 0:
+            counts[original] = count + 1
+            name = f"{original}.{count}"
+            count = count + 1 if name in names else counts.get(name, 0)
+        names[i] = name
+        counts[name] = count + 1
+    return names
+
+
+def read_workbook(path: Path, skiprows: int = 2) -> pd.DataFrame:
+    """
+    Same frame as `pd.read_excel(path, skiprows=skiprows)`, column names
+    included, streamed from a read-only workbook as plain values, without
+    pandas' per-cell conversion.
+    """
+    workbook = openpyxl.load_workbook(
+        path, read_only=True, data_only=True, keep_links=False
+    )
+    try:
+        rows = workbook.worksheets[0].iter_rows(min_row=skiprows + 1, values_only=True)
+        header = next(rows)
+        data = [[np.nan if value is None else value for value in row] for row in rows]
+    finally:
+        workbook.close()
+
+    return pd.DataFrame(data, columns=column_names(header)).infer_objects()
+
+
+def file_hash(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def prepare_tables(
+    path: Path = DATA_PATH, cache_dir: Path = CACHE_DIR
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Cleaned and typed (food_table, measures_table, qualifier_table), cached as
+    Parquet files keyed by the workbook and this script: an unchanged workbook
+    is not parsed. Only the files of the current key are kept.
+    """
+    key = f"{file_hash(path)}-{file_hash(Path(__file__))}"
+    names = ["food_table", "measure_table", QUALIFIER_TABLE]
+    paths = [cache_dir / f"{name}-{key}.parquet" for name in names]
+
+    if all(table_path.exists() for table_path in paths):
+        print(f"Using cached tables {key}")
+        return tuple(pd.read_parquet(table_path) for table_path in paths)
+
+    data = clean_data(read_workbook(path))
+    measures_table = create_measures_table(data)
+    food_table, qualifier_table = create_food_table(data)
+    tables = (food_table, measures_table, qualifier_table)
+
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        for table, table_path in zip(tables, paths):
+            # Write then rename, so an interrupted run never leaves a partial file
+            tmp_path = table_path.with_suffix(".tmp")
+            table.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, table_path)
+
+        # Tables of previous workbooks or versions of this script
+        for name in names:
+            for old_path in cache_dir.glob(f"{name}-*.parquet"):
+                if old_path not in paths:
+                    old_path.unlink()
+    except OSError as e:
+        print(f"Tables not cached in {cache_dir}: {e}")
+
+    return tables
+
+
 def remove_accents(text):
     normalized_text = unicodedata.normalize("NFKD", text)
     return normalized_text.encode("ascii", "ignore").decode("utf-8")
@@ -124,6 +259,55 @@ def clean_data(df: pd.DataFrame):
     return df
 
 
+NUMERIC_COLUMNS = [
+    "energie_kilojoules",
+    "energie_calories",
+    "lipides_totaux",
+    "acides_gras_satures",
+    "acides_gras_mono_insatures",
+    "acides_gras_poly_insatures",
+    "acide_linoleique",
+    "acide_alpha_linolenique",
+    "acide_eicosapentaenoique",
+    "acide_docosahexaenoique",
+    "cholesterol",
+    "glucides_disponibles",
+    "sucres",
+    "amidon",
+    "fibres_alimentaires",
+    "proteines",
+    "sel",
+    "alcool",
+    "eau",
+    "retinol",
+    "betacarotene",
+    "vitamine_b1",
+    "vitamine_b2",
+    "vitamine_b6",
+    "vitamine_b12",
+    "niacine",
+    "folate",
+    "acide_pantothenique",
+    "vitamine_c",
+    "vitamine_d",
+    "vitamine_e",
+    "potassium",
+    "sodium",
+    "chlore",
+    "calcium",
+    "magnesium",
+    "phosphore",
+    "fer",
+    "iode",
+    "zinc",
+    "selenium",
+]
+
+# Qualifiers of the numeric values, kept as bit flags
+QUALIFIER_TRACE = 1  # "tr.", stored as 0
+QUALIFIER_BELOW_LIMIT = 2  # "<x", below the detection limit x, stored as x
+QUALIFIER_NOT_INVESTIGATED = 4  # "n.i.", stored as 0
+
 dtype_measures = {"name": "str", "unit": "str", "conversion": "float64"}
 
 
@@ -147,82 +331,424 @@ def create_measures_table(df: pd.DataFrame):
     return df
 
 
-def create_food_table(df: pd.DataFrame):
-    numerical_cols = [
-        "energie_kilojoules",
-        "energie_calories",
-        "lipides_totaux",
-        "acides_gras_satures",
-        "acides_gras_mono_insatures",
-        "acides_gras_poly_insatures",
-        "acide_linoleique",
-        "acide_alpha_linolenique",
-        "acide_eicosapentaenoique",
-        "acide_docosahexaenoique",
-        "cholesterol",
-        "glucides_disponibles",
-        "sucres",
-        "amidon",
-        "fibres_alimentaires",
-        "proteines",
-        "sel",
-        "alcool",
-        "eau",
-        "retinol",
-        "betacarotene",
-        "vitamine_b1",
-        "vitamine_b2",
-        "vitamine_b6",
-        "vitamine_b12",
-        "niacine",
-        "folate",
-        "acide_pantothenique",
-        "vitamine_c",
-        "vitamine_d",
-        "vitamine_e",
-        "potassium",
-        "sodium",
-        "chlore",
-        "calcium",
-        "magnesium",
-        "phosphore",
-        "fer",
-        "iode",
-        "zinc",
-        "selenium",
-    ]
+def parse_numeric_columns(df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Parse every numeric column at once: numbers are kept, "tr." and "n.i." give
+    0, "<x" gives x, and empty cells 0. Returns the values and a bitmask of the
+    qualifier of each cell (QUALIFIER_* flags, 0 for plain numbers).
+    """
+    raw = pd.Series(df[NUMERIC_COLUMNS].to_numpy(dtype=object).ravel())
+    values = pd.to_numeric(raw, errors="coerce").to_numpy(dtype="float64")
+    qualifiers = np.zeros(len(raw), dtype=np.uint8)
+
+    # Only the few cells that are not numbers go through string operations
+    text_mask = np.isnan(values) & raw.notna().to_numpy()
+    text = raw[text_mask].astype(str).str.strip()
+
+    trace = (text == "tr.").to_numpy()
+    not_investigated = (text == "n.i.").to_numpy()
+    below_limit = text.str.startswith("<").to_numpy()
+    limits = pd.to_numeric(text[below_limit].str[1:], errors="coerce")
+
+    unknown = ~(trace | not_investigated | below_limit | (text == "").to_numpy())
+    if unknown.any() or limits.isna().any():
+        bad_values = sorted(set(text[unknown]) | set(text[below_limit][limits.isna()]))
+        raise ValueError(f"Unexpected values in numeric columns: {bad_values[:10]}")
+
+    text_index = np.flatnonzero(text_mask)
+    qualifiers[text_index[trace]] = QUALIFIER_TRACE
+    qualifiers[text_index[not_investigated]] = QUALIFIER_NOT_INVESTIGATED
+    qualifiers[text_index[below_limit]] = QUALIFIER_BELOW_LIMIT
+    values[text_index[below_limit]] = limits.to_numpy()
+
+    shape = (len(df), len(NUMERIC_COLUMNS))
+    return np.nan_to_num(values, nan=0.0).reshape(shape), qualifiers.reshape(shape)
+
+
+def create_qualifier_table(food_ids, qualifiers: np.ndarray) -> pd.DataFrame:
+    """One row per qualified value: (food_id, nutrient, QUALIFIER_* bitmask)."""
+    rows, columns = np.nonzero(qualifiers)
+    return pd.DataFrame(
+        {
+            "food_id": np.asarray(food_ids)[rows],
+            "nutrient": np.asarray(NUMERIC_COLUMNS)[columns],
+            "qualifier": qualifiers[rows, columns],
+        }
+    )
+
 
+def create_food_table(df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Typed food table, and the qualifiers of its values (`create_qualifier_table`)"""
     df.columns = [re.sub(r"\((.*?)\)", "", col).strip("_") for col in df.columns]
 
-    df[numerical_cols] = df[numerical_cols].replace(
-        ["tr.", "n.i.", ""], 0
-    )  # Handle potential characters or empty values
+    values, qualifiers = parse_numeric_columns(df)
+    df[NUMERIC_COLUMNS] = values
 
-    df[numerical_cols] = df[numerical_cols].fillna(0)  # Handle NaN
+    df = df.astype(dtype_food)
 
-    for col in numerical_cols:
-        df[col] = df[col].astype(str).str.replace("<", "", regex=False)
+    return df, create_qualifier_table(df["id"], qualifiers)
+
+
+def create_density_table(
+    food_table: pd.DataFrame, measures_table: pd.DataFrame
+) -> pd.DataFrame:
+    """
+    Nutrients per kcal of each food, converted to grams with the factors of
+    `measures_table`, so that the API ranks by density without computing it.
+    Foods without calories get NaN rather than an infinite density.
+    """
+    conversions = measures_table.set_index("name")["conversion"][DENSITY_COLUMNS]
+    calories = food_table["energie_calories"].where(food_table["energie_calories"] > 0)
+
+    density_table = food_table[DENSITY_COLUMNS].mul(conversions).div(calories, axis=0)
+    density_table.insert(0, "id", food_table["id"])
+    return density_table
+
+
+def create_phase_recommendation_table(
+    food_table: pd.DataFrame, density_table: Optional[pd.DataFrame] = None
+) -> pd.DataFrame:
+    """
+    Rank every food for each nutrient of each phase, so that the API can answer
+    /food-by-phase/ with a range read. A nutrient used in several phases (or
+    twice in one) is ranked once per basis: per 100 g from `food_table`, and
+    per kcal from `density_table` when given.
+    """
+    bases = {BASIS_100G: food_table}
+    if density_table is not None:
+        bases[BASIS_KCAL] = density_table
+
+    tables = []
+    for basis, values in bases.items():
+        rankings = {}
+        for phase in phases:
+            for nutrient in phase_nutrients(phase):
+                if nutrient not in values.columns:
+                    continue
+
+                if nutrient not in rankings:
+                    ranked = values.sort_values(
+                        [nutrient, "id"], ascending=[False, True], na_position="last"
+                    )
+                    rankings[nutrient] = pd.DataFrame(
+                        {
+                            "nutrient": nutrient,
+                            "food_rank": range(1, len(ranked) + 1),
+                            "food_id": ranked["id"].to_numpy(),
+                            "total_count": ranked[nutrient].count(),
+                        }
+                    )
+
+                tables.append(rankings[nutrient].assign(phase=phase, basis=basis))
+
+    columns = ["phase", "basis", "nutrient", "food_rank", "food_id", "total_count"]
+    return pd.concat(tables, ignore_index=True)[columns]
+
+
+def compute_dataset_version(*tables: pd.DataFrame) -> str:
+    """Content hash of the loaded tables, used by the API to invalidate caches"""
+    digest = hashlib.sha256()
+    for table in tables:
+        digest.update(",".join(table.columns).encode("utf-8"))
+        digest.update(pd.util.hash_pandas_object(table, index=False).values.tobytes())
+    return digest.hexdigest()[:16]
+
+
+def staging_name(name: str) -> str:
+    return f"{name}{STAGING_SUFFIX}"
+
+
+def rename_table(conn, old: str, new: str):
+    if conn.dialect.name == "mssql":
+        conn.exec_driver_sql(f"EXEC sp_rename '{old}', '{new}'")
+    else:
+        quote = conn.dialect.identifier_preparer.quote
+        conn.exec_driver_sql(f"ALTER TABLE {quote(old)} RENAME TO {quote(new)}")
+
+
+def ranked_nutrients() -> List[str]:
+    """Food columns ranked by /food-by-phase/, from the `phases` definition."""
+    names = (name for phase in phases for name in phase_nutrients(phase))
+    return [name for name in dict.fromkeys(names) if name in NUMERIC_COLUMNS]
+
+
+def food_table_schema(food_table: pd.DataFrame, name: str = FOOD_TABLE) -> Table:
+    """
+    Table for `food_table`, with the column types pandas would use, but a
+    primary key on id and bounded text columns that can be indexed.
+    """
+    columns = [Column("id", Integer, primary_key=True, autoincrement=False)]
+    for column, dtype in food_table.dtypes.items():
+        if column == "id":
+            continue
+        if pd.api.types.is_integer_dtype(dtype):
+            column_type = BigInteger
+        elif pd.api.types.is_float_dtype(dtype):
+            column_type = Float(precision=53)
+        elif column in ("nom", "categorie"):
+            column_type = String(TEXT_LENGTH)
+        else:
+            column_type = Text
+        columns.append(Column(column, column_type))
+    return Table(name, MetaData(), *columns)
+
+
+def food_indexes(table: Table) -> List[Index]:
+    """
+    Index on categorie for /top-foods/, and one per nutrient ranked by a phase,
+    in ranking order. On SQL Server they include nom, so that the default
+    queries do not need to read the rows.
+    """
+    indexes = [
+        Index(f"ix_{table.name}_categorie", table.c.categorie, mssql_include=["nom"])
+    ]
+    for nutrient in ranked_nutrients():
+        indexes.append(
+            Index(
+                f"ix_{table.name}_{nutrient}",
+                table.c[nutrient].desc(),
+                mssql_include=["nom"],
+            )
+        )
+    return indexes
 
-    df = df.astype(dtype_food)
 
-    return df
+def density_indexes() -> List[Index]:
+    """One index per nutrient ranked by a phase, for the rankings per kcal."""
+    table = FoodDensity.__table__.to_metadata(MetaData(), schema=None)
+    return [
+        Index(f"ix_{table.name}_{nutrient}", table.c[nutrient].desc())
+        for nutrient in ranked_nutrients()
+    ]
 
 
-def create_tables(df: pd.DataFrame):
-    data = clean_data(df)
+def write_staging_table(table: pd.DataFrame, name: str, engine, model_table=None):
+    """
+    Bulk insert `table` into an empty staging copy of `name`, created from
+    `model_table` when given (to get its keys), else by pandas.
+    """
+    staging = staging_name(name)
+    Table(staging, MetaData()).drop(engine, checkfirst=True)
+    if model_table is not None:
+        model_table.to_metadata(MetaData(), name=staging).create(engine)
 
-    measures_table = create_measures_table(data)
-    food_table = create_food_table(data)
+    table.to_sql(
+        staging, con=engine, if_exists="append", index=False, chunksize=CHUNK_SIZE
+    )
+
+
+@contextlib.contextmanager
+def transaction(engine):
+    """`engine.begin()`, also covering DDL on SQLite."""
+    with engine.begin() as conn:
+        if conn.dialect.name == "sqlite":
+            # pysqlite only opens a transaction before DML, not before DDL
+            conn.exec_driver_sql("BEGIN")
+        yield conn
+
+
+def swap_staged_tables(conn, names, indexes=()):
+    """
+    Replace each table by its staging copy within the transaction of `conn`.
+
+    `indexes` are created (if missing) once the old tables are dropped: SQLite
+    index names are global to the database.
+    """
+    quote = conn.dialect.identifier_preparer.quote
+    for name in names:
+        old = f"{name}_old"
+        exists = inspect(conn).has_table(name)
+        if exists:
+            rename_table(conn, name, old)
+        rename_table(conn, staging_name(name), name)
+        if exists:
+            conn.exec_driver_sql(f"DROP TABLE {quote(old)}")
+    for index in indexes:
+        index.create(conn, checkfirst=True)
+
+
+def swap_tables(engine, names, indexes=()):
+    """
+    Replace each table by its staging copy, all in one transaction: readers see
+    either all the old tables or all the new ones, never a missing table.
+    """
+    with transaction(engine) as conn:
+        swap_staged_tables(conn, names, indexes)
+
+
+def food_row_hashes(food_table: pd.DataFrame) -> pd.DataFrame:
+    hashes = pd.util.hash_pandas_object(food_table, index=False)
+    return pd.DataFrame(
+        {"id": food_table["id"].to_numpy(), "row_hash": [f"{h:016x}" for h in hashes]}
+    )
+
+
+def read_row_hashes(engine) -> Optional[pd.DataFrame]:
+    tables = inspect(engine)
+    if not (tables.has_table(FOOD_TABLE) and tables.has_table(FOOD_HASH_TABLE)):
+        return None
+    return pd.read_sql(f"SELECT id, row_hash FROM {FOOD_HASH_TABLE}", engine)
 
-    measures_table_name = "measure_table"
-    food_table_name = "food_table"
 
-    measures_table.to_sql(
-        measures_table_name, con=engine, if_exists="replace", index=False
+# Foods to delete (ids, changed or removed ones), then food and hash rows to
+# insert (changed or added ones)
+FoodChanges = Tuple[List[int], pd.DataFrame, pd.DataFrame]
+
+
+def food_changes(food_table: pd.DataFrame, engine) -> Optional[FoodChanges]:
+    """
+    Foods whose content hash changed since the last load, or None if there is
+    no previous load to compare with.
+    """
+    previous = read_row_hashes(engine)
+    if previous is None:
+        return None
+
+    hashes = food_row_hashes(food_table)
+    merged = hashes.merge(
+        previous, on="id", how="outer", suffixes=("", "_old"), indicator=True
     )
-    food_table.to_sql(food_table_name, con=engine, if_exists="replace", index=False)
+    changed = merged[merged["row_hash"] != merged["row_hash_old"]]
+    stale_ids = changed.loc[changed["_merge"] != "left_only", "id"].tolist()
+    new_ids = changed.loc[changed["_merge"] != "right_only", "id"]
+    return (
+        stale_ids,
+        food_table[food_table["id"].isin(new_ids)],
+        hashes[hashes["id"].isin(new_ids)],
+    )
+
+
+def count_food_changes(changes: FoodChanges) -> int:
+    """Foods written or deleted."""
+    stale_ids, new_foods, _ = changes
+    return len(set(stale_ids) | set(new_foods["id"]))
+
+
+def write_food_changes(conn, changes: FoodChanges) -> None:
+    """Apply `changes` within the transaction of `conn`."""
+    stale_ids, new_foods, new_hashes = changes
+    for name in (FOOD_TABLE, FOOD_HASH_TABLE):
+        rows = Table(name, MetaData(), Column("id", Integer))
+        for start in range(0, len(stale_ids), CHUNK_SIZE):
+            end = start + CHUNK_SIZE
+            conn.execute(delete(rows).where(rows.c.id.in_(stale_ids[start:end])))
+
+    for name, rows in ((FOOD_TABLE, new_foods), (FOOD_HASH_TABLE, new_hashes)):
+        rows.to_sql(
+            name, con=conn, if_exists="append", index=False, chunksize=CHUNK_SIZE
+        )
+
+
+def upsert_food_table(food_table: pd.DataFrame, engine) -> Optional[int]:
+    """
+    Write only the foods whose content hash changed since the last load
+    (deleting removed ones), in one transaction. Returns the number of foods
+    written or deleted, or None if there is no previous load to compare with.
+    """
+    changes = food_changes(food_table, engine)
+    if changes is None:
+        return None
+
+    with transaction(engine) as conn:
+        write_food_changes(conn, changes)
+    return count_food_changes(changes)
+
+
+def load_tables(
+    food_table: pd.DataFrame,
+    measures_table: pd.DataFrame,
+    engine,
+    mode: str = "replace",
+    qualifier_table: Optional[pd.DataFrame] = None,
+) -> str:
+    """
+    Load the tables without the API ever seeing them empty or missing: each one
+    is written to a staging table, then all are swapped in at once. In
+    incremental mode the food table is updated in place, with changed rows only,
+    in the transaction of the swap: the other tables and the dataset version
+    never describe a different food table.
+    """
+    density_table = create_density_table(food_table, measures_table)
+    phase_table = create_phase_recommendation_table(food_table, density_table)
+    tables = [food_table, measures_table, phase_table]
+    if qualifier_table is not None:
+        tables.append(qualifier_table)
+    version = compute_dataset_version(*tables)
+    version_table = pd.DataFrame(
+        [{"version": version, "loaded_at": datetime.now(timezone.utc)}]
+    )
+
+    staged = [
+        (measures_table, "measure_table", None),
+        (density_table, FoodDensity.__tablename__, FoodDensity.__table__),
+        (phase_table, PhaseRecommendation.__tablename__, PhaseRecommendation.__table__),
+        # Swapped last, so the API only sees the new version once the data is there
+        (version_table, "dataset_version", None),
+    ]
+    if qualifier_table is not None:
+        staged.insert(1, (qualifier_table, QUALIFIER_TABLE, None))
+
+    changes = None
+    if mode == "incremental":
+        changes = food_changes(food_table, engine)
+    if changes is None:
+        staged[:0] = [
+            (food_table, FOOD_TABLE, food_table_schema(food_table)),
+            (food_row_hashes(food_table), FOOD_HASH_TABLE, None),
+        ]
+
+    for data, name, model_table in staged:
+        write_staging_table(data, name, engine, model_table)
+    with transaction(engine) as conn:
+        if changes is not None:
+            write_food_changes(conn, changes)
+        swap_staged_tables(
+            conn,
+            [name for _, name, _ in staged],
+            food_indexes(food_table_schema(food_table)) + density_indexes(),
+        )
+    if changes is not None:
+        count = count_food_changes(changes)
+        print(f"Incremental load: {count} foods written or deleted")
+
+    print(f"Dataset version: {version}")
+    return version
+
+
+def sqlite_engine(path: Path):
+    """Engine writing the tables to a SQLite file, which has no dbo schema."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return create_engine(f"sqlite:///{path}").execution_options(
+        schema_translate_map={"dbo": None}
+    )
+
+
+def create_tables(df: pd.DataFrame, engine, mode: str = "replace") -> str:
+    data = clean_data(df)
+
+    measures_table = create_measures_table(data)
+    food_table, qualifier_table = create_food_table(data)
+
+    return load_tables(food_table, measures_table, engine, mode, qualifier_table)
 
 
 if __name__ == "__main__":
-    df = fetch_data(DATASET_URL)
-    create_tables(df)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=LOAD_MODES, default=LOAD_MODE)
+    parser.add_argument(
+        "--sqlite",
+        type=Path,
+        help="write to this SQLite file (DB_BACKEND=sqlite) instead of Azure SQL",
+    )
+    args = parser.parse_args()
+
+    if args.sqlite:
+        print(f"Loading into {args.sqlite} ({args.mode})")
+        engine = sqlite_engine(args.sqlite)
+    else:
+        print(f"Loading into {SERVER}/{DATABASE} ({args.mode})")
+        # fast_executemany sends each chunk of rows to SQL Server in one round trip
+        engine = create_engine(CONN_STR, fast_executemany=True)
+
+    food_table, measures_table, qualifier_table = prepare_tables()
+    load_tables(food_table, measures_table, engine, args.mode, qualifier_table)
@@ -0,0 +1,145 @@
+"""
+Query plans of the SQL sent by the endpoints, when they are not served from
+the in-memory snapshot.
+
+Runs the queries of each endpoint, then asks the database for their plans
+(EXPLAIN QUERY PLAN on SQLite, SHOWPLAN_TEXT on SQL Server) and flags the steps
+that read a whole table or sort it:
+
+    python scripts/query_plans.py                      # database of populate.py
+    python scripts/query_plans.py --url sqlite:///food.db
+"""
+
+import argparse
+import re
+import sys
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+from sqlalchemy import create_engine, event
+from sqlmodel import Session
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from app.categories import TOP_FOODS_CATEGORIES  # noqa: E402
+from app.phases import phase_nutrients  # noqa: E402
+from app.utils import (  # noqa: E402
+    get_phase_recommendations,
+    get_top_food_by_abs_nutrient,
+    get_top_foods_by_categories,
+    map_categories,
+)
+
+ENDPOINT_QUERIES: Dict[str, Callable[[Session], object]] = {
+    "/top-foods/?nutrient=fer": lambda session: get_top_foods_by_categories(
+        session, map_categories(session, TOP_FOODS_CATEGORIES), 0.2, "fer"
+    ),
+    "/food-by-phase/?phase=ovulatoire": lambda session: get_phase_recommendations(
+        session,
+        "ovulatoire",
+        phase_nutrients("ovulatoire"),
+        0.1,
+        {name: ["nom", name] for name in phase_nutrients("ovulatoire")},
+    ),
+    "/food-by-phase/?phase=ovulatoire (live ranking)": lambda session: [
+        get_top_food_by_abs_nutrient(name, 0.1, session, fields=["nom", name])
+        for name in phase_nutrients("ovulatoire")
+    ],
+    "/food-by-phase/?phase=ovulatoire&basis=kcal (live ranking)": lambda session: [
+        get_top_food_by_abs_nutrient(
+            name, 0.1, session, fields=["nom", name], basis="kcal"
+        )
+        for name in phase_nutrients("ovulatoire")
+    ],
+}
+
+# Plan steps reading a whole table (not through an index), or sorting rows
+FULL_SCAN_PATTERNS = {
+    "sqlite": re.compile(r"^SCAN (\w+\.)?\w+_table$|USE TEMP B-TREE"),
+    "mssql": re.compile(r"Table Scan|Clustered Index Scan|Sort\("),
+}
+
+
+def capture_statements(engine, query: Callable[[Session], object]) -> List[Tuple]:
+    """Distinct (statement, parameters) sent by `query`, in order."""
+    statements = {}
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.setdefault((statement, tuple(parameters)), None)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        with Session(engine) as session:
+            query(session)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    return list(statements)
+
+
+def explain(conn, statement: str, parameters: tuple) -> List[str]:
+    if conn.dialect.name == "sqlite":
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        return [row[-1] for row in rows]
+
+    if conn.dialect.name == "mssql":
+        # With SHOWPLAN_TEXT on, statements are not run, their plan is returned
+        conn.exec_driver_sql("SET SHOWPLAN_TEXT ON")
+        try:
+            rows = conn.exec_driver_sql(statement, parameters).all()
+        finally:
+            conn.exec_driver_sql("SET SHOWPLAN_TEXT OFF")
+        return [row[0].strip() for row in rows]
+
+    raise ValueError(f"No query plans for {conn.dialect.name}")
+
+
+def is_full_scan(dialect: str, step: str) -> bool:
+    pattern = FULL_SCAN_PATTERNS.get(dialect)
+    return pattern is not None and pattern.search(step) is not None
+
+
+def query_plans(engine) -> Dict[str, List[Tuple[str, List[str]]]]:
+    """Endpoint -> [(statement, plan steps)]"""
+    plans = {}
+    for endpoint, query in ENDPOINT_QUERIES.items():
+        statements = capture_statements(engine, query)
+        with engine.connect() as conn:
+            plans[endpoint] = [
+                (statement, explain(conn, statement, parameters))
+                for statement, parameters in statements
+            ]
+    return plans
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", help="database URL, default the one of populate.py")
+    args = parser.parse_args()
+
+    if args.url is None:
+        from populate import CONN_STR
+
+        args.url = CONN_STR
+    engine = create_engine(args.url)
+    if engine.dialect.name == "sqlite":
+        # Local copies have no dbo schema
+        engine = engine.execution_options(schema_translate_map={"dbo": None})
+
+    full_scans = 0
+    for endpoint, statements in query_plans(engine).items():
+        print(f"\n{endpoint}")
+        for statement, plan in statements:
+            print("  " + " ".join(statement.split())[:160])
+            for step in plan:
+                full_scans += is_full_scan(engine.dialect.name, step)
+            # Long plans repeat steps (one per keyword of /top-foods/)
+            for step in dict.fromkeys(plan):
+                flag = "!" if is_full_scan(engine.dialect.name, step) else " "
+                repeat = plan.count(step)
+                print(f"    {flag} {step}" + (f" (x{repeat})" if repeat > 1 else ""))
+
+    print(f"\n{full_scans} full scan or sort step(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import asyncio
+import random
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.categories import clear_category_index
+from app.dataset import clear_dataset_version
+from app.models import Food, FoodDensity
+from app.result_cache import clear_result_caches
+from app.search import clear_search_index
+from app.snapshot import (
+    DENSITY_COLUMNS,
+    NUMERIC_COLUMNS,
+    INTEGER_COLUMNS,
+    set_snapshot,
+)
+
+# Only these columns get NULLs, so other rankings stay free of ties
+NULLABLE_COLUMNS = {"zinc", "vitamine_d"}
+
+CATEGORIES = [
+    "Fruits frais",
+    "Fruits de mer",
+    "Légumes cuits",
+    "Lait et produits laitiers",
+    "Viande rouge",
+    "Boissons sucrées",
+]
+
+
+def make_foods(count: int, seed: int = 0):
+    """Random foods with distinct nutrient values, so rankings have no ties."""
+    rng = random.Random(seed)
+    values = {name: rng.sample(range(1, count * 10), count) for name in NUMERIC_COLUMNS}
+
+    foods = []
+    for i in range(count):
+        nutrients = {}
+        for name in NUMERIC_COLUMNS:
+            value = values[name][i]
+            if i % 7 == 0 and name in NULLABLE_COLUMNS:
+                nutrients[name] = None
+            elif name in INTEGER_COLUMNS:
+                nutrients[name] = value
+            else:
+                nutrients[name] = value / 100
+        foods.append(
+            Food(
+                id=i + 1,
+                nom=f"Aliment {i + 1}",
+                synonymes="",
+                categorie=CATEGORIES[i % len(CATEGORIES)],
+                unite_de_matrice="par 100 g de partie comestible",
+                **nutrients,
+            )
+        )
+    return foods
+
+
+def make_densities(foods):
+    """food_density_table rows of `foods`, as `scripts/populate.py` builds them."""
+    return [
+        FoodDensity(
+            id=food.id,
+            **{
+                name: (
+                    None
+                    if getattr(food, name) is None
+                    else getattr(food, name) / food.energie_calories
+                )
+                for name in DENSITY_COLUMNS
+            },
+        )
+        for food in foods
+    ]
+
+
+@pytest.fixture
+def sqlite_engine():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    ).execution_options(schema_translate_map={"dbo": None})
+    SQLModel.metadata.create_all(engine)
+
+    with Session(engine) as session:
+        foods = make_foods(120)
+        session.add_all(foods)
+        session.add_all(make_densities(foods))
+        session.commit()
+
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def sqlite_session(sqlite_engine):
+    with Session(sqlite_engine) as session:
+        yield session
+
+
+@pytest.fixture
+def async_session_factory(tmp_path):
+    """Async sessions on a file copy of the test database, as the API uses."""
+    path = tmp_path / "foods.db"
+    engine = create_engine(f"sqlite:///{path}").execution_options(
+        schema_translate_map={"dbo": None}
+    )
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        foods = make_foods(120)
+        session.add_all(foods)
+        session.add_all(make_densities(foods))
+        session.commit()
+    engine.dispose()
+
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}").execution_options(
+        schema_translate_map={"dbo": None}
+    )
+    yield async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+    asyncio.run(async_engine.dispose())
+
+
+@pytest.fixture
+def statements(sqlite_engine):
+    """SQL statements sent to the test database while the test runs."""
+    emitted = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        emitted.append(statement)
+
+    event.listen(sqlite_engine, "before_cursor_execute", record)
+    yield emitted
+    event.remove(sqlite_engine, "before_cursor_execute", record)
+
+
+@pytest.fixture(autouse=True)
+def no_cached_data():
+    set_snapshot(None)
+    clear_category_index()
+    clear_dataset_version()
+    clear_search_index()
+    clear_result_caches()
+    yield
+    set_snapshot(None)
+    clear_category_index()
+    clear_dataset_version()
+    clear_search_index()
+    clear_result_caches()
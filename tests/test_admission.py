@@ -0,0 +1,207 @@
+import asyncio
+
+import httpx
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.admission import (
+    QUEUE_FULL,
+    TIMEOUT,
+    AdmissionController,
+    AdmittedQueuePool,
+    Overloaded,
+)
+from app.db import get_session_factory, open_pool
+from app.main import app
+from app.metrics import ADMISSION_REJECTED
+
+
+def rejected(backend, reason):
+    return ADMISSION_REJECTED.labels(backend, reason)._value.get()
+
+
+def test_queue_then_reject_when_full():
+    admission = AdmissionController("test-queue", limit=2, queue_size=1, timeout=5)
+
+    async def run():
+        await admission.acquire()
+        await admission.acquire()
+        queued = asyncio.create_task(admission.acquire())
+        await asyncio.sleep(0)
+        assert (admission.active, admission.waiting) == (2, 1)
+
+        with pytest.raises(Overloaded) as exc_info:
+            await admission.acquire()
+
+        # The freed slot goes to the queued caller
+        admission.release()
+        await queued
+        assert (admission.active, admission.waiting) == (2, 0)
+        return exc_info.value
+
+    error = asyncio.run(run())
+
+    assert error.reason == QUEUE_FULL
+    assert rejected("test-queue", QUEUE_FULL) == 1
+
+
+def test_reject_after_timeout():
+    admission = AdmissionController("test-timeout", limit=1, queue_size=5, timeout=0.01)
+
+    async def run():
+        await admission.acquire()
+        with pytest.raises(Overloaded) as exc_info:
+            await admission.acquire()
+        return exc_info.value
+
+    assert asyncio.run(run()).reason == TIMEOUT
+    assert (admission.active, admission.waiting) == (1, 0)
+    assert rejected("test-timeout", TIMEOUT) == 1
+
+
+def test_slot_handed_over_at_the_deadline_is_given_back(monkeypatch):
+    admission = AdmissionController("test-deadline", limit=1, queue_size=5, timeout=5)
+
+    async def wait_for(waiter, timeout):
+        # As on Python 3.12+: the waiter is resolved in the same iteration as
+        # the deadline, and wait_for raises anyway
+        admission.release()
+        assert waiter.done()
+        raise asyncio.TimeoutError
+
+    async def run():
+        await admission.acquire()
+        monkeypatch.setattr("app.admission.asyncio.wait_for", wait_for)
+        with pytest.raises(Overloaded):
+            await admission.acquire()
+
+    asyncio.run(run())
+
+    # The holder released, the timed out caller gave the slot back
+    assert (admission.active, admission.waiting) == (0, 0)
+
+
+def test_cancelled_waiter_gives_its_place_up():
+    admission = AdmissionController("test-cancel", limit=1, queue_size=5, timeout=5)
+
+    async def run():
+        await admission.acquire()
+        cancelled = asyncio.create_task(admission.acquire())
+        queued = asyncio.create_task(admission.acquire())
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.sleep(0)
+
+        admission.release()
+        await queued
+        admission.release()
+
+    asyncio.run(run())
+
+    assert (admission.active, admission.waiting) == (0, 0)
+
+
+@pytest.fixture
+def admitted_engine(async_session_factory):
+    """Engine on the test database, using one connection at most."""
+    admission = AdmissionController("test-pool", limit=1, queue_size=0, timeout=1)
+    engine = create_async_engine(
+        async_session_factory.kw["bind"].url,
+        poolclass=AdmittedQueuePool,
+        admission=admission,
+    ).execution_options(schema_translate_map={"dbo": None})
+    return engine, admission
+
+
+def test_pool_admits_checkouts(admitted_engine):
+    engine, admission = admitted_engine
+
+    async def run():
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            assert admission.active == 1
+            with pytest.raises(Overloaded):
+                await engine.connect().start()
+        assert admission.active == 0
+
+        # Disposing the engine keeps the limit
+        await engine.dispose()
+        async with engine.connect():
+            assert admission.active == 1
+        # The warm-up does not open more connections than admitted
+        await open_pool(engine, size=3)
+        await engine.dispose()
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize(
+    "method, url, json",
+    [
+        # The dataset version is read, for the ETag, before the endpoint runs
+        ("GET", "/top-foods/?nutrient=fer", None),
+        ("POST", "/top-foods/batch", {"specs": [{"nutrient": "fer"}]}),
+    ],
+)
+def test_overloaded_requests_get_503(admitted_engine, method, url, json):
+    engine, admission = admitted_engine
+    session_factory = async_sessionmaker(
+        engine, class_=AsyncSession, expire_on_commit=False
+    )
+    app.dependency_overrides[get_session_factory] = lambda: session_factory
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://api"
+        ) as client:
+            # Holds the only connection while the request comes in
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+                overloaded = await client.request(method, url, json=json)
+            return overloaded, await client.request(method, url, json=json)
+
+    try:
+        overloaded, response = asyncio.run(run())
+    finally:
+        app.dependency_overrides.clear()
+        asyncio.run(engine.dispose())
+
+    assert overloaded.status_code == 503
+    assert overloaded.headers["retry-after"] == "1"
+    assert response.status_code == 200
+
+
+def test_overloaded_stream_gets_503_before_any_body(admitted_engine):
+    engine, admission = admitted_engine
+    session_factory = async_sessionmaker(
+        engine, class_=AsyncSession, expire_on_commit=False
+    )
+    app.dependency_overrides[get_session_factory] = lambda: session_factory
+    url = "/food-by-nutrient/?nutrient=fer&stream=true"
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://api"
+        ) as client:
+            # The dataset version is then cached, only the ranking needs a
+            # connection
+            response = await client.get(url)
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+                overloaded = await client.get(url)
+            return response, overloaded
+
+    try:
+        response, overloaded = asyncio.run(run())
+    finally:
+        app.dependency_overrides.clear()
+        asyncio.run(engine.dispose())
+
+    assert response.status_code == 200
+    assert len(response.text.splitlines()) > 0
+    assert overloaded.status_code == 503
+    assert admission.active == 0
@@ -0,0 +1,113 @@
+import asyncio
+import threading
+from datetime import datetime
+
+import pytest
+
+from app.categories import CategoryIndex, get_category_index, normalize_text
+from app.search import get_search_index
+from app.dataset import clear_dataset_version, get_dataset_version
+from app.models import DatasetVersion, Food
+from app.utils import map_categories
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("Légumes", "legumes"),
+        ("Œufs", "oeufs"),
+        ("ARÔMES", "aromes"),
+        ("petit-déjeuner", "petit-dejeuner"),
+    ],
+)
+def test_normalize_text(text, expected):
+    assert normalize_text(text) == expected
+
+
+def test_category_index_lookup():
+    index = CategoryIndex(
+        [
+            "Fruits frais",
+            "Fruits de mer",
+            "Legumes cuits",
+            "Boissons aux fruits",
+            "Œufs et produits à base d'œufs",
+        ]
+    )
+
+    assert index.lookup("Fruits") == ["Fruits frais"]
+    assert index.lookup("fruits") == ["Fruits frais"]
+    assert index.lookup("Légumes") == ["Legumes cuits"]
+    assert index.lookup("oeufs") == ["Œufs et produits à base d'œufs"]
+    assert index.lookup("Poisson") == []
+
+
+def test_category_index_memoizes_lookups():
+    index = CategoryIndex(["Fruits frais"], keywords=["Fruits"])
+
+    assert index.lookup("Fruits") is index.lookup("FRUITS")
+
+
+def test_category_index_lookups_are_bounded():
+    index = CategoryIndex(["Fruits frais"], keywords=["Fruits"], max_lookups=2)
+
+    for keyword in ["a", "b", "c"]:
+        index.lookup(keyword)
+    index.lookup("b")
+    index.lookup("d")
+
+    assert list(index._recent) == ["b", "d"]
+    # Keywords of the index are kept whatever else is looked up
+    assert index.lookup("fruits") == ["Fruits frais"]
+    assert "fruits" not in index._recent
+
+
+def test_map_categories_uses_cached_index(sqlite_session, statements):
+    first = map_categories(sqlite_session, ["Fruits", "Viande"])
+    emitted = len(statements)
+    second = map_categories(sqlite_session, ["Fruits", "Viande"])
+
+    assert first == second == {"Fruits": ["Fruits frais"], "Viande": ["Viande rouge"]}
+    assert len(statements) == emitted
+
+
+def test_category_index_invalidated_by_dataset_version(sqlite_session):
+    index = get_category_index(sqlite_session)
+    assert index.version is None
+    assert get_dataset_version(sqlite_session) is None
+
+    sqlite_session.add(
+        Food(nom="Saumon", synonymes="", categorie="Poissons", unite_de_matrice="g")
+    )
+    sqlite_session.add(DatasetVersion(version="abc123", loaded_at=datetime.now()))
+    sqlite_session.commit()
+
+    assert get_category_index(sqlite_session) is index
+
+    clear_dataset_version()
+    index = get_category_index(sqlite_session)
+
+    assert index.version == "abc123"
+    assert index.lookup("Poisson") == ["Poissons"]
+
+
+@pytest.mark.parametrize("get_index", [get_category_index, get_search_index])
+def test_concurrent_index_builds_do_not_block_the_loop(
+    async_session_factory, get_index
+):
+    async def build():
+        async with async_session_factory() as session:
+            return await session.run_sync(get_index)
+
+    async def run():
+        return await asyncio.gather(*(build() for _ in range(4)))
+
+    results = []
+    # In a thread: if the builds blocked the event loop, it would never return
+    thread = threading.Thread(target=lambda: results.extend(asyncio.run(run())))
+    thread.daemon = True
+    thread.start()
+    thread.join(timeout=10)
+
+    assert not thread.is_alive()
+    assert len(results) == 4
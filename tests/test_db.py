@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session, SQLModel
+
+from app import db
+from app.utils import get_top_food_by_abs_nutrient, get_top_foods_by_categories
+from scripts.populate import sqlite_engine
+from tests.conftest import make_densities, make_foods
+
+
+@pytest.fixture
+def sqlite_file(tmp_path, monkeypatch):
+    """A database file as `scripts/populate.py --sqlite` writes it."""
+    path = tmp_path / "data" / "food.db"
+    engine = sqlite_engine(path)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        foods = make_foods(120)
+        session.add_all(foods)
+        session.add_all(make_densities(foods))
+        session.commit()
+    engine.dispose()
+
+    monkeypatch.setattr(db, "SQLITE_PATH", str(path))
+    return path
+
+
+def run_sync(engine, fn, *args, **kwargs):
+    async def run():
+        try:
+            async with engine.connect() as conn:
+                return await conn.run_sync(
+                    lambda sync_conn: fn(Session(sync_conn), *args, **kwargs)
+                )
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize(
+    "query, args",
+    [
+        (
+            lambda session, *args: get_top_food_by_abs_nutrient(*args, session),
+            ("fer", 0.1),
+        ),
+        (
+            get_top_foods_by_categories,
+            ({"Fruits": ["Fruits frais"]}, 0.5, "zinc", ["nom", "zinc"], "kcal"),
+        ),
+    ],
+)
+def test_sqlite_backend_runs_the_same_queries(sqlite_file, sqlite_session, query, args):
+    engine = db.create_backend_engine("sqlite")
+
+    assert run_sync(engine, query, *args) == query(sqlite_session, *args)
+
+
+def test_sqlite_backend_is_read_only(sqlite_file):
+    engine = db.create_backend_engine("sqlite")
+
+    with pytest.raises(OperationalError, match="readonly"):
+        run_sync(
+            engine, lambda session: session.execute(text("DELETE FROM food_table"))
+        )
+
+
+@pytest.mark.parametrize("backend", db.DB_BACKENDS)
+def test_pool_holds_every_admitted_connection(backend, monkeypatch):
+    monkeypatch.setattr(db, "DB_MAX_CONCURRENCY", None)
+    monkeypatch.setattr(db, "WORKERS", 1)
+    options = db.pool_options(backend)
+
+    limit = db.DB_CONCURRENCY_LIMITS[backend]
+    assert options["admission"].limit == limit
+    assert options["pool_size"] + options["max_overflow"] == limit
+
+
+@pytest.mark.parametrize(
+    "backend, limit, workers, expected",
+    [
+        ("mssql", None, 2, 2),
+        ("sqlite", None, 2, 8),
+        ("mssql", "3", 2, 1),
+        ("mssql", "1", 4, 1),
+    ],
+)
+def test_limit_shared_between_workers(backend, limit, workers, expected, monkeypatch):
+    monkeypatch.setattr(db, "DB_MAX_CONCURRENCY", limit)
+    monkeypatch.setattr(db, "WORKERS", workers)
+
+    assert db.admission_limit(backend) == expected
+    assert db.pool_options(backend)["pool_size"] == expected
+
+
+def test_sqlite_backend_pool_size(sqlite_file, monkeypatch):
+    monkeypatch.setattr(db, "DB_MAX_CONCURRENCY", "20")
+    monkeypatch.setattr(db, "WORKERS", 1)
+    engine = db.create_backend_engine("sqlite")
+
+    assert engine.pool.admission.limit == 20
+    assert engine.pool.size() == 20
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError, match="DB_BACKEND"):
+        db.create_backend_engine("duckdb")
@@ -0,0 +1,169 @@
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi import HTTPException
+
+from app.models import PhaseRecommendation
+from app.phases import phase_nutrients
+from app.snapshot import DENSITY_COLUMNS, NUMERIC_COLUMNS, reload_snapshot
+from app.utils import (
+    encode_cursor,
+    get_food_ranking_page,
+    get_phase_recommendations,
+    get_top_food_by_abs_nutrient,
+    get_top_foods_by_categories,
+    validate_basis,
+)
+from scripts.populate import create_density_table, create_phase_recommendation_table
+from tests.conftest import make_densities, make_foods
+
+
+@pytest.fixture
+def food_table():
+    return pd.DataFrame([food.model_dump() for food in make_foods(120)])
+
+
+def test_density_table_converts_to_grams_per_kcal():
+    food_table = pd.DataFrame(
+        {
+            "id": [1, 2],
+            "energie_calories": [200, 0],
+            **{name: [4.0, 1.0] for name in DENSITY_COLUMNS},
+        }
+    )
+    conversions = {"fer": 0.001, "vitamine_d": 0.000001}
+    measures_table = pd.DataFrame(
+        [
+            {"name": name, "unit": "g", "conversion": conversions.get(name, 1.0)}
+            for name in NUMERIC_COLUMNS
+        ]
+    )
+
+    table = create_density_table(food_table, measures_table)
+
+    assert list(table.columns) == ["id", *DENSITY_COLUMNS]
+    assert table.loc[0, "proteines"] == pytest.approx(0.02)
+    assert table.loc[0, "fer"] == pytest.approx(0.00002)
+    assert table.loc[0, "vitamine_d"] == pytest.approx(0.00000002)
+    # No calories: no density rather than an infinite one
+    assert table.loc[1, DENSITY_COLUMNS].isna().all()
+
+
+@pytest.mark.parametrize("snapshot", [False, True])
+@pytest.mark.parametrize("nutrient", ["proteines", "zinc"])
+def test_ranking_per_kcal(sqlite_session, food_table, snapshot, nutrient):
+    if snapshot:
+        reload_snapshot(sqlite_session)
+
+    result = get_top_food_by_abs_nutrient(
+        nutrient, 0.1, sqlite_session, fields=["id", nutrient], basis="kcal"
+    )
+
+    density = food_table[nutrient] / food_table["energie_calories"]
+    expected = food_table.loc[density.sort_values(ascending=False).index, "id"]
+    assert [row["id"] for row in result] == expected[: len(result)].tolist()
+    assert len(result) == round(density.count() * 0.1)
+
+
+def test_top_foods_per_kcal_match_snapshot(sqlite_session):
+    mapping = {"Fruits": ["Fruits frais"], "Lait": ["Lait et produits laitiers"]}
+    args = (mapping, 0.3, "vitamine_c", ["nom", "vitamine_c"], "kcal")
+
+    expected = get_top_foods_by_categories(sqlite_session, *args)
+    reload_snapshot(sqlite_session)
+
+    assert get_top_foods_by_categories(sqlite_session, *args) == expected
+    assert expected != get_top_foods_by_categories(sqlite_session, *args[:4])
+
+
+@pytest.mark.parametrize("snapshot", [False, True])
+def test_pages_per_kcal(sqlite_session, snapshot):
+    expected = get_top_food_by_abs_nutrient(
+        "fer", 0.5, sqlite_session, fields=["nom", "fer"], basis="kcal"
+    )
+    if snapshot:
+        reload_snapshot(sqlite_session)
+
+    items, cursor = [], None
+    while True:
+        page = get_food_ranking_page(
+            sqlite_session, "fer", 0.5, ["nom", "fer"], 7, cursor, basis="kcal"
+        )
+        items += page["items"]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert items == expected
+
+    # A cursor only continues the ranking it was read from
+    first = get_food_ranking_page(sqlite_session, "fer", 0.5, ["nom"], 7)
+    with pytest.raises(HTTPException):
+        get_food_ranking_page(
+            sqlite_session, "fer", 0.5, ["nom"], 7, first["next_cursor"], "kcal"
+        )
+
+
+def test_snapshot_without_densities(sqlite_engine, sqlite_session):
+    with sqlite_engine.begin() as conn:
+        conn.exec_driver_sql("DROP TABLE food_density_table")
+
+    snapshot = reload_snapshot(sqlite_session)
+
+    assert len(snapshot) == 120
+    assert np.isnan(snapshot.values("fer", "kcal")).all()
+
+
+@pytest.fixture
+def materialized(sqlite_engine, food_table):
+    density_table = pd.DataFrame(
+        [density.model_dump() for density in make_densities(make_foods(120))]
+    )
+    table = create_phase_recommendation_table(food_table, density_table)
+    table.to_sql(
+        PhaseRecommendation.__tablename__,
+        con=sqlite_engine,
+        if_exists="append",
+        index=False,
+    )
+    return table
+
+
+def test_phase_table_ranks_each_basis(materialized):
+    ovulatoire = materialized[materialized["phase"] == "ovulatoire"]
+
+    assert sorted(ovulatoire["basis"].unique()) == ["100g", "kcal"]
+    assert len(ovulatoire) == 2 * 4 * 120
+
+
+@pytest.mark.parametrize("phase", ["menstruelle", "ovulatoire"])
+def test_phase_recommendations_per_kcal(sqlite_session, materialized, phase):
+    nutrients = phase_nutrients(phase)
+    fields = {nutrient: ["nom", nutrient] for nutrient in nutrients}
+
+    expected = {
+        nutrient: get_top_food_by_abs_nutrient(
+            nutrient, 0.1, sqlite_session, fields=fields[nutrient], basis="kcal"
+        )
+        for nutrient in nutrients
+    }
+    result = get_phase_recommendations(
+        sqlite_session, phase, nutrients, 0.1, fields, basis="kcal"
+    )
+
+    assert result == expected
+
+
+@pytest.mark.parametrize(
+    "basis, nutrient",
+    [("100 g", "fer"), ("kj", None), ("kcal", "energie_calories")],
+)
+def test_validate_basis_fail(basis, nutrient):
+    with pytest.raises(HTTPException) as exc_info:
+        validate_basis(basis, nutrient)
+
+    assert exc_info.value.status_code == 400
+
+
+def test_cursor_records_basis():
+    assert encode_cursor("fer", 1.0, 3, 10) != encode_cursor("fer", 1.0, 3, 10, "kcal")
@@ -0,0 +1,89 @@
+import pandas as pd
+import pytest
+from fastapi import HTTPException
+
+from app.models import PhaseRecommendation
+from app.snapshot import reload_snapshot
+from app.utils import (
+    FOOD_COLUMNS,
+    get_phase_recommendations,
+    get_top_food_by_abs_nutrient,
+    get_top_foods_by_categories,
+    parse_fields,
+)
+from scripts.populate import create_phase_recommendation_table
+from tests.conftest import make_foods
+
+
+def test_parse_fields():
+    assert parse_fields(None) is None
+    assert parse_fields("*") == FOOD_COLUMNS
+    assert parse_fields("nom, fer,nom") == ["nom", "fer"]
+
+
+@pytest.mark.parametrize("fields", ["nom,calories", "", "nom,"])
+def test_parse_fields_fail(fields):
+    with pytest.raises(HTTPException) as exc_info:
+        parse_fields(fields)
+
+    assert exc_info.value.status_code == 400
+
+
+def test_abs_nutrient_projection(sqlite_session, statements):
+    full = get_top_food_by_abs_nutrient("fer", 0.1, sqlite_session)
+    slim = get_top_food_by_abs_nutrient(
+        "fer", 0.1, sqlite_session, fields=["nom", "fer"]
+    )
+
+    assert slim == [{"nom": food.nom, "fer": food.fer} for food in full]
+    assert "food_table.fer" in statements[-1]
+    assert "food_table.zinc" not in statements[-1]
+
+    reload_snapshot(sqlite_session)
+    snapshot_slim = get_top_food_by_abs_nutrient(
+        "fer", 0.1, sqlite_session, fields=["nom", "fer"]
+    )
+    assert snapshot_slim == slim
+
+
+def test_top_foods_projection(sqlite_session):
+    mapping = {"Fruits": ["Fruits frais"], "Viande": ["Viande rouge"]}
+
+    names = get_top_foods_by_categories(sqlite_session, mapping, 0.2, "proteines")
+    rows = get_top_foods_by_categories(
+        sqlite_session, mapping, 0.2, "proteines", ["nom", "proteines"]
+    )
+
+    assert [[row["nom"] for row in group["aliments"]] for group in rows] == [
+        group["aliments"] for group in names
+    ]
+    assert all(
+        set(row) == {"nom", "proteines"} for group in rows for row in group["aliments"]
+    )
+
+    reload_snapshot(sqlite_session)
+    snapshot_rows = get_top_foods_by_categories(
+        sqlite_session, mapping, 0.2, "proteines", ["nom", "proteines"]
+    )
+    assert snapshot_rows == rows
+
+
+def test_phase_recommendations_projection(sqlite_engine, sqlite_session):
+    food_table = pd.DataFrame([food.model_dump() for food in make_foods(120)])
+    create_phase_recommendation_table(food_table).to_sql(
+        PhaseRecommendation.__tablename__,
+        con=sqlite_engine,
+        if_exists="append",
+        index=False,
+    )
+    nutrients = ["fer", "vitamine_c", "magnesium", "acide_alpha_linolenique"]
+    projections = {nutrient: ["nom", nutrient] for nutrient in nutrients}
+
+    result = get_phase_recommendations(
+        sqlite_session, "menstruelle", nutrients, 0.1, projections
+    )
+
+    for nutrient in nutrients:
+        assert result[nutrient] == get_top_food_by_abs_nutrient(
+            nutrient, 0.1, sqlite_session, fields=["nom", nutrient]
+        )
@@ -0,0 +1,167 @@
+import gzip
+
+import brotli
+import msgpack
+import pyarrow as pa
+import pytest
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+from app.db import get_session_factory
+from app.formats import (
+    ARROW,
+    JSON,
+    MSGPACK,
+    grouped_columns,
+    negotiate_encoding,
+    negotiate_media_type,
+)
+from app.main import app
+
+
+def make_request(**headers) -> Request:
+    return Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "path": "/top-foods/",
+            "query_string": b"",
+            "headers": [
+                (name.replace("_", "-").encode(), value.encode())
+                for name, value in headers.items()
+            ],
+        }
+    )
+
+
+@pytest.mark.parametrize(
+    "accept, expected",
+    [
+        (None, JSON),
+        ("*/*", JSON),
+        ("text/html,application/xhtml+xml,*/*;q=0.8", JSON),
+        ("text/csv", JSON),
+        (ARROW, ARROW),
+        (f"{JSON};q=0.5, {ARROW}", ARROW),
+        (f"{MSGPACK}, {JSON};q=0.9", MSGPACK),
+        (f"{ARROW};q=0, */*", JSON),
+        ("application/*", JSON),
+    ],
+)
+def test_negotiate_media_type(accept, expected):
+    headers = {} if accept is None else {"accept": accept}
+
+    assert negotiate_media_type(make_request(**headers)) == expected
+
+
+@pytest.mark.parametrize(
+    "accept_encoding, expected",
+    [
+        (None, None),
+        ("identity", None),
+        ("gzip, deflate", "gzip"),
+        ("gzip, deflate, br", "br"),
+        ("br;q=0.5, gzip", "gzip"),
+        ("*", "br"),
+        ("gzip;q=0", None),
+    ],
+)
+def test_negotiate_encoding(accept_encoding, expected):
+    headers = {} if accept_encoding is None else {"accept_encoding": accept_encoding}
+
+    assert negotiate_encoding(make_request(**headers)) == expected
+
+
+def test_grouped_columns():
+    groups = [
+        ("fer", [{"nom": "Boudin", "fer": 17.0}, {"nom": "Foie", "fer": 12.5}]),
+        ("zinc", [{"nom": "Huître", "zinc": 40.0}]),
+        ("selenium", None),
+    ]
+
+    assert grouped_columns("nutrient", groups) == {
+        "nutrient": ["fer", "fer", "zinc"],
+        "nom": ["Boudin", "Foie", "Huître"],
+        "fer": [17.0, 12.5, None],
+        "zinc": [None, None, 40.0],
+    }
+    assert grouped_columns("categorie", [("Fruits", ["Pomme", "Kiwi"])]) == {
+        "categorie": ["Fruits", "Fruits"],
+        "nom": ["Pomme", "Kiwi"],
+    }
+
+
+@pytest.fixture
+def client(async_session_factory):
+    app.dependency_overrides[get_session_factory] = lambda: async_session_factory
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+TOP_FOODS = "/top-foods/?nutrient=fer&percentage=0.5&fields=id,nom,fer,sodium"
+FOOD_BY_PHASE = "/food-by-phase/?phase=ovulatoire&fields=id,nom,zinc,selenium"
+
+
+def flattened(groups, key, items):
+    return [{key: group[key], **food} for group in groups for food in group[items]]
+
+
+def test_top_foods_formats(client):
+    groups = client.get(TOP_FOODS).json()
+    expected = flattened(groups, "categorie", "aliments")
+
+    response = client.get(TOP_FOODS, headers={"Accept": ARROW})
+    assert response.headers["content-type"] == ARROW
+    table = pa.ipc.open_stream(response.content).read_all()
+    assert table.schema.field("id").type == pa.int64()
+    assert table.schema.field("fer").type == pa.float64()
+    assert table.to_pylist() == expected
+
+    response = client.get(TOP_FOODS, headers={"Accept": MSGPACK})
+    assert response.headers["content-type"] == MSGPACK
+    columns = msgpack.unpackb(response.content)
+    assert list(columns) == ["categorie", "id", "nom", "fer", "sodium"]
+    assert [dict(zip(columns, row)) for row in zip(*columns.values())] == expected
+
+
+def test_food_by_phase_formats(client):
+    top_food = client.get(FOOD_BY_PHASE).json()[0]
+    expected = [
+        {"nutrient": nutrient, **food}
+        for nutrient, foods in top_food.items()
+        for food in foods
+    ]
+
+    response = client.get(FOOD_BY_PHASE, headers={"Accept": ARROW})
+    assert pa.ipc.open_stream(response.content).read_all().to_pylist() == expected
+
+    response = client.get(FOOD_BY_PHASE, headers={"Accept": MSGPACK})
+    assert msgpack.unpackb(response.content)["nutrient"] == [
+        row["nutrient"] for row in expected
+    ]
+
+
+@pytest.mark.parametrize(
+    "encoding, decompress", [("gzip", gzip.decompress), ("br", brotli.decompress)]
+)
+def test_json_compression(client, encoding, decompress):
+    expected = client.get(TOP_FOODS, headers={"Accept-Encoding": "identity"})
+    # Read the raw body, without the client decoding it
+    with client.stream(
+        "GET", TOP_FOODS, headers={"Accept-Encoding": encoding}
+    ) as response:
+        body = b"".join(response.iter_raw())
+
+    assert "content-encoding" not in expected.headers
+    assert response.headers["content-encoding"] == encoding
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert len(body) < len(expected.content)
+    assert decompress(body) == expected.content
+
+
+def test_small_json_is_not_compressed(client):
+    response = client.get(
+        "/top-foods/?nutrient=fer&percentage=0.01", headers={"Accept-Encoding": "br"}
+    )
+
+    assert "content-encoding" not in response.headers
@@ -0,0 +1,114 @@
+import asyncio
+import time
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app import season
+from app.db import get_session_factory
+from app.health import FAILED, READY, WarmUp
+from app.main import app
+from app.snapshot import get_snapshot
+
+SEASON_FIXTURE = Path(__file__).parent / "fixtures" / "season_calendar.html"
+
+
+@pytest.fixture(autouse=True)
+def season_calendar(tmp_path, monkeypatch):
+    async def fetch():
+        return SEASON_FIXTURE.read_text(encoding="utf-8")
+
+    calendar = season.SeasonCalendar(tmp_path / "season.json", fetch=fetch)
+    monkeypatch.setattr(season, "_calendar", calendar)
+
+
+def make_client(session_factory):
+    app.dependency_overrides[get_session_factory] = lambda: session_factory
+    return TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def no_overrides():
+    yield
+    app.dependency_overrides.clear()
+
+
+def wait_status(client, status, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        response = client.get("/health/ready")
+        if response.json()["status"] == status or time.monotonic() > deadline:
+            return response
+        time.sleep(0.01)
+
+
+def test_ready_after_warm_up(async_session_factory):
+    with make_client(async_session_factory) as client:
+        assert client.get("/health/live").status_code == 200
+
+        response = wait_status(client, READY)
+
+        assert response.status_code == 200
+        assert response.json()["status"] == READY
+        assert get_snapshot() is not None
+
+
+def test_not_ready_when_warm_up_fails(tmp_path):
+    # The database file cannot be created: connecting fails
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/missing/foods.db")
+    session_factory = async_sessionmaker(engine)
+
+    with make_client(session_factory) as client:
+        response = wait_status(client, FAILED)
+
+        assert response.status_code == 503
+        assert response.json()["error"]
+        assert client.get("/health/live").status_code == 200
+
+
+def test_season_does_not_open_a_session(async_session_factory):
+    calls = []
+
+    def session_factory():
+        calls.append(1)
+        return async_session_factory
+
+    app.dependency_overrides[get_session_factory] = session_factory
+    with TestClient(app) as client:
+        wait_status(client, READY)
+        calls.clear()
+
+        response = client.get("/by-season/?month=1")
+
+    assert response.status_code == 200
+    assert response.json()[0]["legumes"]
+    assert calls == []
+
+
+def test_warm_up_states():
+    attempts = []
+
+    async def steps():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise OSError("database not up yet")
+
+    async def run():
+        warmup = WarmUp(steps)
+        warmup.start()
+        await warmup.wait()
+        failed = warmup.report()
+
+        warmup.start()
+        await warmup.wait()
+        return failed, warmup.report()
+
+    failed, ready = asyncio.run(run())
+
+    assert failed["status"] == FAILED
+    assert failed["error"] == "database not up yet"
+    assert ready["status"] == READY
+    assert ready["error"] is None
+    assert len(attempts) == 2
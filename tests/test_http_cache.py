@@ -0,0 +1,178 @@
+import asyncio
+import time
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from starlette.requests import Request
+
+import app.main
+import app.season
+from app.dataset import clear_dataset_version
+from app.db import get_session_factory
+from app.http_cache import cache_headers, etag_matches, make_etag
+from app.models import DatasetVersion
+from app.season import SeasonCalendar
+
+
+def make_request(path: str, query: str = "") -> Request:
+    return Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "path": path,
+            "query_string": query.encode(),
+            "headers": [],
+        }
+    )
+
+
+def test_make_etag_normalizes_query():
+    first = make_etag("v1", make_request("/top-foods/", "nutrient=fer&percentage=0.1"))
+    second = make_etag("v1", make_request("/top-foods/", "percentage=0.1&nutrient=fer"))
+
+    assert first == second
+    assert first.startswith('"') and first.endswith('"')
+
+
+@pytest.mark.parametrize(
+    "version, path, query",
+    [
+        ("v2", "/top-foods/", "nutrient=fer&percentage=0.1"),
+        ("v1", "/food-by-phase/", "nutrient=fer&percentage=0.1"),
+        ("v1", "/top-foods/", "nutrient=zinc&percentage=0.1"),
+    ],
+)
+def test_make_etag_changes(version, path, query):
+    etag = make_etag("v1", make_request("/top-foods/", "nutrient=fer&percentage=0.1"))
+
+    assert make_etag(version, make_request(path, query)) != etag
+
+
+def test_make_etag_changes_with_variant():
+    request = make_request("/top-foods/", "nutrient=fer")
+    json = make_etag("v1", request, "application/json;gzip")
+
+    assert make_etag("v1", request, "application/msgpack;None") != json
+    assert make_etag("v1", request, "application/json;br") != json
+
+
+@pytest.mark.parametrize(
+    "if_none_match, expected",
+    [
+        (None, False),
+        ('"abc"', True),
+        ('W/"abc"', True),
+        ('"other", "abc"', True),
+        ("*", True),
+        ('"other"', False),
+    ],
+)
+def test_etag_matches(if_none_match, expected):
+    assert etag_matches(if_none_match, '"abc"') == expected
+
+
+def test_cache_headers():
+    headers = cache_headers('"abc"')
+
+    assert headers["ETag"] == '"abc"'
+    assert headers["Cache-Control"].startswith("public, max-age=")
+
+
+@pytest.fixture
+def client(async_session_factory):
+    app.main.app.dependency_overrides[get_session_factory] = (
+        lambda: async_session_factory
+    )
+    yield TestClient(app.main.app)
+    app.main.app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def emitted(async_session_factory):
+    """SQL statements sent by the API while the test runs."""
+    engine = async_session_factory.kw["bind"].sync_engine
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    yield statements
+    event.remove(engine, "before_cursor_execute", record)
+
+
+def load_version(session_factory, version: str) -> None:
+    """A load by `scripts/populate.py`, seen once the cached version expires."""
+
+    async def add():
+        async with session_factory() as session:
+            session.add(DatasetVersion(version=version, loaded_at=datetime.now()))
+            await session.commit()
+
+    asyncio.run(add())
+    clear_dataset_version()
+
+
+URL = "/food-by-nutrient/?nutrient=fer&limit=5"
+
+
+def test_matching_etag_answered_without_endpoint_nor_database(
+    client, async_session_factory, emitted, monkeypatch
+):
+    load_version(async_session_factory, "v1")
+    response = client.get(URL)
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert response.headers["cache-control"].startswith("public, max-age=")
+
+    def not_called(*args, **kwargs):
+        raise AssertionError("the endpoint should not run")
+
+    monkeypatch.setattr(app.main, "get_food_ranking_page", not_called)
+    emitted.clear()
+    not_modified = client.get(URL, headers={"If-None-Match": etag})
+
+    assert not_modified.status_code == 304
+    assert not_modified.headers["etag"] == etag
+    assert not_modified.content == b""
+    assert emitted == []
+
+
+def test_new_dataset_version_changes_etag(client, async_session_factory):
+    load_version(async_session_factory, "v1")
+    etag = client.get(URL).headers["etag"]
+
+    load_version(async_session_factory, "v2")
+    response = client.get(URL, headers={"If-None-Match": etag})
+
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+def test_errors_are_not_cached(client, async_session_factory):
+    load_version(async_session_factory, "v1")
+    response = client.get("/food-by-nutrient/?nutrient=inconnu")
+
+    assert response.status_code == 400
+    assert "etag" not in response.headers
+    assert "cache-control" not in response.headers
+
+
+def test_season_etag_follows_calendar_version(client, tmp_path, monkeypatch):
+    calendar = SeasonCalendar(tmp_path / "season.json", ttl=3600)
+    calendar._table, calendar._fetched_at = {1: {"fruits": ["Kiwi"]}}, time.time()
+    monkeypatch.setattr(app.season, "_calendar", calendar)
+
+    response = client.get("/by-season/?month=1")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    not_modified = client.get("/by-season/?month=1", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+
+    # A new calendar is fetched
+    calendar._fetched_at += 10
+    response = client.get("/by-season/?month=1", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
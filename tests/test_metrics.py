@@ -0,0 +1,111 @@
+import contextvars
+import logging
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+from sqlmodel import select
+
+from app.log import JsonFormatter
+from app.main import app
+from app.metrics import (
+    current_request_stats,
+    instrument_engine,
+    observe_request,
+    start_request_stats,
+)
+from app.models import Food
+from app.utils import get_top_food_by_abs_nutrient
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def in_request(fn):
+    """Run `fn` with its own request statistics, as the middleware does."""
+
+    def run():
+        stats = start_request_stats()
+        fn()
+        return stats
+
+    return contextvars.copy_context().run(run)
+
+
+def test_request_stats_count_statements_and_rows(
+    sqlite_engine, sqlite_session, statements
+):
+    instrument_engine(sqlite_engine)
+    result = []
+
+    def queries():
+        result.extend(sqlite_session.exec(select(Food).where(Food.id <= 10)).all())
+        result.extend(
+            get_top_food_by_abs_nutrient("fer", 0.1, sqlite_session, fields=["nom"])
+        )
+
+    stats = in_request(queries)
+
+    assert stats.statements == len(statements)
+    assert stats.rows >= len(result) == 10 + 12
+    assert stats.db_time > 0
+
+
+def test_no_stats_outside_requests(sqlite_engine, sqlite_session):
+    instrument_engine(sqlite_engine)
+
+    def query():
+        foods = sqlite_session.exec(select(Food).where(Food.id <= 3)).all()
+        assert len(foods) == 3
+        return current_request_stats()
+
+    assert contextvars.copy_context().run(query) is None
+
+
+def test_slow_request_is_logged(caplog, monkeypatch):
+    # Once the app is imported, its logs only go to its own stdout handler
+    monkeypatch.setattr(logging.getLogger("app"), "propagate", True)
+    stats = in_request(lambda: None)
+    stats.statements, stats.rows = 4, 30
+
+    with caplog.at_level(logging.WARNING, logger="app"):
+        observe_request("/food-by-phase/", "GET", 200, 60.0, stats)
+
+    record = caplog.records[-1]
+    assert record.message == "Slow request"
+    assert record.fields["route"] == "/food-by-phase/"
+    assert record.fields["db_statements"] == 4
+    assert record.fields["db_rows"] == 30
+
+
+def test_json_formatter_includes_fields():
+    record = logging.LogRecord(
+        "app", logging.INFO, __file__, 1, "Hello %s", ("you",), None
+    )
+    record.fields = {"route": "/top-foods/"}
+
+    line = JsonFormatter().format(record)
+
+    assert '"message": "Hello you"' in line
+    assert '"route": "/top-foods/"' in line
+
+
+def test_metrics_aggregate_workers(tmp_path, monkeypatch):
+    # Each worker process writes its samples to the shared directory
+    worker = (
+        "from app.metrics import observe_request, start_request_stats;"
+        "observe_request('/top-foods/', 'GET', 200, 0.01, start_request_stats())"
+    )
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path)}
+    for _ in range(2):
+        subprocess.run([sys.executable, "-c", worker], env=env, cwd=ROOT, check=True)
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+
+    response = TestClient(app).get("/metrics")
+
+    assert response.status_code == 200
+    assert (
+        'api_requests_total{method="GET",route="/top-foods/",status="200"} 2.0'
+        in response.text
+    )
@@ -0,0 +1,104 @@
+import asyncio
+
+import orjson
+import pytest
+from fastapi import HTTPException
+
+from app.snapshot import reload_snapshot
+from app.utils import (
+    encode_cursor,
+    get_food_ranking_page,
+    get_top_food_by_abs_nutrient,
+    stream_food_ranking,
+)
+
+
+def all_pages(session, nutrient, percentage, fields, limit):
+    pages, cursor = [], None
+    while True:
+        page = get_food_ranking_page(
+            session, nutrient, percentage, fields, limit, cursor
+        )
+        pages.append(page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+@pytest.mark.parametrize("snapshot", [False, True])
+@pytest.mark.parametrize("nutrient", ["fer", "zinc", "energie_calories"])
+@pytest.mark.parametrize("percentage", [0.05, 0.5, 1.0])
+def test_pages_match_ranking(sqlite_session, snapshot, nutrient, percentage):
+    fields = ["nom", nutrient]
+    expected = get_top_food_by_abs_nutrient(
+        nutrient, percentage, sqlite_session, fields=fields
+    )
+    if snapshot:
+        reload_snapshot(sqlite_session)
+
+    pages = all_pages(sqlite_session, nutrient, percentage, fields, limit=7)
+
+    assert [item for page in pages for item in page] == expected
+    assert all(len(page) == 7 for page in pages[:-1])
+    assert pages[-1]
+
+
+def test_page_statements(sqlite_session, statements):
+    first = get_food_ranking_page(sqlite_session, "fer", 1.0, ["nom"], 10)
+    statements.clear()
+
+    get_food_ranking_page(sqlite_session, "fer", 1.0, ["nom"], 10, first["next_cursor"])
+
+    # A count, then a read starting after the previous page's last food
+    assert len(statements) == 2
+    assert "fer < ?" in statements[1]
+
+
+@pytest.mark.parametrize(
+    "cursor", ["not a cursor", encode_cursor("proteines", 1.5, 3, 10)]
+)
+def test_invalid_cursor(sqlite_session, cursor):
+    with pytest.raises(HTTPException) as exc_info:
+        get_food_ranking_page(sqlite_session, "fer", 0.5, ["nom"], 10, cursor)
+
+    assert exc_info.value.status_code == 400
+
+
+@pytest.mark.parametrize("snapshot", [False, True])
+def test_stream_matches_ranking(
+    sqlite_session, async_session_factory, monkeypatch, snapshot
+):
+    monkeypatch.setattr("app.utils.STREAM_CHUNK_SIZE", 16)
+    fields = ["id", "nom", "fer"]
+    expected = get_top_food_by_abs_nutrient("fer", 0.9, sqlite_session, fields=fields)
+    if snapshot:
+        reload_snapshot(sqlite_session)
+
+    async def collect():
+        chunks = await stream_food_ranking(async_session_factory, "fer", 0.9, fields)
+        return [chunk async for chunk in chunks]
+
+    chunks = asyncio.run(collect())
+
+    assert len(chunks) == -(-len(expected) // 16)
+    lines = b"".join(chunks).splitlines()
+    assert [orjson.loads(line) for line in lines] == expected
+
+
+def test_stream_holds_no_connection_between_chunks(async_session_factory, monkeypatch):
+    monkeypatch.setattr("app.utils.STREAM_CHUNK_SIZE", 16)
+    pool = async_session_factory.kw["bind"].pool
+
+    async def collect():
+        chunks = await stream_food_ranking(async_session_factory, "fer", 0.9, ["nom"])
+        checked_out = [pool.checkedout()]
+        lines = []
+        async for chunk in chunks:
+            lines.extend(chunk.splitlines())
+            checked_out.append(pool.checkedout())
+        return lines, checked_out
+
+    lines, checked_out = asyncio.run(collect())
+
+    assert len(lines) > 16
+    assert set(checked_out) == {0}
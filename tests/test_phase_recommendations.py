@@ -0,0 +1,78 @@
+import pandas as pd
+import pytest
+
+from app.models import PhaseRecommendation
+from app.phases import phase_nutrients
+from app.utils import get_phase_recommendations, get_top_food_by_abs_nutrient
+from scripts.populate import create_phase_recommendation_table
+from tests.conftest import make_foods
+
+
+@pytest.fixture
+def food_table():
+    return pd.DataFrame([food.model_dump() for food in make_foods(120)])
+
+
+def test_phase_table_ranks_each_nutrient_once(food_table):
+    table = create_phase_recommendation_table(food_table)
+
+    ovulatoire = table[table["phase"] == "ovulatoire"]
+    assert sorted(ovulatoire["nutrient"].unique()) == [
+        "fibres_alimentaires",
+        "selenium",
+        "vitamine_c",
+        "zinc",
+    ]
+    assert len(ovulatoire) == 4 * len(food_table)
+    assert "*" not in set(table["nutrient"])
+
+    zinc = ovulatoire[ovulatoire["nutrient"] == "zinc"]
+    assert list(zinc["food_rank"]) == list(range(1, len(food_table) + 1))
+    assert zinc["total_count"].iloc[0] == food_table["zinc"].count()
+    best = food_table.loc[food_table["zinc"].idxmax(), "id"]
+    assert zinc["food_id"].iloc[0] == best
+
+
+@pytest.fixture
+def materialized(sqlite_engine, food_table):
+    table = create_phase_recommendation_table(food_table)
+    table.to_sql(
+        PhaseRecommendation.__tablename__,
+        con=sqlite_engine,
+        if_exists="append",
+        index=False,
+    )
+
+
+@pytest.mark.parametrize("phase", ["menstruelle", "folliculaire", "ovulatoire"])
+@pytest.mark.parametrize("percentage", [0.05, 0.5])
+def test_phase_recommendations_match_live_ranking(
+    sqlite_session, materialized, phase, percentage
+):
+    nutrients = phase_nutrients(phase)
+
+    expected = {
+        nutrient: get_top_food_by_abs_nutrient(nutrient, percentage, sqlite_session)
+        for nutrient in nutrients
+    }
+    result = get_phase_recommendations(sqlite_session, phase, nutrients, percentage)
+
+    assert result == expected
+
+
+def test_phase_recommendations_single_statement(
+    sqlite_session, materialized, statements
+):
+    get_phase_recommendations(
+        sqlite_session, "ovulatoire", phase_nutrients("ovulatoire"), 0.1
+    )
+
+    assert len(statements) == 1
+
+
+def test_phase_recommendations_not_built(sqlite_session):
+    nutrients = phase_nutrients("menstruelle")
+
+    assert (
+        get_phase_recommendations(sqlite_session, "menstruelle", nutrients, 0.1) is None
+    )
@@ -0,0 +1,260 @@
+import openpyxl
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session
+
+from app.dataset import read_dataset_version
+from app.phases import phase_nutrients
+from app.utils import get_phase_recommendations
+from scripts import populate
+from scripts.query_plans import is_full_scan, query_plans
+from scripts.populate import (
+    DATA_PATH,
+    FOOD_HASH_TABLE,
+    FOOD_TABLE,
+    NUMERIC_COLUMNS,
+    QUALIFIER_BELOW_LIMIT,
+    QUALIFIER_NOT_INVESTIGATED,
+    QUALIFIER_TRACE,
+    clean_data,
+    create_food_table,
+    create_measures_table,
+    create_qualifier_table,
+    load_tables,
+    parse_numeric_columns,
+    prepare_tables,
+    ranked_nutrients,
+    read_workbook,
+    swap_tables,
+    upsert_food_table,
+    write_staging_table,
+)
+from tests.conftest import make_foods
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    ).execution_options(schema_translate_map={"dbo": None})
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def food_table():
+    return pd.DataFrame([food.model_dump() for food in make_foods(120)])
+
+
+@pytest.fixture
+def measures_table():
+    return pd.DataFrame(
+        [{"name": name, "unit": "mg", "conversion": 0.001} for name in NUMERIC_COLUMNS]
+    )
+
+
+def read_foods(engine):
+    return pd.read_sql(f"SELECT * FROM {FOOD_TABLE} ORDER BY id", engine)
+
+
+def test_load_tables_replace(engine, food_table, measures_table):
+    load_tables(food_table, measures_table, engine)
+    version = load_tables(food_table, measures_table, engine)
+
+    tables = set(inspect(engine).get_table_names())
+    assert not {name for name in tables if name.endswith(("_staging", "_old"))}
+    assert len(read_foods(engine)) == len(food_table)
+
+    with Session(engine) as session:
+        assert read_dataset_version(session) == version
+        nutrients = phase_nutrients("ovulatoire")
+        assert get_phase_recommendations(session, "ovulatoire", nutrients, 0.1)
+
+
+def test_load_tables_creates_keys_and_indexes(engine, food_table, measures_table):
+    load_tables(food_table, measures_table, engine)
+    load_tables(food_table, measures_table, engine)
+
+    tables = inspect(engine)
+    assert tables.get_pk_constraint(FOOD_TABLE)["constrained_columns"] == ["id"]
+    indexes = {index["name"] for index in tables.get_indexes(FOOD_TABLE)}
+    assert indexes == {"ix_food_table_categorie"} | {
+        f"ix_food_table_{name}" for name in ranked_nutrients()
+    }
+
+    density = "food_density_table"
+    assert tables.get_pk_constraint(density)["constrained_columns"] == ["id"]
+    assert {index["name"] for index in tables.get_indexes(density)} == {
+        f"ix_{density}_{name}" for name in ranked_nutrients()
+    }
+
+
+def test_endpoint_query_plans_use_indexes(engine, food_table, measures_table):
+    load_tables(food_table, measures_table, engine)
+
+    plans = query_plans(engine)
+
+    steps = {
+        endpoint: [step for _, plan in statements for step in plan]
+        for endpoint, statements in plans.items()
+    }
+    for endpoint in (
+        "/food-by-phase/?phase=ovulatoire",
+        "/food-by-phase/?phase=ovulatoire (live ranking)",
+        "/food-by-phase/?phase=ovulatoire&basis=kcal (live ranking)",
+    ):
+        assert steps[endpoint]
+        assert not [step for step in steps[endpoint] if is_full_scan("sqlite", step)]
+
+    # The window functions sort each category, but food_table is not scanned
+    assert "USING INDEX ix_food_table_categorie" in " ".join(
+        steps["/top-foods/?nutrient=fer"]
+    )
+    assert not [
+        step
+        for step in steps["/top-foods/?nutrient=fer"]
+        if is_full_scan("sqlite", step) and "food_table" in step
+    ]
+
+
+def test_incremental_load_writes_changed_rows(engine, food_table, measures_table):
+    load_tables(food_table, measures_table, engine)
+
+    updated = food_table[food_table["id"] != 5].copy()
+    updated.loc[updated["id"].isin([1, 2]), "fer"] = 99.0
+    added = food_table[food_table["id"] == 3].assign(id=500, nom="Nouvel aliment")
+    updated = pd.concat([updated, added], ignore_index=True)
+
+    # Changed: foods 1 and 2, removed: 5, added: 500
+    assert upsert_food_table(updated, engine) == 4
+
+    expected = updated.sort_values("id", ignore_index=True)
+    pd.testing.assert_frame_equal(read_foods(engine), expected, check_dtype=False)
+    assert upsert_food_table(updated, engine) == 0
+
+
+def test_incremental_load_keeps_version_in_sync(engine, food_table, measures_table):
+    full = load_tables(food_table, measures_table, engine)
+    incremental = load_tables(food_table, measures_table, engine, mode="incremental")
+
+    assert incremental == full
+    assert len(read_foods(engine)) == len(food_table)
+
+
+def test_incremental_load_rolled_back_with_swap(
+    engine, food_table, measures_table, monkeypatch
+):
+    version = load_tables(food_table, measures_table, engine)
+    updated = food_table.copy()
+    updated.loc[updated["id"] == 1, "fer"] = 99.0
+
+    def failed_swap(*args, **kwargs):
+        raise RuntimeError("swap failed")
+
+    monkeypatch.setattr(populate, "swap_staged_tables", failed_swap)
+    with pytest.raises(RuntimeError):
+        load_tables(updated, measures_table, engine, mode="incremental")
+
+    # Foods, hashes and version still all describe the previous load
+    pd.testing.assert_frame_equal(read_foods(engine), food_table, check_dtype=False)
+    assert upsert_food_table(food_table, engine) == 0
+    with Session(engine) as session:
+        assert read_dataset_version(session) == version
+
+
+def test_incremental_load_without_previous_load(engine, food_table, measures_table):
+    assert upsert_food_table(food_table, engine) is None
+
+    load_tables(food_table, measures_table, engine, mode="incremental")
+
+    assert inspect(engine).has_table(FOOD_HASH_TABLE)
+    assert len(read_foods(engine)) == len(food_table)
+
+
+def test_failed_swap_keeps_previous_tables(engine, food_table, measures_table):
+    load_tables(food_table, measures_table, engine)
+
+    write_staging_table(measures_table, "measure_table", engine)
+    with pytest.raises(SQLAlchemyError):
+        # food_table has no staging copy, the whole swap is rolled back
+        swap_tables(engine, ["measure_table", FOOD_TABLE])
+
+    assert inspect(engine).has_table("measure_table")
+    assert len(read_foods(engine)) == len(food_table)
+
+
+def test_prepare_tables_cached_by_workbook(tmp_path, monkeypatch):
+    raw = pd.read_excel(DATA_PATH, engine="openpyxl", skiprows=2)
+    data = clean_data(raw)
+    measures_table = create_measures_table(data)
+    food_table, qualifier_table = create_food_table(data)
+    expected = (food_table, measures_table, qualifier_table)
+
+    # Left by an older workbook
+    stale = tmp_path / "food_table-0000-0000.parquet"
+    stale.touch()
+    for table, expected_table in zip(prepare_tables(cache_dir=tmp_path), expected):
+        pd.testing.assert_frame_equal(table, expected_table)
+    assert not stale.exists()
+    assert len(list(tmp_path.iterdir())) == 3
+
+    def no_parsing(path):
+        raise AssertionError("the workbook should not be parsed again")
+
+    monkeypatch.setattr(populate, "read_workbook", no_parsing)
+    for table, expected_table in zip(prepare_tables(cache_dir=tmp_path), expected):
+        pd.testing.assert_frame_equal(table, expected_table)
+
+
+def test_read_workbook_names_columns_like_pandas(tmp_path):
+    path = tmp_path / "workbook.xlsx"
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(["Titre"])
+    sheet.append([])
+    sheet.append(["nom", "Source", "Source", None, "Source.1", "Source"])
+    sheet.append(["Pomme", "a", "b", 1.5, "c", None])
+    workbook.save(path)
+
+    expected = pd.read_excel(path, skiprows=2)
+
+    pd.testing.assert_frame_equal(read_workbook(path), expected)
+
+
+def test_parse_numeric_columns():
+    raw = pd.DataFrame({name: [1, 2.5, None] for name in NUMERIC_COLUMNS})
+    raw["fer"] = ["tr.", "<0.5", 3]
+    raw["zinc"] = ["n.i.", " 4 ", ""]
+
+    values, qualifiers = parse_numeric_columns(raw)
+
+    fer, zinc = NUMERIC_COLUMNS.index("fer"), NUMERIC_COLUMNS.index("zinc")
+    assert values[:, 0].tolist() == [1, 2.5, 0]
+    assert values[:, fer].tolist() == [0, 0.5, 3]
+    assert values[:, zinc].tolist() == [0, 4, 0]
+    assert qualifiers[:, fer].tolist() == [QUALIFIER_TRACE, QUALIFIER_BELOW_LIMIT, 0]
+    assert qualifiers[:, zinc].tolist() == [QUALIFIER_NOT_INVESTIGATED, 0, 0]
+    assert qualifiers.sum() == (
+        QUALIFIER_TRACE + QUALIFIER_BELOW_LIMIT + QUALIFIER_NOT_INVESTIGATED
+    )
+
+    table = create_qualifier_table([10, 11, 12], qualifiers)
+    assert table.values.tolist() == [
+        [10, "fer", QUALIFIER_TRACE],
+        [10, "zinc", QUALIFIER_NOT_INVESTIGATED],
+        [11, "fer", QUALIFIER_BELOW_LIMIT],
+    ]
+
+
+@pytest.mark.parametrize("value", ["abc", "<", "<x"])
+def test_parse_numeric_columns_unexpected_values(value):
+    raw = pd.DataFrame({name: [1.0] for name in NUMERIC_COLUMNS})
+    raw["fer"] = [value]
+
+    with pytest.raises(ValueError, match="Unexpected values"):
+        parse_numeric_columns(raw)
@@ -0,0 +1,194 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main
+from app.db import get_session_factory
+from app.metrics import RESULT_CACHE
+from app.result_cache import (
+    COALESCED,
+    HIT,
+    MISS,
+    ResultCache,
+    normalize_percentage,
+)
+
+
+def counts(route):
+    return {
+        outcome: RESULT_CACHE.labels(route, outcome)._value.get()
+        for outcome in (HIT, MISS, COALESCED)
+    }
+
+
+class Computation:
+    """Counts its calls, and returns once `release` is set."""
+
+    def __init__(self):
+        self.calls = 0
+        self.release = None
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        return {"call": self.calls}
+
+
+def test_identical_requests_share_one_computation():
+    compute = Computation()
+    cache = ResultCache("test-coalesce", max_bytes=1000, ttl=60)
+    before = counts("test-coalesce")
+
+    async def run():
+        compute.release = asyncio.Event()
+        waiting = [asyncio.create_task(cache.get("key", compute)) for _ in range(5)]
+        await asyncio.sleep(0)
+        compute.release.set()
+        results = await asyncio.gather(*waiting)
+        return results, await cache.get("key", compute)
+
+    results, cached = asyncio.run(run())
+
+    assert compute.calls == 1
+    assert results == [{"call": 1}] * 5
+    assert cached is results[0]
+    after = counts("test-coalesce")
+    assert after[MISS] - before[MISS] == 1
+    assert after[COALESCED] - before[COALESCED] == 4
+    assert after[HIT] - before[HIT] == 1
+
+
+def test_cancelled_request_does_not_cancel_the_others():
+    compute = Computation()
+    cache = ResultCache("test-cancel", max_bytes=1000, ttl=60)
+
+    async def run():
+        compute.release = asyncio.Event()
+        first = asyncio.create_task(cache.get("key", compute))
+        second = asyncio.create_task(cache.get("key", compute))
+        await asyncio.sleep(0)
+        first.cancel()
+        compute.release.set()
+        return await second
+
+    assert asyncio.run(run()) == {"call": 1}
+
+
+def test_failures_are_shared_but_not_cached():
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0)
+        raise ValueError("database down")
+
+    cache = ResultCache("test-failure", max_bytes=1000, ttl=60)
+
+    async def run():
+        return await asyncio.gather(
+            cache.get("key", compute), cache.get("key", compute), return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+
+    assert [str(result) for result in results] == ["database down"] * 2
+    assert len(cache) == 0
+    with pytest.raises(ValueError):
+        asyncio.run(cache.get("key", compute))
+    assert len(calls) == 2
+
+
+def test_least_recently_used_and_expired_results_are_evicted(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("app.result_cache.time.monotonic", lambda: now[0])
+    # Results of 10 bytes as JSON, two fit
+    cache = ResultCache("test-evict", max_bytes=25, ttl=10)
+
+    def get(key):
+        async def compute():
+            return f"{key} at {now[0]}"
+
+        return asyncio.run(cache.get(key, compute))
+
+    get("a"), get("b")
+    get("a")  # "b" is now the least recently used
+    get("c")
+    now[0] = 5.0
+    assert get("a") == "a at 0.0"
+    assert get("b") == "b at 5.0"
+
+    now[0] = 12.0
+    assert get("b") == "b at 5.0"
+    assert get("a") == "a at 12.0"
+    assert cache.size == 21
+
+
+def test_large_results_are_not_kept():
+    cache = ResultCache("test-large", max_bytes=1000, ttl=60, max_result=100)
+
+    async def compute():
+        return [{"nom": "x" * 20}] * 10
+
+    asyncio.run(cache.get("large", compute))
+    asyncio.run(cache.get("small", lambda: asyncio.sleep(0, result="small")))
+
+    assert len(cache) == 1
+    assert cache.size == len('"small"')
+
+
+def test_percentages_are_rounded():
+    assert normalize_percentage(0.123456) == normalize_percentage(0.12346) == 0.1235
+    assert normalize_percentage(1e-9) == 0.0001
+    assert normalize_percentage(0.0) == 0.0
+
+
+@pytest.fixture
+def client(async_session_factory, monkeypatch):
+    version = ["v1"]
+
+    async def current_dataset_version(session_factory):
+        return version[0]
+
+    monkeypatch.setattr(app.main, "current_dataset_version", current_dataset_version)
+    app.main.app.dependency_overrides[get_session_factory] = (
+        lambda: async_session_factory
+    )
+    yield TestClient(app.main.app), version
+    app.main.app.dependency_overrides.clear()
+
+
+@pytest.mark.parametrize(
+    "route, function, params",
+    [
+        ("/top-foods/", "get_top_foods_by_categories", "nutrient=fer&percentage=0.1"),
+        ("/food-by-phase/", "get_top_food_by_abs_nutrient", "phase=ovulatoire"),
+    ],
+)
+def test_routes_compute_once_per_dataset_version(
+    client, monkeypatch, route, function, params
+):
+    client, version = client
+    calls = []
+    computed = getattr(app.main, function)
+
+    def counted(*args, **kwargs):
+        calls.append(1)
+        return computed(*args, **kwargs)
+
+    monkeypatch.setattr(app.main, function, counted)
+
+    first = client.get(f"{route}?{params}")
+    assert first.status_code == 200
+    computations = len(calls)
+    assert computations > 0
+
+    assert client.get(f"{route}?{params}").json() == first.json()
+    assert len(calls) == computations
+
+    client.get(f"{route}?{params}&fields=nom")
+    assert len(calls) == 2 * computations
+
+    version[0] = "v2"
+    assert client.get(f"{route}?{params}").json() == first.json()
+    assert len(calls) == 3 * computations
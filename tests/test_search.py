@@ -0,0 +1,109 @@
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from app.dataset import clear_dataset_version
+from app.models import DatasetVersion, Food
+from app.search import SearchIndex, get_search_index, trigrams
+from app.utils import MAX_SEARCH_LIMIT, validate_search
+
+FOODS = [
+    (1, "Pomme, crue", "nan", "Fruits crus"),
+    (2, "Pomme de terre, cuite", "patate", "Légumes cuits"),
+    (3, "Chou-pomme, cru", "nan", "Légumes crus"),
+    (4, "Épinard, cuit", "nan", "Légumes cuits"),
+    (5, "Œuf, dur", "nan", "Œufs"),
+    (6, "Banane, crue", "nan", "Fruits crus"),
+]
+
+
+@pytest.fixture
+def index():
+    return SearchIndex(FOODS, version="v1")
+
+
+def names(results):
+    return [result["nom"] for result in results]
+
+
+def test_trigrams():
+    assert trigrams("lait") == ["  l", " la", "lai", "ait", "it "]
+    assert trigrams("lait", prefix=True) == ["  l", " la", "lai", "ait"]
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ("epinard", "Épinard, cuit"),
+        ("ÉPINARDS", "Épinard, cuit"),
+        ("oeuf", "Œuf, dur"),
+        ("banan", "Banane, crue"),
+        ("ban", "Banane, crue"),
+        ("bananne", "Banane, crue"),
+        ("epinrad", "Épinard, cuit"),
+        ("patate", "Pomme de terre, cuite"),
+        ("pomme terre", "Pomme de terre, cuite"),
+    ],
+)
+def test_search_best_match(index, query, expected):
+    assert names(index.search(query))[0] == expected
+
+
+def test_search_ranks_names_starting_with_query_first(index):
+    results = index.search("pomme")
+
+    assert names(results) == ["Pomme, crue", "Pomme de terre, cuite", "Chou-pomme, cru"]
+    assert results[0] == {
+        "id": 1,
+        "nom": "Pomme, crue",
+        "categorie": "Fruits crus",
+        "score": 1.0,
+    }
+
+
+def test_search_synonym_scores_below_name(index):
+    potato = index.search("patate")[0]
+    apple = index.search("pomme")[0]
+
+    assert potato["score"] < apple["score"]
+
+
+def test_search_limit_and_no_match(index):
+    assert len(index.search("pomme", limit=2)) == 2
+    assert index.search("xyzzy") == []
+    assert index.search("  ") == []
+
+
+@pytest.mark.parametrize(
+    "query, limit", [("", 10), ("  ", 10), ("lait", 0), ("lait", MAX_SEARCH_LIMIT + 1)]
+)
+def test_validate_search(query, limit):
+    with pytest.raises(HTTPException) as exc_info:
+        validate_search(query, limit)
+    assert exc_info.value.status_code == 400
+
+
+def test_search_index_rebuilt_on_dataset_version(sqlite_session, statements):
+    index = get_search_index(sqlite_session)
+    assert index.version is None
+    assert len(index) == 120
+    assert names(index.search("Aliment 7", limit=1)) == ["Aliment 7"]
+
+    emitted = len(statements)
+    assert get_search_index(sqlite_session) is index
+    assert len(statements) == emitted
+
+    sqlite_session.add(
+        Food(nom="Saumon", synonymes="", categorie="Poissons", unite_de_matrice="g")
+    )
+    sqlite_session.add(DatasetVersion(version="abc123", loaded_at=datetime.now()))
+    sqlite_session.commit()
+
+    assert get_search_index(sqlite_session) is index
+
+    clear_dataset_version()
+    index = get_search_index(sqlite_session)
+
+    assert index.version == "abc123"
+    assert names(index.search("saumon")) == ["Saumon"]
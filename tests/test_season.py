@@ -0,0 +1,139 @@
+import asyncio
+import json
+from pathlib import Path
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.season import SeasonCalendar, parse_calendar
+
+FIXTURE = Path(__file__).parent / "fixtures" / "season_calendar.html"
+
+
+class FakeFetch:
+    def __init__(self, html: str):
+        self.html = html
+        self.calls = 0
+        self.fail = False
+
+    async def __call__(self) -> str:
+        self.calls += 1
+        if self.fail:
+            raise httpx.ConnectError("offline")
+        return self.html
+
+
+@pytest.fixture
+def fetch():
+    return FakeFetch(FIXTURE.read_text(encoding="utf-8"))
+
+
+def test_parse_calendar(fetch):
+    table = parse_calendar(fetch.html)
+
+    assert sorted(table) == list(range(1, 13))
+    assert table[1] == {
+        "legumes": ["Betterave", "Carotte", "Chou de Bruxelles", "Poireau"],
+        "fruits": ["Citron", "Clémentine", "Kiwi"],
+    }
+    assert table[8] == {"fruits": ["Melon"]}
+    assert table[3] == {}
+
+
+def test_calendar_fetches_once_and_persists(tmp_path, fetch):
+    path = tmp_path / "season.json"
+
+    async def scenario():
+        calendar = SeasonCalendar(path, ttl=3600, fetch=fetch)
+        assert await calendar.get(7) == {
+            "legumes": ["Aubergine", "Courgette", "Tomate"],
+            "fruits": ["Abricot", "Pêche"],
+        }
+        assert (await calendar.get(1))["fruits"] == ["Citron", "Clémentine", "Kiwi"]
+
+        restarted = SeasonCalendar(path, ttl=3600, fetch=fetch)
+        assert await restarted.get(8) == {"fruits": ["Melon"]}
+
+    asyncio.run(scenario())
+
+    assert fetch.calls == 1
+    assert json.loads(path.read_text(encoding="utf-8"))["months"]["8"] == {
+        "fruits": ["Melon"]
+    }
+
+
+def test_stale_calendar_served_while_refreshing(tmp_path, fetch):
+    path = tmp_path / "season.json"
+
+    async def scenario():
+        await SeasonCalendar(path, fetch=fetch).refresh()
+
+        calendar = SeasonCalendar(path, ttl=0, fetch=fetch)
+        calendar.load()
+        fetch.fail = True
+
+        assert await calendar.get(8) == {"fruits": ["Melon"]}
+        assert await calendar._refresh_task is False
+        assert await calendar.get(8) == {"fruits": ["Melon"]}
+
+    asyncio.run(scenario())
+
+    assert fetch.calls >= 2
+
+
+def test_calendar_unavailable(tmp_path, fetch):
+    fetch.fail = True
+    calendar = SeasonCalendar(tmp_path / "season.json", fetch=fetch)
+
+    assert asyncio.run(calendar.get(1)) is None
+
+
+def test_failed_fetch_not_retried_while_backing_off(tmp_path, fetch, monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("app.season.time.monotonic", lambda: now[0])
+    fetch.fail = True
+    calendar = SeasonCalendar(tmp_path / "season.json", fetch=fetch, retry_after=60)
+
+    async def scenario():
+        # Queued behind the first fetch, the others do not fetch again
+        results = await asyncio.gather(*(calendar.get(1) for _ in range(5)))
+        assert results == [None] * 5
+        assert fetch.calls == 1
+
+        fetch.fail = False
+        now[0] = 30.0
+        assert await calendar.get(1) is None
+        now[0] = 61.0
+        assert await calendar.get(8) == {"fruits": ["Melon"]}
+
+    asyncio.run(scenario())
+
+    assert fetch.calls == 2
+
+
+@pytest.mark.parametrize("html", ["<html><body>Maintenance</body></html>", ""])
+def test_unexpected_page_is_a_failed_fetch(tmp_path, fetch, html):
+    fetch.html = html
+    calendar = SeasonCalendar(tmp_path / "season.json", fetch=fetch)
+
+    assert asyncio.run(calendar.get(1)) is None
+    assert calendar.is_backing_off()
+    assert not (tmp_path / "season.json").exists()
+
+
+def test_undecodable_page_is_a_failed_fetch(tmp_path):
+    async def fetch():
+        return b"\xff\xfe".decode("utf-8")
+
+    calendar = SeasonCalendar(tmp_path / "season.json", fetch=fetch)
+
+    assert asyncio.run(calendar.refresh()) is False
+
+
+@pytest.mark.parametrize("month", ["0", "13", "mars"])
+def test_invalid_month(month):
+    response = TestClient(app).get(f"/by-season/?month={month}")
+
+    assert response.status_code == 422
@@ -0,0 +1,187 @@
+import os
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+import app.snapshot
+
+from app.dataset import clear_dataset_version
+from app.models import DatasetVersion, Food
+from app.snapshot import (
+    FoodSnapshot,
+    get_snapshot,
+    load_shared_snapshot,
+    load_snapshot,
+    reload_snapshot,
+)
+from app.utils import get_top_food_by_abs_nutrient, get_top_foods_by_category
+
+
+def test_load_snapshot_columns(sqlite_session):
+    snapshot = load_snapshot(sqlite_session)
+
+    assert len(snapshot) == 120
+    assert snapshot.nutrients["fer"].dtype == np.float64
+    assert np.isnan(snapshot.nutrients["zinc"][0])
+    assert set(snapshot.categories[snapshot.category_codes]) == set(
+        snapshot.texts["categorie"]
+    )
+    with pytest.raises(ValueError):
+        snapshot.nutrients["fer"][1] = 0.0
+
+
+@pytest.mark.parametrize("nutrient", ["fer", "proteines", "cholesterol"])
+@pytest.mark.parametrize("percentage", [0.05, 0.2, 1.0])
+def test_snapshot_matches_sql_by_category(sqlite_session, nutrient, percentage):
+    categories = ["Fruits frais", "Viande rouge"]
+
+    expected = get_top_foods_by_category(
+        sqlite_session, categories, percentage, nutrient
+    )
+    reload_snapshot(sqlite_session)
+    result = get_top_foods_by_category(sqlite_session, categories, percentage, nutrient)
+
+    assert result == expected
+
+
+@pytest.mark.parametrize("nutrient", ["zinc", "energie_calories"])
+@pytest.mark.parametrize("percentage", [0.1, 1.0])
+def test_snapshot_matches_sql_by_abs_nutrient(sqlite_session, nutrient, percentage):
+    expected = [
+        food.model_dump()
+        for food in get_top_food_by_abs_nutrient(nutrient, percentage, sqlite_session)
+    ]
+    reload_snapshot(sqlite_session)
+    result = get_top_food_by_abs_nutrient(nutrient, percentage, sqlite_session)
+
+    assert result == expected
+
+
+def test_snapshot_unknown_category(sqlite_session):
+    snapshot = reload_snapshot(sqlite_session)
+
+    assert snapshot.top_names_by_category(["Inconnue"], 0.5, "fer") == []
+
+
+def test_reload_swaps_snapshot(sqlite_session):
+    first = reload_snapshot(sqlite_session)
+    second = reload_snapshot(sqlite_session)
+
+    assert get_snapshot() is second
+    assert first is not second
+    assert len(first) == len(second)
+
+
+def test_snapshot_rebuilt_on_new_version(sqlite_session):
+    sqlite_session.add(DatasetVersion(version="v1", loaded_at=datetime.now()))
+    sqlite_session.commit()
+    assert reload_snapshot(sqlite_session).version == "v1"
+
+    # A new load: another food becomes the richest in iron
+    food = sqlite_session.get(Food, 7)
+    food.fer = 1000.0
+    sqlite_session.add(food)
+    sqlite_session.add(DatasetVersion(version="v2", loaded_at=datetime.now()))
+    sqlite_session.commit()
+    clear_dataset_version()
+
+    top = get_top_food_by_abs_nutrient("fer", 0.01, sqlite_session)
+
+    assert top[0]["id"] == 7
+    assert get_snapshot().version == "v2"
+    clear_dataset_version()
+
+
+def test_saved_snapshot_is_mapped(sqlite_session, tmp_path):
+    snapshot = load_snapshot(sqlite_session)
+    # Tables written by populate.py may hold NULL texts
+    synonymes = snapshot.texts["synonymes"].copy()
+    synonymes[-1] = None
+    snapshot = FoodSnapshot(
+        snapshot.ids,
+        {**snapshot.texts, "synonymes": synonymes},
+        snapshot.category_codes,
+        snapshot.categories,
+        snapshot.nutrients,
+        snapshot.densities,
+    )
+
+    snapshot.save(tmp_path / "snapshot")
+    mapped = FoodSnapshot.load(tmp_path / "snapshot")
+
+    assert isinstance(mapped.nutrients["fer"], np.memmap)
+    assert mapped.nutrients["fer"].flags.f_contiguous
+    with pytest.raises(ValueError):
+        mapped.nutrients["fer"][1] = 0.0
+
+    everything = np.arange(len(snapshot))
+    assert mapped.rows(everything) == snapshot.rows(everything)
+    assert mapped.column("synonymes", everything)[-1] is None
+    assert mapped.top_rows_by_nutrient("zinc", 0.3) == snapshot.top_rows_by_nutrient(
+        "zinc", 0.3
+    )
+    assert mapped.top_names_by_category(
+        ["Fruits frais"], 0.5, "fer", "kcal"
+    ) == snapshot.top_names_by_category(["Fruits frais"], 0.5, "fer", "kcal")
+
+
+def test_shared_snapshot_written_once_per_version(sqlite_session, tmp_path, statements):
+    sqlite_session.add(DatasetVersion(version="v1", loaded_at=datetime.now()))
+    sqlite_session.commit()
+    # Left by a load long ago
+    (tmp_path / "v0").mkdir()
+    os.utime(tmp_path / "v0", (0, 0))
+
+    first = load_shared_snapshot(sqlite_session, tmp_path)
+    statements.clear()
+    second = load_shared_snapshot(sqlite_session, tmp_path)
+
+    # The second worker maps the files without reading the foods
+    assert statements == []
+    assert first.nutrients["fer"].filename == second.nutrients["fer"].filename
+    assert [path.name for path in tmp_path.iterdir()] == ["v1"]
+
+    clear_dataset_version()
+    sqlite_session.add(DatasetVersion(version="v2", loaded_at=datetime.now()))
+    sqlite_session.commit()
+    load_shared_snapshot(sqlite_session, tmp_path)
+
+    # Workers may still be on v1 for a while
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["v1", "v2"]
+
+
+def test_stale_worker_keeps_newer_snapshot(sqlite_session, tmp_path, monkeypatch):
+    # A worker still on v1 writes its files after another mapped v2's
+    (tmp_path / "v2").mkdir()
+    monkeypatch.setattr(app.snapshot, "get_dataset_version", lambda session: "v1")
+
+    load_shared_snapshot(sqlite_session, tmp_path)
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["v1", "v2"]
+
+
+def test_shared_snapshot_without_version(sqlite_session, tmp_path):
+    snapshot = load_shared_snapshot(sqlite_session, tmp_path)
+
+    assert len(snapshot) == 120
+    assert not isinstance(snapshot.nutrients["fer"], np.memmap)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_shared_snapshot_remapped_on_new_version(sqlite_session, tmp_path, monkeypatch):
+    monkeypatch.setattr(app.snapshot, "SNAPSHOT_DIR", str(tmp_path))
+    sqlite_session.add(DatasetVersion(version="v1", loaded_at=datetime.now()))
+    sqlite_session.commit()
+    reload_snapshot(sqlite_session)
+
+    sqlite_session.add(DatasetVersion(version="v2", loaded_at=datetime.now()))
+    sqlite_session.commit()
+    clear_dataset_version()
+    get_top_food_by_abs_nutrient("fer", 0.1, sqlite_session)
+
+    snapshot = get_snapshot()
+    assert snapshot.version == "v2"
+    assert snapshot.nutrients["fer"].filename.parent == tmp_path / "v2"
+
+    clear_dataset_version()
@@ -0,0 +1,133 @@
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+import app.main
+from app.db import get_session_factory
+from app.schemas import TopFoodsSpec
+from app.snapshot import reload_snapshot
+from app.utils import (
+    get_top_foods_batch,
+    get_top_foods_by_categories,
+    validate_batch,
+    validate_ranking_params,
+)
+
+CATEGORY_MAPPING = {
+    "Fruits": ["Fruits frais"],
+    "Viande": ["Viande rouge"],
+    "Lait": ["Lait et produits laitiers", "Boissons sucrées"],
+    "Noix": [],
+}
+
+SPECS = [
+    ("fer", 0.2, ["Fruits", "Viande", "Lait", "Noix"], None, "100g"),
+    ("proteines", 0.5, ["Viande"], None, "100g"),
+    ("energie_calories", 1.0, ["Lait", "Fruits"], ["nom", "energie_calories"], "100g"),
+    ("proteines", 0.5, ["Viande", "Lait"], ["nom", "proteines"], "kcal"),
+]
+
+
+def expected_results(session):
+    return [
+        get_top_foods_by_categories(
+            session,
+            {keyword: CATEGORY_MAPPING[keyword] for keyword in keywords},
+            percentage,
+            nutrient,
+            fields,
+            basis,
+        )
+        for nutrient, percentage, keywords, fields, basis in SPECS
+    ]
+
+
+@pytest.mark.parametrize("snapshot", [False, True])
+def test_batch_matches_single_requests(sqlite_session, snapshot):
+    if snapshot:
+        reload_snapshot(sqlite_session)
+
+    result = get_top_foods_batch(sqlite_session, SPECS, CATEGORY_MAPPING)
+
+    assert result == expected_results(sqlite_session)
+
+
+def test_batch_reads_foods_once(sqlite_session, statements):
+    get_top_foods_batch(sqlite_session, SPECS[:3], CATEGORY_MAPPING)
+    assert len(statements) == 1
+
+    # Plus their densities when a spec ranks per kcal
+    get_top_foods_batch(sqlite_session, SPECS, CATEGORY_MAPPING)
+    assert len(statements) == 3
+
+
+def test_batch_without_categories(sqlite_session, statements):
+    result = get_top_foods_batch(
+        sqlite_session, [("fer", 0.2, ["Noix"], None, "100g")], {"Noix": []}
+    )
+
+    assert result == [[{"categorie": "Noix", "aliments": []}]]
+    assert statements == []
+
+
+@pytest.mark.parametrize(
+    "spec, key",
+    [
+        ({"nutrient": "fer"}, "fer:0.2"),
+        ({"nutrient": "fer", "basis": "kcal"}, "fer:0.2:kcal"),
+        (
+            {"nutrient": "fer", "percentage": 0.1, "categories": ["Fruits", "Lait"]},
+            "fer:0.1:categories=Fruits,Lait",
+        ),
+        ({"nutrient": "fer", "fields": "nom,fer"}, "fer:0.2:fields=nom,fer"),
+        ({"nutrient": "fer", "categories": ["Lait"], "key": "lait"}, "lait"),
+    ],
+)
+def test_result_key(spec, key):
+    assert TopFoodsSpec(**spec).result_key() == key
+
+
+def test_batch_same_nutrient_over_other_categories(async_session_factory):
+    app.main.app.dependency_overrides[get_session_factory] = (
+        lambda: async_session_factory
+    )
+    specs = [
+        {"nutrient": "fer", "percentage": 0.5, "categories": [keyword]}
+        for keyword in ["Fruits", "Lait"]
+    ]
+    try:
+        response = TestClient(app.main.app).post(
+            "/top-foods/batch", json={"specs": specs}
+        )
+    finally:
+        app.main.app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    result = response.json()
+    assert list(result) == [
+        "fer:0.5:categories=Fruits",
+        "fer:0.5:categories=Lait",
+    ]
+    assert [group["categorie"] for group in result["fer:0.5:categories=Fruits"]] == [
+        "Fruits"
+    ]
+
+
+@pytest.mark.parametrize(
+    "keys", [[], ["fer:0.2", "fer:0.2"], [f"fer:{i}" for i in range(51)]]
+)
+def test_validate_batch_fail(keys):
+    with pytest.raises(HTTPException) as exc_info:
+        validate_batch(keys)
+
+    assert exc_info.value.status_code == 400
+
+
+@pytest.mark.parametrize(
+    "nutrient, percentage", [("nom", 0.2), ("calories", 0.2), ("fer", 1.5)]
+)
+def test_validate_ranking_params_fail(nutrient, percentage):
+    with pytest.raises(HTTPException) as exc_info:
+        validate_ranking_params(nutrient, percentage)
+
+    assert exc_info.value.status_code == 400
@@ -0,0 +1,51 @@
+import pytest
+
+from app.utils import (
+    build_top_foods_statement,
+    get_top_foods_by_categories,
+    get_top_foods_by_category,
+)
+
+CATEGORY_MAPPING = {
+    "Fruits": ["Fruits frais"],
+    "Viande": ["Viande rouge"],
+    "Lait": ["Lait et produits laitiers", "Boissons sucrées"],
+    "Noix": [],
+}
+
+
+@pytest.mark.parametrize("nutrient", ["fer", "proteines", "energie_calories"])
+@pytest.mark.parametrize("percentage", [0.05, 0.2, 0.5, 1.0])
+def test_window_plan_matches_per_category_plan(sqlite_session, nutrient, percentage):
+    expected = [
+        {
+            "categorie": keyword,
+            "aliments": get_top_foods_by_category(
+                sqlite_session, categories, percentage, nutrient
+            ),
+        }
+        for keyword, categories in CATEGORY_MAPPING.items()
+    ]
+
+    result = get_top_foods_by_categories(
+        sqlite_session, CATEGORY_MAPPING, percentage, nutrient
+    )
+
+    assert result == expected
+
+
+def test_window_plan_emits_one_statement(sqlite_session, statements):
+    get_top_foods_by_categories(sqlite_session, CATEGORY_MAPPING, 0.2, "fer")
+
+    assert len(statements) == 1
+
+
+def test_window_plan_without_categories(sqlite_session, statements):
+    mapping = {"Fruits": [], "Noix": []}
+
+    assert build_top_foods_statement(mapping, 0.2, "fer") is None
+    assert get_top_foods_by_categories(sqlite_session, mapping, 0.2, "fer") == [
+        {"categorie": "Fruits", "aliments": []},
+        {"categorie": "Noix", "aliments": []},
+    ]
+    assert statements == []